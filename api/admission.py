@@ -0,0 +1,174 @@
+"""Admission control: ограничение и сброс нагрузки на изменяющие запросы.
+
+- Token bucket на клиента (по REMOTE_ADDR) для POST/PUT/PATCH/DELETE: при
+  исчерпании — 429 с Retry-After до следующего токена.
+- Лимит одновременных запросов на класс эндпоинтов (read/write): сверх лимита —
+  сразу 503, а не ожидание в очереди воркера.
+- При давлении на брокер (connection.blocked, переполненный локальный буфер
+  событий) или на БД (средняя задержка запросов записи выше порога, database is
+  locked) запись отклоняется с 503 и Retry-After; чтение продолжает работать.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+
+from .events import default_publisher
+from .metrics import registry
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+REJECTED = registry.counter("cars_admission_rejected_total", "Отклонённые admission control запросы", ["reason"])
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """0, если токен взят; иначе сколько секунд ждать следующего."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """Token bucket на клиента; хранится не больше max_clients последних клиентов (LRU)."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10_000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client: str) -> float:
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket.take()
+
+
+class LatencyTracker:
+    """Экспоненциальное среднее задержки; устаревает через ttl секунд без замеров.
+
+    Устаревание важно: пока запись отклоняется, новых замеров нет, и без него
+    высокое значение держало бы запись закрытой бесконечно.
+    """
+
+    def __init__(self, alpha: float = 0.2, ttl: float = 5.0) -> None:
+        self.alpha = alpha
+        self.ttl = ttl
+        self._value = 0.0
+        self._updated = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._updated > self.ttl:
+                self._value = seconds
+            else:
+                self._value += self.alpha * (seconds - self._value)
+            self._updated = now
+
+    def value(self) -> float:
+        with self._lock:
+            if time.monotonic() - self._updated > self.ttl:
+                return 0.0
+            return self._value
+
+
+def _client_key(request) -> str:
+    return request.META.get("REMOTE_ADDR") or "unknown"
+
+
+def _reject(status: int, reason: str, retry_after: float) -> JsonResponse:
+    REJECTED.inc(reason=reason)
+    error = "Service overloaded" if status == 503 else "Too many requests"
+    response = JsonResponse({"error": error, "reason": reason}, status=status)
+    response["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class AdmissionControlMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rate_limiter = ClientRateLimiter(settings.ADMISSION_WRITE_RATE, settings.ADMISSION_WRITE_BURST)
+        self.slots = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in settings.ADMISSION_MAX_CONCURRENT.items()
+        }
+        self.db_latency = LatencyTracker()
+        self.publisher = default_publisher()
+        # число событий в буфере — COUNT(*) в SQLite, поэтому не чаще раза в секунду
+        self._backlog: Tuple[float, int] = (0.0, 0)
+
+    def _spool_backlog(self) -> int:
+        checked_at, backlog = self._backlog
+        now = time.monotonic()
+        if now - checked_at >= 1.0:
+            backlog = self.publisher.backlog()
+            self._backlog = (now, backlog)
+        return backlog
+
+    def _write_pressure(self) -> Optional[JsonResponse]:
+        if self.publisher.blocked:
+            return _reject(503, "broker_blocked", settings.ADMISSION_RETRY_AFTER)
+        if self._spool_backlog() > settings.ADMISSION_MAX_SPOOLED_EVENTS:
+            return _reject(503, "event_backlog", settings.ADMISSION_RETRY_AFTER)
+        if self.db_latency.value() * 1000 > settings.ADMISSION_MAX_DB_LATENCY_MS:
+            return _reject(503, "db_latency", self.db_latency.ttl)
+        return None
+
+    def _timed_query(self, execute, sql, params, many, context):
+        # В замер входит и ожидание блокировки SQLite (busy timeout), в том числе
+        # неудачное — "database is locked" тоже поднимает среднюю задержку
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_latency.observe(time.perf_counter() - start)
+
+    def __call__(self, request):
+        is_write = request.method in WRITE_METHODS
+        if is_write:
+            wait = self.rate_limiter.acquire(_client_key(request))
+            if wait:
+                return _reject(429, "rate_limit", wait)
+            rejected = self._write_pressure()
+            if rejected:
+                return rejected
+
+        slots = self.slots.get("write" if is_write else "read")
+        if slots is not None and not slots.acquire(blocking=False):
+            return _reject(503, "concurrency", 1)
+        try:
+            if not is_write:
+                return self.get_response(request)
+            with ExitStack() as stack:
+                # запись автомобилей при шардировании идёт в шарды
+                for alias in (DEFAULT_DB_ALIAS, *settings.CAR_SHARDS):
+                    stack.enter_context(connections[alias].execute_wrapper(self._timed_query))
+                return self.get_response(request)
+        finally:
+            if slots is not None:
+                slots.release()
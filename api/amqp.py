@@ -0,0 +1,249 @@
+"""Общие параметры подключения к RabbitMQ и объявление топологии событий.
+
+Топология:
+
+    cars_events_exchange.v2 (fanout) ──> cars_events_queue.v2 ──(reject)──> cars_events_dlx ──> cars_events_parking
+                                               ^
+    cars_events_retry (direct) ──> cars_events_queue.v2.retry.<ttl> ──(TTL истёк)──┘
+
+Сообщение, которое потребитель не смог обработать, переотправляется в retry-очередь
+очередного уровня (задержки растут экспоненциально). Очередь держит его TTL миллисекунд
+и по истечении через dead-lettering возвращает в рабочую очередь. Когда уровни
+закончились, сообщение отклоняется без requeue и попадает в parking lot.
+
+Партиционированный режим (RABBITMQ_PARTITIONS=N > 0): fanout-exchange привязан к
+direct-exchange cars_events_partitioned, а тот — к N очередям cars_events_queue.v2.p<i>.
+Publisher выбирает партицию по хэшу car.id, поэтому все события одного автомобиля
+попадают в одну очередь и обрабатываются по порядку; x-single-active-consumer
+гарантирует, что очередь в каждый момент читает только один потребитель.
+Число партиций меняется только после полной обработки очередей.
+
+Полосы (api.lanes): для bulk-событий вся цепочка дублируется с суффиксом .bulk —
+cars_events_exchange.v2.bulk ──> cars_events_queue.v2.bulk (или cars_events_queue.v2.p<i>.bulk
+через cars_events_partitioned.bulk), со своими retry-очередями. Потребитель читает
+обе полосы и отдаёт interactive большую долю (см. CarEventConsumer). Порядок событий
+одного автомобиля сохраняется только в пределах полосы.
+
+Имена с .v2: до появления DLX и alternate-exchange события шли через
+cars_events_exchange → cars_events_queue, объявленные без аргументов, и повторное
+объявление тех же имён с новыми аргументами брокер отклонил бы с PRECONDITION_FAILED.
+Поэтому текущая топология живёт под новыми именами, а migrate_legacy_topology
+(команда migrate_event_topology) подключает к ней старый exchange и переносит
+сообщения из старой очереди.
+"""
+import json
+import os
+import zlib
+from typing import List
+
+import pika
+from pika.exceptions import ChannelClosedByBroker
+
+from .lanes import INTERACTIVE, LANES
+
+EXCHANGE = "cars_events_exchange.v2"
+QUEUE = "cars_events_queue.v2"
+RETRY_EXCHANGE = "cars_events_retry"
+DEAD_LETTER_EXCHANGE = "cars_events_dlx"
+PARKING_QUEUE = "cars_events_parking"
+PARTITION_EXCHANGE = "cars_events_partitioned"
+# Топология до DLX/retry: объявлялась без аргументов, поэтому не переобъявляется
+LEGACY_EXCHANGE = "cars_events_exchange"
+LEGACY_QUEUE = "cars_events_queue"
+
+# Заголовок с номером попытки обработки (0 — первая доставка)
+ATTEMPT_HEADER = "x-attempt"
+# W3C trace context события (см. api.correlation)
+TRACEPARENT_HEADER = "traceparent"
+# Время публикации, наносекунды Unix time; по нему потребитель считает задержку доставки
+PUBLISHED_AT_HEADER = "x-published-at-ns"
+
+
+def lane_name(name: str, lane: str) -> str:
+    """Имя exchange/очереди полосы: interactive — исходное, остальные — с суффиксом."""
+    return name if lane == INTERACTIVE else f"{name}.{lane}"
+
+
+def exchange_for(lane: str) -> str:
+    return lane_name(EXCHANGE, lane)
+
+
+def retry_delays_ms() -> List[int]:
+    """Задержки retry-уровней, мс. По умолчанию 1с, 5с, 25с, 125с."""
+    raw = os.getenv("RABBITMQ_RETRY_DELAYS_MS", "1000,5000,25000,125000")
+    return [int(x) for x in raw.split(",") if x.strip()]
+
+
+def retry_queue_name(queue: str, delay_ms: int) -> str:
+    return f"{queue}.retry.{delay_ms}"
+
+
+def partition_count() -> int:
+    return int(os.getenv("RABBITMQ_PARTITIONS", "0"))
+
+
+def partition_for(car_id: int, partitions: int) -> int:
+    # crc32 стабилен между процессами, в отличие от встроенного hash()
+    return zlib.crc32(str(car_id).encode()) % partitions
+
+
+def partition_routing_key(partition: int) -> str:
+    return f"p{partition}"
+
+
+def partition_queue_name(partition: int, lane: str = INTERACTIVE) -> str:
+    return lane_name(f"{QUEUE}.p{partition}", lane)
+
+
+def routing_key_for(car_id: int) -> str:
+    """Routing key события; пустой в непартиционированном режиме."""
+    partitions = partition_count()
+    if not partitions:
+        return ""
+    return partition_routing_key(partition_for(car_id, partitions))
+
+
+def work_queues(lane: str = INTERACTIVE) -> List[str]:
+    partitions = partition_count()
+    if not partitions:
+        return [lane_name(QUEUE, lane)]
+    return [partition_queue_name(p, lane) for p in range(partitions)]
+
+
+def connection_parameters(**overrides) -> pika.ConnectionParameters:
+    params = dict(
+        host=os.getenv("RABBITMQ_HOST", "localhost"),
+        port=int(os.getenv("RABBITMQ_PORT", "5672")),
+        virtual_host=os.getenv("RABBITMQ_VHOST", "/"),
+        credentials=pika.PlainCredentials(
+            os.getenv("RABBITMQ_USER", "guest"),
+            os.getenv("RABBITMQ_PASSWORD", "guest"),
+        ),
+        heartbeat=30,
+        blocked_connection_timeout=30,
+    )
+    params.update(overrides)
+    return pika.ConnectionParameters(**params)
+
+
+def declare_dead_letter_topology(ch) -> None:
+    ch.exchange_declare(exchange=DEAD_LETTER_EXCHANGE, exchange_type="fanout", durable=True)
+    ch.queue_declare(queue=PARKING_QUEUE, durable=True)
+    ch.queue_bind(exchange=DEAD_LETTER_EXCHANGE, queue=PARKING_QUEUE)
+
+
+def declare_work_queue(ch, queue: str, arguments: dict | None = None) -> None:
+    """Рабочая очередь с DLX и набором retry-очередей к ней."""
+    ch.queue_declare(
+        queue=queue,
+        durable=True,
+        arguments={"x-dead-letter-exchange": DEAD_LETTER_EXCHANGE, **(arguments or {})},
+    )
+
+    ch.exchange_declare(exchange=RETRY_EXCHANGE, exchange_type="direct", durable=True)
+    for delay in retry_delays_ms():
+        name = retry_queue_name(queue, delay)
+        ch.queue_declare(
+            queue=name,
+            durable=True,
+            arguments={
+                "x-message-ttl": delay,
+                # пустой exchange = default exchange, маршрут по имени очереди
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue,
+            },
+        )
+        ch.queue_bind(exchange=RETRY_EXCHANGE, queue=name, routing_key=name)
+
+
+def declare_topology(ch) -> None:
+    declare_dead_letter_topology(ch)
+    for lane in LANES:
+        declare_lane_topology(ch, lane)
+
+
+def declare_lane_topology(ch, lane: str) -> None:
+    exchange = exchange_for(lane)
+    # Неотмаршрутизированные сообщения тоже уходят в parking lot
+    ch.exchange_declare(
+        exchange=exchange,
+        exchange_type="fanout",
+        durable=True,
+        arguments={"alternate-exchange": DEAD_LETTER_EXCHANGE},
+    )
+    partitions = partition_count()
+    if not partitions:
+        queue = lane_name(QUEUE, lane)
+        declare_work_queue(ch, queue)
+        ch.queue_bind(exchange=exchange, queue=queue)
+        return
+
+    partition_exchange = lane_name(PARTITION_EXCHANGE, lane)
+    ch.exchange_declare(exchange=partition_exchange, exchange_type="direct", durable=True)
+    # fanout передаёт routing key дальше, direct раскладывает по партициям
+    ch.exchange_bind(destination=partition_exchange, source=exchange)
+    for p in range(partitions):
+        queue = partition_queue_name(p, lane)
+        declare_work_queue(ch, queue, {"x-single-active-consumer": True})
+        ch.queue_bind(exchange=partition_exchange, queue=queue, routing_key=partition_routing_key(p))
+
+
+def _exists(connection, **name) -> bool:
+    """Есть ли exchange (exchange=...) или очередь (queue=...): пассивное объявление в отдельном канале.
+
+    При 404 брокер закрывает канал, поэтому основной канал для проверки не годится.
+    """
+    channel = connection.channel()
+    try:
+        if "exchange" in name:
+            channel.exchange_declare(passive=True, **name)
+        else:
+            channel.queue_declare(passive=True, **name)
+    except ChannelClosedByBroker as e:
+        if e.reply_code != 404:
+            raise
+        return False
+    channel.close()
+    return True
+
+
+def _routing_key_of(body: bytes) -> str:
+    try:
+        return routing_key_for(int(json.loads(body)["car"]["id"]))
+    except (ValueError, KeyError, TypeError):
+        # без car.id в партиционированном режиме сообщение уйдёт в parking lot
+        return ""
+
+
+def migrate_legacy_topology(connection) -> int:
+    """Переводит брокер со старой топологии (LEGACY_EXCHANGE → LEGACY_QUEUE) на текущую.
+
+    Старый exchange привязывается к EXCHANGE — publisher'ы прежней версии
+    продолжают доставлять события в новые очереди; затем старая очередь
+    отвязывается, оставшиеся в ней сообщения перекладываются в EXCHANGE (ack —
+    только после подтверждения публикации), и опустевшая очередь удаляется.
+    Повторный запуск безопасен. Возвращает число перенесённых сообщений.
+    """
+    channel = connection.channel()
+    declare_topology(channel)
+    if _exists(connection, exchange=LEGACY_EXCHANGE):
+        # сначала мост, потом отвязка: события старых publisher'ов не теряются
+        channel.exchange_bind(destination=EXCHANGE, source=LEGACY_EXCHANGE)
+        if _exists(connection, queue=LEGACY_QUEUE):
+            channel.queue_unbind(queue=LEGACY_QUEUE, exchange=LEGACY_EXCHANGE)
+    if not _exists(connection, queue=LEGACY_QUEUE):
+        return 0
+
+    channel.confirm_delivery()
+    moved = 0
+    while True:
+        method, properties, body = channel.basic_get(queue=LEGACY_QUEUE)
+        if method is None:
+            break
+        channel.basic_publish(exchange=EXCHANGE, routing_key=_routing_key_of(body), body=body, properties=properties)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        moved += 1
+    # если старый потребитель ещё держит неподтверждённые сообщения, брокер
+    # откажет в удалении — команду нужно повторить после его остановки
+    channel.queue_delete(queue=LEGACY_QUEUE, if_empty=True)
+    return moved
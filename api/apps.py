@@ -5,4 +5,19 @@ class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
 
+    def ready(self):
+        from django.conf import settings
+
+        from .idempotency import check_cache
+
+        check_cache()
+        if settings.CATALOG_SNAPSHOT_ENABLED:
+            from .snapshot import check_numpy
+
+            check_numpy()
+        if settings.CAR_SHARDS:
+            from .sharding import connect_signals
+
+            connect_signals()
+
 
@@ -0,0 +1,227 @@
+import copy
+import json
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Mapping, Optional, Sequence
+
+import pika
+from pika.exceptions import AMQPConnectionError, AMQPError
+
+from . import amqp
+from .dedupe import DedupeWindow
+from .lanes import BULK, INTERACTIVE, LANES
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+EventHandler = Callable[[dict], None]
+
+# Из каждых пяти сообщений при очереди в обеих полосах — четыре interactive
+DEFAULT_LANE_WEIGHTS = {INTERACTIVE: 4, BULK: 1}
+
+EVENT_LATENCY = registry.histogram(
+    "cars_event_latency_seconds",
+    "Время от публикации события до получения потребителем",
+    ["queue", "attempt"],
+)
+HANDLER_DURATION = registry.histogram(
+    "cars_event_handler_seconds",
+    "Время обработки события обработчиком",
+    ["queue", "outcome"],
+)
+
+
+class CarEventConsumer:
+    """Потребитель событий об автомобилях с retry-очередями и parking lot.
+
+    Неудачно обработанное сообщение не возвращается в очередь (requeue) —
+    иначе оно крутилось бы в горячем цикле. Вместо этого оно переотправляется
+    в retry-очередь с задержкой, а после последнего уровня уходит в parking lot.
+
+    Может читать несколько очередей (партиций) одного канала; сообщения каждой
+    очереди обрабатываются строго последовательно. Повтор через retry-очередь
+    пропускает вперёд более поздние события того же автомобиля — это плата за
+    то, что одно «ядовитое» сообщение не блокирует партицию.
+
+    Для каждой очереди читается и её bulk-полоса (<очередь>.bulk). Доставки
+    складываются в буфер своей полосы (не больше prefetch_count на очередь) и
+    обрабатываются взвешенным round-robin: пока обе полосы непусты, на
+    lane_weights[interactive] сообщений interactive приходится
+    lane_weights[bulk] сообщений bulk; пустая полоса свою долю не держит.
+    Полоса с весом 0 не читается.
+    """
+
+    def __init__(
+        self,
+        handler: EventHandler,
+        queues: Sequence[str] = (amqp.QUEUE,),
+        prefetch_count: int = 10,
+        max_reconnect_delay: float = 30.0,
+        dedupe: Optional[DedupeWindow] = None,
+        lane_weights: Mapping[str, int] = DEFAULT_LANE_WEIGHTS,
+    ) -> None:
+        self.handler = handler
+        self.queues = list(queues)
+        self._queue_by_tag: Dict[str, str] = {}
+        self._lane_by_tag: Dict[str, str] = {}
+        # в порядке приоритета полос
+        self.lane_weights = {lane: lane_weights.get(lane, 0) for lane in LANES if lane_weights.get(lane, 0) > 0}
+        if not self.lane_weights:
+            raise ValueError("At least one event lane must have a positive weight")
+        self._pending: Dict[str, Deque[tuple]] = {}
+        self._credits: Dict[str, int] = {}
+        self._stopping = False
+        self.prefetch_count = prefetch_count
+        self.max_reconnect_delay = max_reconnect_delay
+        self.delays = amqp.retry_delays_ms()
+        self.dedupe = dedupe if dedupe is not None else DedupeWindow()
+
+        self.connection: Optional[pika.BlockingConnection] = None
+        self.channel: Optional[pika.adapters.blocking_connection.BlockingChannel] = None
+
+    def run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                self._consume()
+            except KeyboardInterrupt:
+                self.stop()
+                return
+            except AMQPConnectionError:
+                logger.warning("RabbitMQ unavailable, reconnecting in %.1fs", delay)
+            except AMQPError:
+                logger.exception("RabbitMQ consumer failed, reconnecting in %.1fs", delay)
+            else:
+                return
+            # Экспоненциальная пауза между переподключениями, без busy-loop
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._close_connection()
+
+    def _close_connection(self) -> None:
+        """Закрывает текущее соединение, не выпуская ошибок: оно могло уже оборваться."""
+        connection, self.connection, self.channel = self.connection, None, None
+        try:
+            if connection and connection.is_open:
+                connection.close()
+        except Exception:
+            pass
+
+    def _consume(self) -> None:
+        # после сбоя старое соединение может оставаться открытым (например, ошибка
+        # канала) — без закрытия каждое переподключение оставляло бы его сокет
+        self._close_connection()
+        self.connection = pika.BlockingConnection(amqp.connection_parameters())
+        self.channel = self.connection.channel()
+        amqp.declare_topology(self.channel)
+        # prefetch ограничивает число неподтверждённых сообщений у потребителя
+        self.channel.basic_qos(prefetch_count=self.prefetch_count)
+        # подтверждения публикации: исходное сообщение ack-аем только после того,
+        # как брокер принял копию в retry-очередь
+        self.channel.confirm_delivery()
+        self._queue_by_tag, self._lane_by_tag = {}, {}
+        # неподтверждённые доставки прошлого соединения брокер доставит заново
+        self._pending = {lane: deque() for lane in self.lane_weights}
+        self._credits = {}
+        for lane in self.lane_weights:
+            for queue in self.queues:
+                name = amqp.lane_name(queue, lane)
+                tag = self.channel.basic_consume(queue=name, on_message_callback=self._buffer)
+                self._queue_by_tag[tag] = name
+                self._lane_by_tag[tag] = lane
+        logger.info("Consuming from %s", ", ".join(self._queue_by_tag.values()))
+
+        while not self._stopping:
+            delivery = self._next_delivery()
+            if delivery is None:
+                # буферы пусты: ждём доставок (заодно обслуживаются heartbeat'ы)
+                self.connection.process_data_events(time_limit=1)
+                continue
+            self._on_message(*delivery)
+            # забираем пришедшее за время обработки, чтобы interactive не ждал за bulk
+            self.connection.process_data_events(time_limit=0)
+
+    def _buffer(self, ch, method, properties, body: bytes) -> None:
+        self._pending[self._lane_by_tag[method.consumer_tag]].append((ch, method, properties, body))
+
+    def _next_delivery(self) -> Optional[tuple]:
+        """Взвешенный round-robin по непустым полосам; кредиты обновляются, когда их не осталось."""
+        ready = [lane for lane, pending in self._pending.items() if pending]
+        if not ready:
+            return None
+        if not any(self._credits.get(lane, 0) > 0 for lane in ready):
+            self._credits = dict(self.lane_weights)
+        for lane in ready:
+            if self._credits[lane] > 0:
+                self._credits[lane] -= 1
+                return self._pending[lane].popleft()
+        return None
+
+    def _on_message(self, ch, method, properties, body: bytes) -> None:
+        headers = dict(properties.headers or {})
+        attempt = int(headers.get(amqp.ATTEMPT_HEADER, 0))
+        queue = self._queue_by_tag.get(method.consumer_tag, "")
+        published_at = headers.get(amqp.PUBLISHED_AT_HEADER)
+        if published_at:
+            # для повторных попыток задержка включает паузы retry-очередей
+            latency = max(time.time_ns() - int(published_at), 0) / 1e9
+            EVENT_LATENCY.observe(latency, queue=queue, attempt=attempt)
+
+        if self.dedupe.seen(properties.message_id):
+            logger.info("Skipping duplicate message_id=%s", properties.message_id)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            logger.error("Malformed event, parking: %r", body[:200])
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        started = time.perf_counter()
+        try:
+            self.handler(payload)
+        except Exception:
+            HANDLER_DURATION.observe(time.perf_counter() - started, queue=queue, outcome="error")
+            logger.exception(
+                "Handler failed: eventType=%s attempt=%s traceparent=%s",
+                payload.get("eventType"),
+                attempt,
+                headers.get(amqp.TRACEPARENT_HEADER),
+            )
+            self._retry_or_park(ch, method, properties, body, attempt)
+            return
+        HANDLER_DURATION.observe(time.perf_counter() - started, queue=queue, outcome="ok")
+
+        self.dedupe.add(properties.message_id)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def _retry_or_park(self, ch, method, properties, body: bytes, attempt: int) -> None:
+        if attempt >= len(self.delays):
+            logger.error("Retries exhausted after %s attempts, parking message", attempt + 1)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        # Сохраняем исходные свойства сообщения, меняется только счётчик попыток
+        retry_properties = copy.copy(properties)
+        retry_properties.headers = {**(properties.headers or {}), amqp.ATTEMPT_HEADER: attempt + 1}
+        retry_properties.delivery_mode = 2
+        queue = self._queue_by_tag[method.consumer_tag]
+        routing_key = amqp.retry_queue_name(queue, self.delays[attempt])
+        try:
+            ch.basic_publish(
+                exchange=amqp.RETRY_EXCHANGE,
+                routing_key=routing_key,
+                body=body,
+                properties=retry_properties,
+            )
+        except AMQPError:
+            # Не удалось переотправить — оставляем сообщение брокеру для повторной доставки
+            logger.exception("Failed to schedule retry via %s", routing_key)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+        ch.basic_ack(delivery_tag=method.delivery_tag)
@@ -0,0 +1,58 @@
+"""Correlation id и trace context запроса.
+
+Correlation id берётся из X-Request-ID или генерируется и попадает в
+correlation_id всех событий, опубликованных в рамках запроса. Trace id берётся
+из заголовка W3C traceparent (или генерируется); publisher кладёт в событие
+дочерний traceparent, чтобы связать запрос и обработку события потребителем."""
+import os
+import re
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+_correlation_id: ContextVar[Optional[str]] = ContextVar("correlation_id", default=None)
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+
+HEADER = "X-Request-ID"
+TRACEPARENT_HEADER = "traceparent"
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def get_correlation_id() -> Optional[str]:
+    return _correlation_id.get()
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def parse_trace_id(traceparent: Optional[str]) -> Optional[str]:
+    match = _TRACEPARENT_RE.match((traceparent or "").strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None
+    return match.group(1)
+
+
+def new_traceparent() -> str:
+    """traceparent для исходящего сообщения: trace текущего запроса (или новый) и новый span id."""
+    trace_id = get_trace_id() or uuid.uuid4().hex
+    return f"00-{trace_id}-{os.urandom(8).hex()}-01"
+
+
+class CorrelationIdMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        correlation_id = request.headers.get(HEADER) or uuid.uuid4().hex
+        trace_id = parse_trace_id(request.headers.get(TRACEPARENT_HEADER)) or uuid.uuid4().hex
+        token = _correlation_id.set(correlation_id[:128])
+        trace_token = _trace_id.set(trace_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            _trace_id.reset(trace_token)
+            _correlation_id.reset(token)
+        response[HEADER] = correlation_id[:128]
+        return response
@@ -0,0 +1,97 @@
+"""Маршрутизация запросов к БД: записи — в основную, чтения — в read-алиасы.
+
+После записи клиент «прилипает» к основной БД: до конца текущего запроса и ещё
+DATABASE_STICKY_SECONDS через cookie, чтобы сразу видеть свои изменения,
+даже если реплика отстаёт.
+
+Запись закрепляет чтения за основной БД только внутри HTTP-запроса, для которого
+ReadYourWritesMiddleware открыл область закрепления. Команды, потребитель
+событий и фоновые потоки (drainer, снимок каталога) живут дольше запроса, и одна
+их запись иначе навсегда увела бы все их чтения с реплик.
+"""
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# None — вне запроса: записи не закрепляют чтения; внутри запроса — закреплены ли
+_pinned: ContextVar[Optional[bool]] = ContextVar("db_pinned_to_primary", default=None)
+
+STICKY_COOKIE = "db_primary_until"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# app_label модели таблицы DatabaseCache
+CACHE_APP_LABEL = "django_cache"
+
+
+def pin_to_primary() -> None:
+    _pinned.set(True)
+
+
+def is_pinned() -> bool:
+    return bool(_pinned.get())
+
+
+def _shard_of(hints) -> str | None:
+    # объект, загруженный из шарда автомобилей (api.sharding), остаётся в своём шарде
+    instance = hints.get("instance")
+    if instance is not None and instance._state.db in settings.CAR_SHARDS:
+        return instance._state.db
+    return None
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == CACHE_APP_LABEL:
+            # кэш в БД (idempotency) читается там же, куда пишется: отставание реплики
+            # пропустило бы сохранённый ответ
+            return DEFAULT_DB_ALIAS
+        shard = _shard_of(hints)
+        if shard:
+            return shard
+        read_aliases = settings.DATABASE_READ_ALIASES
+        if not read_aliases or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(read_aliases)
+
+    def db_for_write(self, model, **hints):
+        if _pinned.get() is not None:
+            _pinned.set(True)
+        return _shard_of(hints) or DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # все алиасы — копии одной и той же БД; дилеры копируются в каждый шард
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == CACHE_APP_LABEL:
+            return db == DEFAULT_DB_ALIAS
+        # у шардов автомобилей своя копия схемы (см. api.sharding)
+        return db == DEFAULT_DB_ALIAS or db in settings.CAR_SHARDS
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _pinned.set(self._sticky(request) or request.method in WRITE_METHODS)
+        try:
+            response = self.get_response(request)
+            if _pinned.get() and request.method in WRITE_METHODS:
+                ttl = settings.DATABASE_STICKY_SECONDS
+                response.set_cookie(
+                    STICKY_COOKIE, str(int(time.time()) + ttl), max_age=ttl, httponly=True, samesite="Lax"
+                )
+            return response
+        finally:
+            _pinned.reset(token)
+
+    @staticmethod
+    def _sticky(request) -> bool:
+        try:
+            return int(request.COOKIES.get(STICKY_COOKIE, "0")) > time.time()
+        except ValueError:
+            return False
@@ -0,0 +1,38 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+
+class DedupeWindow:
+    """Ограниченное окно последних обработанных message_id (LRU).
+
+    Проверка и добавление — O(1); при переполнении вытесняются самые старые id.
+    Id добавляется только после успешной обработки, иначе повтор через
+    retry-очередь был бы ошибочно отброшен.
+    """
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.maxsize = maxsize
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, message_id: Optional[str]) -> bool:
+        if not message_id:
+            return False
+        with self._lock:
+            if message_id in self._ids:
+                self._ids.move_to_end(message_id)
+                return True
+            return False
+
+    def add(self, message_id: Optional[str]) -> None:
+        if not message_id:
+            return
+        with self._lock:
+            self._ids[message_id] = None
+            self._ids.move_to_end(message_id)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._ids)
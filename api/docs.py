@@ -0,0 +1,96 @@
+"""OpenAPI-схема и страницы документации (Swagger UI, ReDoc).
+
+Схема строится один раз на процесс: читается из файла, записанного командой
+generate_openapi_schema (OPENAPI_SCHEMA_PATH), а если его нет — генерируется
+drf_yasg при первом запросе. Ответы отдаются с ETag, повторный запрос с
+If-None-Match получает 304. Модуль подключается в config.urls только при
+API_DOCS_ENABLED, поэтому рабочие процессы без документации drf_yasg не импортируют.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import path, re_path
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, yaml_sane_dump
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+
+API_INFO = openapi.Info(
+    title="Cars API",
+    default_version="v1",
+    description="API для управления автомобилями с интеграцией RabbitMQ",
+    contact=openapi.Contact(email="admin@example.com"),
+)
+
+_CONTENT_TYPES = {".json": "application/json", ".yaml": "application/yaml"}
+
+_cache: Dict[str, bytes] = {}
+_lock = threading.Lock()
+
+
+def generate_schema() -> bytes:
+    """Строит схему заново (без запроса, т.е. без host/schemes) и возвращает JSON."""
+    from .schemas import annotate_views
+
+    annotate_views()
+    swagger = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(swagger)
+
+
+def _load_json() -> bytes:
+    schema_path = settings.OPENAPI_SCHEMA_PATH
+    if schema_path.exists():
+        return schema_path.read_bytes()
+    return generate_schema()
+
+
+def schema_bytes(fmt: str) -> bytes:
+    cached = _cache.get(fmt)
+    if cached is not None:
+        return cached
+    with _lock:
+        if ".json" not in _cache:
+            _cache[".json"] = _load_json()
+        if fmt == ".yaml" and fmt not in _cache:
+            spec = json.loads(_cache[".json"], object_pairs_hook=OrderedDict)
+            _cache[fmt] = yaml_sane_dump(spec, binary=True)
+        return _cache[fmt]
+
+
+def _schema_etag(request, format: str) -> str:
+    return hashlib.sha256(schema_bytes(format)).hexdigest()
+
+
+@require_GET
+@condition(etag_func=_schema_etag)
+def schema_view(request, format: str):
+    response = HttpResponse(schema_bytes(format), content_type=_CONTENT_TYPES[format])
+    # браузер каждый раз перепроверяет схему, но при совпадении ETag получает 304
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _ui_view(renderer_class):
+    # Страницы UI не содержат схему: они загружают её с SPEC_URL (schema-json)
+    swagger = openapi.Swagger(info=API_INFO, _prefix="/", paths=openapi.Paths({}))
+
+    @require_GET
+    def view(request):
+        html = renderer_class().render(swagger, renderer_context={"request": request})
+        return HttpResponse(html, content_type="text/html; charset=utf-8")
+
+    return view
+
+
+urlpatterns = [
+    re_path(r"^swagger(?P<format>\.json|\.yaml)$", schema_view, name="schema-json"),
+    path("swagger/", _ui_view(SwaggerUIRenderer), name="schema-swagger-ui"),
+    path("redoc/", _ui_view(ReDocRenderer), name="schema-redoc"),
+]
@@ -1,54 +1,176 @@
 import json
 import logging
 import os
-from typing import Literal, Optional
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Optional
 
 import pika
+from pika.exceptions import AMQPConnectionError, AMQPError
 
-from .repository import Car
+from dal import car_to_dict
+from dal.events import CarRepositoryWithEvents, EventType
+
+from . import amqp
+from .correlation import get_correlation_id, new_traceparent
+from .lanes import current_lane
+from .metrics import registry
+from .circuit import CircuitBreaker
+from .profiling import span
+from .spool import EventSpool
+
+if TYPE_CHECKING:
+    # модуль не импортирует Django: publisher используется и из app.py
+    from .models import Car
 
 logger = logging.getLogger(__name__)
-EventType = Literal["CREATE", "UPDATE", "DELETE"]
+
+CONNECT_SECONDS = registry.histogram("cars_publisher_connect_seconds", "Время установки соединения publisher'а с RabbitMQ")
+CONNECTS = registry.counter("cars_publisher_connects_total", "Попытки подключения publisher'а к RabbitMQ", ["outcome"])
+
+__all__ = ["CarRepositoryWithEvents", "EventType", "RabbitMQEventPublisher", "default_publisher"]
 
 
 class RabbitMQEventPublisher:
-    def __init__(self) -> None:
-        self.exchange = "cars_events_exchange"
-        self.queue = "cars_events_queue"
+    """Публикует события в RabbitMQ.
 
-        self.host = os.getenv("RABBITMQ_HOST", "localhost")
-        self.port = int(os.getenv("RABBITMQ_PORT", "5672"))
-        self.user = os.getenv("RABBITMQ_USER", "guest")
-        self.password = os.getenv("RABBITMQ_PASSWORD", "guest")
-        self.vhost = os.getenv("RABBITMQ_VHOST", "/")
+    При недоступном брокере circuit breaker размыкается после нескольких ошибок подряд,
+    и события сразу пишутся в локальный буфер (EventSpool). Фоновый поток отправляет
+    буфер по порядку, когда брокер снова отвечает.
+    """
+
+    def __init__(self, spool: Optional[EventSpool] = None) -> None:
+        self.exchange = amqp.EXCHANGE
+        self.queue = amqp.QUEUE
 
         self.connection: Optional[pika.BlockingConnection] = None
         self.channel: Optional[pika.adapters.blocking_connection.BlockingChannel] = None
+        self._topology_ready = False
 
-    def _connect(self):
-        if self.connection and self.connection.is_open:
-            return
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("RABBITMQ_BREAKER_FAILURES", "3")),
+            reset_timeout=float(os.getenv("RABBITMQ_BREAKER_RESET", "10")),
+        )
+        self.spool = spool or EventSpool()
+        self.drain_batch_size = 100
+        self._spool_pending: Optional[bool] = None
+        self._drainer: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        # BlockingConnection не потокобезопасен, а publisher общий для всех потоков
+        self._lock = threading.RLock()
+        # брокер прислал connection.blocked (flow control): публикации будут ждать
+        self.blocked = False
+        self.keepalive_interval = float(os.getenv("RABBITMQ_KEEPALIVE_INTERVAL", "5"))
+        self._keepalive: Optional[threading.Thread] = None
+        self._reconnect = threading.Event()
 
-        creds = pika.PlainCredentials(self.user, self.password)
-        params = pika.ConnectionParameters(
-            host=self.host,
-            port=self.port,
-            virtual_host=self.vhost,
-            credentials=creds,
-            heartbeat=30,
-            blocked_connection_timeout=30,
+    def _connection_ready(self) -> bool:
+        return (
+            self._topology_ready
+            and self.connection is not None
+            and self.connection.is_open
+            and self.channel is not None
+            and self.channel.is_open
         )
-        self.connection = pika.BlockingConnection(params)
 
-    def _get_channel(self):
-        self._connect()
-        if self.channel is None or self.channel.is_closed:
-            self.channel = self.connection.channel()
+    def _open_connection(self):
+        """Новое соединение с каналом и объявленной топологией.
 
+        Подключение блокирует до RABBITMQ_CONNECT_TIMEOUT, поэтому выполняется без
+        self._lock и не трогает общее состояние; подставляет его _establish().
+        """
+        # Короткие таймауты: пока breaker не разомкнулся, поток не должен висеть долго
+        timeout = float(os.getenv("RABBITMQ_CONNECT_TIMEOUT", "3"))
+        started = time.perf_counter()
+        try:
+            connection = pika.BlockingConnection(
+                amqp.connection_parameters(
+                    socket_timeout=timeout,
+                    stack_timeout=timeout,
+                    blocked_connection_timeout=timeout,
+                )
+            )
+        except Exception:
+            CONNECTS.inc(outcome="error")
+            raise
+        CONNECT_SECONDS.observe(time.perf_counter() - started)
+        CONNECTS.inc(outcome="ok")
+        try:
+            channel = connection.channel()
             # Ловим возвраты, если сообщение не смаршрутизировалось при mandatory=True [web:154]
-            self.channel.add_on_return_callback(self._on_return)
+            channel.add_on_return_callback(self._on_return)
+            # FANOUT: routing_key игнорируется, всем привязанным очередям [web:237]
+            # Вместе с рабочей очередью объявляются DLX, retry-очереди и parking lot
+            amqp.declare_topology(channel)
+        except Exception:
+            _close_quietly(connection)
+            raise
+        connection.add_on_connection_blocked_callback(self._on_blocked)
+        connection.add_on_connection_unblocked_callback(self._on_unblocked)
+        return connection, channel
+
+    def _establish(self) -> None:
+        """Подключается вне self._lock и подставляет готовое соединение под ним."""
+        connection, channel = self._open_connection()
+        with self._lock:
+            if not self._connection_ready():
+                self._reset()
+                self.connection = connection
+                self.channel = channel
+                self._topology_ready = True
+                return
+        # другой поток подключился раньше
+        _close_quietly(connection)
+
+    def _on_blocked(self, connection, method) -> None:
+        logger.warning("RabbitMQ blocked the publisher connection: %s", getattr(method.method, "reason", ""))
+        self.blocked = True
+        # keepalive-поток обработает таймер blocked_connection_timeout и переподключится
+        self._reconnect.set()
 
-        return self.channel
+    def _on_unblocked(self, connection, method) -> None:
+        logger.info("RabbitMQ unblocked the publisher connection")
+        self.blocked = False
+
+    def start(self) -> None:
+        """Подключается заранее и обслуживает соединение в фоне.
+
+        BlockingConnection обрабатывает heartbeat только внутри вызовов pika; без
+        фонового обслуживания брокер закрывает простаивающее соединение, и первая
+        запись после паузы платит за переподключение.
+        """
+        if self._keepalive is not None and self._keepalive.is_alive():
+            return
+        self._keepalive = threading.Thread(target=self._keepalive_loop, name="events-publisher-keepalive", daemon=True)
+        self._keepalive.start()
+
+    def _keepalive_loop(self) -> None:
+        while True:
+            self._service_connection()
+            self._reconnect.clear()
+            self._reconnect.wait(self.keepalive_interval)
+
+    def _service_connection(self) -> None:
+        with self._lock:
+            if self.connection is not None and self.connection.is_open:
+                try:
+                    # heartbeat-кадры, connection.blocked/unblocked и таймеры pika
+                    self.connection.process_data_events(time_limit=0)
+                    return
+                except AMQPError:
+                    logger.warning("RabbitMQ publisher connection lost, reconnecting")
+                    self._reset()
+        # при непустом буфере переподключением занимается drainer
+        if self._spool_pending or not self.breaker.allow_request():
+            return
+        try:
+            self._establish()
+        except Exception:
+            logger.warning("RabbitMQ publisher connect failed, retrying in %.1fs", self.keepalive_interval)
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
 
     def _on_return(self, ch, method, properties, body):
         logger.error(
@@ -60,88 +182,172 @@ class RabbitMQEventPublisher:
             body.decode("utf-8", errors="ignore"),
         )
 
-    def _ensure_topology(self):
-        ch = self._get_channel()
-
-        # FANOUT: routing_key игнорируется, всем привязанным очередям [web:237]
-        ch.exchange_declare(exchange=self.exchange, exchange_type="fanout", durable=True)
-        ch.queue_declare(queue=self.queue, durable=True)
-        ch.queue_bind(exchange=self.exchange, queue=self.queue)
-
-    def publish_event(self, event_type: EventType, car: Car) -> None:
+    def publish_event(self, event_type: EventType, car: "Car", changes: Optional[dict] = None) -> None:
+        """changes — diff изменившихся полей; если передан, вместо снимка автомобиля
+        в событие попадают только его id, dealer_id и изменения."""
+        # message_id и время создаются один раз и сохраняются при буферизации и повторах,
+        # поэтому потребитель может отбросить повторную доставку того же события
+        message_id = uuid.uuid4().hex
+        published_at_ns = time.time_ns()
+        timestamp = published_at_ns / 1e9
         payload = {
+            "messageId": message_id,
+            "occurredAt": timestamp,
             "eventType": event_type,
-            "car": {
-                "id": car.id,
-                "firm": car.firm,
-                "model": car.model,
-                "year": car.year,
-                "power": car.power,
-                "color": car.color,
-                "price": float(car.price) if car.price is not None else None,
-            },
         }
+        if changes is not None:
+            payload["car"] = {"id": car.id, "dealer_id": car.dealer_id}
+            payload["changes"] = changes
+        else:
+            payload["car"] = car_to_dict(car)
         body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        properties = {
+            "message_id": message_id,
+            "timestamp": int(timestamp),
+            "correlation_id": get_correlation_id(),
+            "headers": {
+                amqp.ATTEMPT_HEADER: 0,
+                amqp.TRACEPARENT_HEADER: new_traceparent(),
+                amqp.PUBLISHED_AT_HEADER: published_at_ns,
+            },
+        }
+        routing_key = amqp.routing_key_for(car.id)
+        # полоса — из контекста вызова (api.lanes); буфер хранит exchange вместе с событием
+        exchange = amqp.exchange_for(current_lane())
 
-        try:
-            self._ensure_topology()
-            ch = self._get_channel()
-
-            # Для fanout routing_key пустой [web:237]
-            ch.basic_publish(
-                exchange=self.exchange,
-                routing_key="",
-                body=body,
-                mandatory=True,  # если exchange не сможет доставить -> вернется [web:154]
-                properties=pika.BasicProperties(
-                    content_type="application/json",
-                    delivery_mode=2,
-                ),
-            )
-            logger.info("Published %s event for car_id=%s", event_type, car.id)
+        with self._lock:
+            # Пока в буфере есть неотправленные события, новые тоже идут в буфер —
+            # иначе они обогнали бы более ранние
+            if self._spool_pending is None:
+                self._spool_pending = self.spool.has_pending()
+            # Запрос не подключается к брокеру сам: без готового соединения событие
+            # идёт в буфер, а подключается drainer — вне self._lock
+            if self._spool_pending or not self._connection_ready() or not self.breaker.allow_request():
+                self._spool(exchange, routing_key, body, properties)
+                return
 
-        except Exception:
-            logger.exception("RabbitMQ publish failed")
-            # сбрасываем, чтобы на следующем запросе пересоздалось
             try:
-                if self.channel and self.channel.is_open:
-                    self.channel.close()
+                with span("amqp", f"publish {exchange}"):
+                    self._send(exchange, routing_key, body, properties)
             except Exception:
-                pass
+                logger.exception("RabbitMQ publish failed, spooling %s event for car_id=%s", event_type, car.id)
+                self.breaker.record_failure()
+                self._reset()
+                # соединение восстановит keepalive-поток, не дожидаясь следующей записи
+                self._reconnect.set()
+                self._spool(exchange, routing_key, body, properties)
+                return
+            self.breaker.record_success()
+        logger.info("Published %s event for car_id=%s", event_type, car.id)
+
+    def backlog(self) -> int:
+        """Сколько событий ждёт отправки в локальном буфере."""
+        if not self._spool_pending:
+            return 0
+        return self.spool.count()
+
+    def _send(self, exchange: str, routing_key: str, body: bytes, properties: dict) -> None:
+        if not self._connection_ready():
+            raise AMQPConnectionError("RabbitMQ publisher is not connected")
+
+        # fanout игнорирует routing_key [web:237]; в партиционированном режиме
+        # его использует привязанный direct-exchange
+        self.channel.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            mandatory=True,  # если exchange не сможет доставить -> вернется [web:154]
+            properties=pika.BasicProperties(
+                content_type="application/json",
+                delivery_mode=2,
+                **properties,
+            ),
+        )
+
+    def _reset(self) -> None:
+        # сбрасываем, чтобы на следующей попытке пересоздалось
+        try:
+            if self.channel and self.channel.is_open:
+                self.channel.close()
+        except Exception:
+            pass
+        try:
+            if self.connection and self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+        self.channel = None
+        self.connection = None
+        self._topology_ready = False
+        self.blocked = False
+
+    def _spool(self, exchange: str, routing_key: str, body: bytes, properties: dict) -> None:
+        try:
+            self.spool.append(exchange, routing_key, body, properties)
+        except Exception:
+            logger.exception("Failed to spool event, event lost: %s", body[:200])
+            return
+        self._spool_pending = True
+        self._start_drainer()
+
+    def _start_drainer(self) -> None:
+        if self._drainer is not None and self._drainer.is_alive():
+            return
+        self._drainer = threading.Thread(target=self._drain_loop, name="events-spool-drainer", daemon=True)
+        self._drainer.start()
+
+    def _drain_loop(self) -> None:
+        """Фоновая переотправка буфера по порядку, как только брокер снова доступен."""
+        while True:
+            # Ждём, пока breaker разрешит пробную попытку; без активного ожидания
+            self._wakeup.wait(max(self.breaker.seconds_until_retry(), 0.5))
+            self._wakeup.clear()
+
+            if not self.breaker.allow_request():
+                continue
             try:
-                if self.connection and self.connection.is_open:
-                    self.connection.close()
+                if not self._connection_ready():
+                    self._establish()
+                # отправка по готовому соединению не ждёт подключения
+                with self._lock:
+                    sent = self.spool.drain(
+                        lambda e: self._send(e.exchange, e.routing_key, e.body, e.properties),
+                        batch_size=self.drain_batch_size,
+                    )
+                    if not sent:
+                        # под той же блокировкой: publish_event не успеет добавить событие в буфер
+                        self._spool_pending = False
+                        self._drainer = None
             except Exception:
-                pass
-            self.channel = None
-            self.connection = None
-
-
-class CarRepositoryWithEvents:
-    def __init__(self, repository, publisher: RabbitMQEventPublisher):
-        self._repository = repository
-        self._publisher = publisher
-
-    def list_cars(self):
-        return self._repository.list_cars()
-
-    def get_car(self, car_id: int):
-        return self._repository.get_car(car_id)
-
-    def create_car(self, data):
-        car = self._repository.create_car(data)
-        self._publisher.publish_event("CREATE", car)
-        return car
-
-    def update_car(self, car_id: int, data):
-        car = self._repository.update_car(car_id, data)
-        if car is not None:
-            self._publisher.publish_event("UPDATE", car)
-        return car
-
-    def delete_car(self, car_id: int) -> bool:
-        car = self._repository.get_car(car_id)
-        ok = self._repository.delete_car(car_id)
-        if ok and car is not None:
-            self._publisher.publish_event("DELETE", car)
-        return ok
+                logger.warning("Spool drain failed, broker still unavailable")
+                self.breaker.record_failure()
+                with self._lock:
+                    self._reset()
+                continue
+            self.breaker.record_success()
+            if not sent:
+                return
+            logger.info("Replayed %s spooled events", sent)
+            # следующая пачка сразу, без ожидания
+            self._wakeup.set()
+
+
+def _close_quietly(connection) -> None:
+    try:
+        if connection.is_open:
+            connection.close()
+    except Exception:
+        pass
+
+
+_default_publisher: Optional[RabbitMQEventPublisher] = None
+_default_publisher_lock = threading.Lock()
+
+
+def default_publisher() -> RabbitMQEventPublisher:
+    """Общий publisher процесса: одно соединение с RabbitMQ на все запросы."""
+    global _default_publisher
+    with _default_publisher_lock:
+        if _default_publisher is None:
+            _default_publisher = RabbitMQEventPublisher()
+        return _default_publisher
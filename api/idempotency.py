@@ -0,0 +1,98 @@
+"""Поддержка заголовка Idempotency-Key для изменяющих запросов.
+
+Результат первого запроса с ключом сохраняется в кэше IDEMPOTENCY_CACHE
+(общем для всех процессов, с ограничением размера и истечением) и
+возвращается на повторы без повторного выполнения. Повтор с тем же ключом,
+но другим телом — 422; пока первый запрос выполняется — 409.
+
+Ключ действует в пределах клиента (пользователь или адрес) и маршрута: один и
+тот же Idempotency-Key разных клиентов не пересекается.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+MAX_KEY_LENGTH = 255
+# Запросы к БД, которые добавляет Idempotency-Key при кэше в БД (DatabaseCache):
+# чтение, захват блокировки, повторное чтение, запись ответа и снятие блокировки
+QUERY_OVERHEAD = 12
+# кэш в памяти процесса не видят другие воркеры: повтор, попавший к ним, выполнился бы ещё раз
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def check_cache() -> None:
+    """Отказывается работать с кэшем, который не разделяется между процессами."""
+    cache = caches[settings.IDEMPOTENCY_CACHE]
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        raise ImproperlyConfigured(
+            f"IDEMPOTENCY_CACHE={settings.IDEMPOTENCY_CACHE!r} uses {type(cache).__name__}, which is local "
+            "to one process; configure a shared backend (database, Redis, Memcached)"
+        )
+
+
+def _client(request) -> str:
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return "addr:" + (request.META.get("REMOTE_ADDR") or "unknown")
+
+
+def _fingerprint(request) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _replay(stored: dict, fingerprint: str) -> Response:
+    if stored["fingerprint"] != fingerprint:
+        return Response({"error": f"{HEADER} reused with a different request"}, status=422)
+    return Response(stored["data"], status=stored["status"], headers={"Idempotent-Replayed": "true"})
+
+
+def idempotent(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method not in WRITE_METHODS:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} is too long"}, status=400)
+
+        cache = caches[settings.IDEMPOTENCY_CACHE]
+        scope = "idem:" + hashlib.sha256(
+            f"{_client(request)}:{request.method}:{request.path}:{key}".encode("utf-8")
+        ).hexdigest()
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(scope)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+        lock = scope + ":lock"
+        if not cache.add(lock, True, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            return Response({"error": "A request with this key is in progress"}, status=409)
+        try:
+            # первый запрос мог завершиться между проверкой выше и захватом блокировки
+            stored = cache.get(scope)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+            response = view(request, *args, **kwargs)
+            # серверные ошибки не запоминаем: клиент должен иметь возможность повторить
+            if response.status_code < 500:
+                cache.set(
+                    scope,
+                    {"fingerprint": fingerprint, "status": response.status_code, "data": response.data},
+                )
+            return response
+        finally:
+            cache.delete(lock)
+
+    return wrapper
@@ -0,0 +1,51 @@
+"""Полосы (lanes) событий: interactive и bulk.
+
+События от пользовательских запросов идут в interactive-полосу, массовые
+изменения (импорт, пакетные обновления) — в bulk, чтобы не задерживать
+интерактивные. Полоса берётся из контекста вызова: по умолчанию interactive,
+внутри `with lane(BULK):` — bulk; HTTP-клиент выбирает её заголовком
+X-Event-Lane: bulk.
+
+Модуль не импортирует Django: используется api.events и app.py.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# порядок важен: потребитель при равных кредитах берёт сообщение из первой полосы
+LANES = (INTERACTIVE, BULK)
+
+HEADER = "X-Event-Lane"
+
+_lane: ContextVar[str] = ContextVar("event_lane", default=INTERACTIVE)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def parse_lane(value) -> str:
+    value = (value or "").strip().lower()
+    return value if value in LANES else INTERACTIVE
+
+
+@contextmanager
+def lane(name: str):
+    """События, опубликованные внутри блока, идут в полосу name."""
+    if name not in LANES:
+        raise ValueError(f"Unknown event lane: {name!r}")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class EventLaneMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with lane(parse_lane(request.headers.get(HEADER))):
+            return self.get_response(request)
@@ -0,0 +1,157 @@
+"""Трансляция событий из exchange событий (api.amqp.EXCHANGE) в браузеры (Server-Sent Events).
+
+Один фоновый поток на процесс держит соединение с RabbitMQ и эксклюзивную
+очередь, привязанную к fanout-exchange, и раздаёт каждое событие всем
+подписчикам (по одной ограниченной очереди в памяти на SSE-соединение).
+Медленный подписчик, переполнивший свою очередь, получает событие reset и
+должен перезагрузить список целиком.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Optional, Set
+
+import pika
+from pika.exceptions import AMQPError
+
+from . import amqp
+from .lanes import LANES
+
+logger = logging.getLogger(__name__)
+
+RESET = object()
+
+
+class Subscription:
+    def __init__(self, maxsize: int) -> None:
+        self.queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def push(self, message) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+            # освобождаем место под маркер сброса
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(RESET)
+
+    def get(self, timeout: float):
+        message = self.queue.get(timeout=timeout)
+        if message is RESET:
+            self.overflowed = False
+        return message
+
+
+class EventRelay:
+    def __init__(self, subscriber_queue_size: int = 1000, max_reconnect_delay: float = 30.0) -> None:
+        self.subscriber_queue_size = subscriber_queue_size
+        self.max_reconnect_delay = max_reconnect_delay
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="sse-event-relay", daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _broadcast(self, message: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.push(message)
+
+    def _has_subscribers(self) -> bool:
+        with self._lock:
+            if self._subscribers:
+                return True
+            # последний подписчик ушёл — поток завершается, следующий subscribe запустит новый
+            self._thread = None
+            return False
+
+    def _run(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                self._consume()
+                return
+            except AMQPError:
+                logger.warning("SSE relay lost RabbitMQ connection, reconnecting in %.1fs", delay)
+                # клиенты могли пропустить события — пусть перечитают список
+                self._broadcast(RESET)
+            except Exception:
+                # любая другая ошибка не должна молча останавливать поток при живых подписчиках
+                logger.exception("SSE relay failed, reconnecting in %.1fs", delay)
+                self._broadcast(RESET)
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+            if not self._has_subscribers():
+                return
+
+    def _consume(self) -> None:
+        connection = pika.BlockingConnection(amqp.connection_parameters())
+        try:
+            channel = connection.channel()
+            amqp.declare_topology(channel)
+            result = channel.queue_declare(queue="", exclusive=True, auto_delete=True)
+            for lane in LANES:
+                channel.queue_bind(exchange=amqp.exchange_for(lane), queue=result.method.queue)
+            for method, properties, body in channel.consume(
+                result.method.queue, auto_ack=True, inactivity_timeout=5
+            ):
+                if method is None:
+                    if not self._has_subscribers():
+                        return
+                    continue
+                try:
+                    self._broadcast(json.loads(body))
+                except ValueError:
+                    logger.warning("SSE relay skipped malformed event")
+        finally:
+            if connection.is_open:
+                connection.close()
+
+
+relay = EventRelay()
+
+
+def sse_stream(source: Optional[EventRelay] = None, heartbeat: float = 15.0):
+    """Генератор текста text/event-stream для одного подписчика.
+
+    Подписка оформляется внутри генератора: если ответ так и не начали
+    отдавать, подписки нет, а закрытие генератора всегда её снимает.
+    """
+    source = source or relay
+    subscription = source.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = subscription.get(timeout=heartbeat)
+            except queue.Empty:
+                # комментарий держит соединение открытым через прокси
+                yield ": ping\n\n"
+                continue
+            if message is RESET:
+                yield "event: reset\ndata: {}\n\n"
+                continue
+            data = json.dumps(message, ensure_ascii=False)
+            yield f"id: {message.get('messageId', '')}\nevent: car\ndata: {data}\n\n"
+    finally:
+        source.unsubscribe(subscription)
@@ -0,0 +1,64 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import amqp, metrics
+from api.consumer import DEFAULT_LANE_WEIGHTS, CarEventConsumer
+from api.dedupe import DedupeWindow
+from api.lanes import BULK, INTERACTIVE
+
+logger = logging.getLogger("api.consumer")
+
+
+def log_event(payload: dict) -> None:
+    car = payload.get("car") or {}
+    logger.info("Received %s event for car_id=%s", payload.get("eventType"), car.get("id"))
+
+
+def assigned_queues(worker_index: int, workers: int) -> list:
+    """Партиции воркера: p, для которых p % workers == worker_index."""
+    partitions = amqp.partition_count()
+    if not partitions:
+        return [amqp.QUEUE]
+    return [amqp.partition_queue_name(p) for p in range(partitions) if p % workers == worker_index]
+
+
+class Command(BaseCommand):
+    help = "Читает события об автомобилях из RabbitMQ (с retry-очередями и parking lot)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", help="Очередь; по умолчанию — по партициям воркера")
+        parser.add_argument("--workers", type=int, default=1, help="Всего воркеров (RABBITMQ_PARTITIONS > 0)")
+        parser.add_argument("--worker-index", type=int, default=0, help="Номер этого воркера, 0..workers-1")
+        parser.add_argument("--prefetch", type=int, default=10)
+        parser.add_argument("--dedupe-window", type=int, default=100_000, help="Сколько последних message_id помнить")
+        parser.add_argument(
+            "--interactive-weight", type=int, default=DEFAULT_LANE_WEIGHTS[INTERACTIVE],
+            help="Доля interactive-полосы во взвешенном round-robin",
+        )
+        parser.add_argument(
+            "--bulk-weight", type=int, default=DEFAULT_LANE_WEIGHTS[BULK],
+            help="Доля bulk-полосы; 0 — не читать bulk",
+        )
+        parser.add_argument("--metrics-port", type=int, default=0, help="Порт /metrics с гистограммами задержки; 0 — выкл.")
+
+    def handle(self, *args, **options):
+        workers, index = options["workers"], options["worker_index"]
+        if workers < 1 or not 0 <= index < workers:
+            raise CommandError("--worker-index must be in 0..workers-1")
+        queues = options["queue"] or assigned_queues(index, workers)
+        if not queues:
+            raise CommandError("No partitions assigned to this worker")
+        weights = {INTERACTIVE: options["interactive_weight"], BULK: options["bulk_weight"]}
+        if min(weights.values()) < 0 or not any(weights.values()):
+            raise CommandError("Lane weights must be >= 0 and not all zero")
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+        consumer = CarEventConsumer(
+            log_event,
+            queues=queues,
+            prefetch_count=options["prefetch"],
+            dedupe=DedupeWindow(options["dedupe_window"]),
+            lane_weights=weights,
+        )
+        consumer.run()
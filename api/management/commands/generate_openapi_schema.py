@@ -0,0 +1,18 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.docs import generate_schema
+
+
+class Command(BaseCommand):
+    help = "Генерирует OpenAPI-схему в файл, который затем отдаётся по /swagger.json без интроспекции."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", type=Path, help="Путь к файлу; по умолчанию OPENAPI_SCHEMA_PATH")
+
+    def handle(self, *args, **options):
+        output = options["output"] or settings.OPENAPI_SCHEMA_PATH
+        output.write_bytes(generate_schema())
+        self.stdout.write(self.style.SUCCESS(f"Wrote OpenAPI schema to {output}"))
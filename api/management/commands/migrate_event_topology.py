@@ -0,0 +1,16 @@
+import pika
+from django.core.management.base import BaseCommand
+
+from api import amqp
+
+
+class Command(BaseCommand):
+    help = "Подключает старые cars_events_exchange/cars_events_queue к текущей топологии событий."
+
+    def handle(self, *args, **options):
+        connection = pika.BlockingConnection(amqp.connection_parameters())
+        try:
+            moved = amqp.migrate_legacy_topology(connection)
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} messages from {amqp.LEGACY_QUEUE}"))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from pika.exceptions import AMQPError
+
+from api import metrics
+from api.monitoring import QueueLagMonitor
+
+
+class Command(BaseCommand):
+    help = "Следит за глубиной очередей событий и числом потребителей; метрики — на /metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=15.0, help="Пауза между проверками, с")
+        parser.add_argument("--metrics-port", type=int, default=9108, help="Порт /metrics; 0 — не поднимать")
+        parser.add_argument("--once", action="store_true", help="Одна проверка; код выхода 1 при алерте")
+
+    def handle(self, *args, **options):
+        monitor = QueueLagMonitor(interval=options["interval"])
+        if options["once"]:
+            try:
+                snapshot = monitor.check_once()
+            except AMQPError as e:
+                raise CommandError(f"RabbitMQ unavailable: {e!r}")
+            for queue, state in snapshot.items():
+                self.stdout.write(
+                    f"{queue}: depth={state.depth} consumers={state.consumers} alerts={','.join(state.alerts) or '-'}"
+                )
+            if monitor.alerting():
+                raise CommandError("Queue thresholds exceeded")
+            return
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+        monitor.run()
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api import sharding
+from api.models import Dealer
+from api.search import rebuild_search_index, reindex_dealer
+
+
+class Command(BaseCommand):
+    help = (
+        "Шарды автомобилей: без аргументов — загрузка шардов; --sync-dealers, --import-default, "
+        "перенос дилера (--dealer/--to) или автоматическая балансировка (--auto)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync-dealers", action="store_true", help="Скопировать всех дилеров в каждый шард")
+        parser.add_argument(
+            "--import-default", action="store_true",
+            help="Разложить автомобили из основной БД (до шардирования) по шардам дилеров",
+        )
+        parser.add_argument("--dealer", type=int, help="Перенести автомобили этого дилера")
+        parser.add_argument("--to", help="Шард назначения для --dealer")
+        parser.add_argument("--auto", action="store_true", help="Выровнять шарды переносом крупнейших дилеров")
+        parser.add_argument("--max-moves", type=int, default=10, help="Не больше стольких переносов за --auto")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать план --auto")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError("Sharding is disabled: set CAR_SHARDS (SQLite) or PG_SHARD_HOSTS")
+        batch_size = options["batch_size"]
+
+        if options["sync_dealers"] or options["import_default"]:
+            count = sharding.sync_dealers()
+            self.stdout.write(f"Synced {count} dealers to {', '.join(settings.CAR_SHARDS)}")
+        if options["import_default"]:
+            self._import_default(batch_size)
+
+        if options["dealer"] is not None:
+            if options["to"] not in settings.CAR_SHARDS:
+                raise CommandError(f"--to must be one of {', '.join(settings.CAR_SHARDS)}")
+            self._move(options["dealer"], options["to"], batch_size)
+        elif options["to"]:
+            raise CommandError("--to requires --dealer")
+
+        if options["auto"]:
+            plan = sharding.plan_rebalance(sharding.dealer_loads(), options["max_moves"])
+            for dealer_id, source, target in plan:
+                self.stdout.write(f"dealer {dealer_id}: {source} -> {target}")
+                if not options["dry_run"]:
+                    self._move(dealer_id, target, batch_size)
+            if not plan:
+                self.stdout.write("Shards are balanced")
+
+        for shard, dealers in sharding.dealer_loads().items():
+            self.stdout.write(f"{shard}: {sum(dealers.values())} cars, {len(dealers)} dealers")
+
+    def _move(self, dealer_id: int, target: str, batch_size: int) -> None:
+        self.stdout.write(f"Moving dealer {dealer_id} to {target}, writes paused for it...")
+        try:
+            moved = sharding.move_dealer(dealer_id, target, batch_size)
+        except Exception as e:
+            raise CommandError(
+                f"Move of dealer {dealer_id} failed ({e!r}); writes stay paused, rerun the command to resume"
+            )
+        # перезапуск мог начаться после переключения шарда — исходный шард тогда
+        # уже неизвестен, поэтому индекс дилера пересобирается во всех шардах
+        for alias in settings.CAR_SHARDS:
+            reindex_dealer(dealer_id, alias)
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} cars of dealer {dealer_id}"))
+
+    def _import_default(self, batch_size: int) -> None:
+        total = 0
+        for dealer_id in Dealer.objects.using(DEFAULT_DB_ALIAS).order_by("id").values_list("id", flat=True):
+            shard, _ = sharding.shard_map.placement(dealer_id)
+            total += sharding.copy_dealer_cars(dealer_id, DEFAULT_DB_ALIAS, shard, batch_size)
+        rebuild_search_index()
+        # строки в основной БД не удаляются: при шардировании их никто не читает,
+        # а до проверки результата они остаются резервной копией
+        self.stdout.write(self.style.SUCCESS(f"Imported {total} cars from {DEFAULT_DB_ALIAS} into shards"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.stats import rebuild_dealer_stats
+
+
+class Command(BaseCommand):
+    help = "Полностью пересчитывает материализованную статистику дилеров (dealer_firm_stats)."
+
+    def handle(self, *args, **options):
+        groups = rebuild_dealer_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt dealer stats: {groups} groups"))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-19 00:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Dealer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('city', models.CharField(max_length=50)),
+                ('address', models.CharField(max_length=100)),
+                ('area', models.CharField(max_length=50)),
+                ('rating', models.DecimalField(decimal_places=1, max_digits=3)),
+            ],
+            options={
+                'db_table': 'dealers',
+            },
+        ),
+        migrations.CreateModel(
+            name='Car',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('firm', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=50)),
+                ('year', models.IntegerField()),
+                ('power', models.IntegerField()),
+                ('color', models.CharField(max_length=30)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('dealer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.dealer')),
+            ],
+            options={
+                'db_table': 'cars',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-19 00:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DealerFirmStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('firm', models.CharField(max_length=50)),
+                ('car_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('power_sum', models.BigIntegerField(default=0)),
+                ('power_min', models.IntegerField(null=True)),
+                ('power_max', models.IntegerField(null=True)),
+                ('power_buckets', models.JSONField(default=dict)),
+            ],
+            options={
+                'db_table': 'dealer_firm_stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['dealer', 'firm'], name='cars_dealer_firm_idx'),
+        ),
+        migrations.AddField(
+            model_name='dealerfirmstats',
+            name='dealer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='firm_stats', to='api.dealer'),
+        ),
+        migrations.AddConstraint(
+            model_name='dealerfirmstats',
+            constraint=models.UniqueConstraint(fields=('dealer', 'firm'), name='dealer_firm_stats_uniq'),
+        ),
+    ]
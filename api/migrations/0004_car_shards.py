@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-19 00:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_car_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarIdBlock',
+            fields=[
+                ('hi', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('shard', models.CharField(max_length=50)),
+            ],
+            options={
+                'db_table': 'car_id_blocks',
+            },
+        ),
+        migrations.CreateModel(
+            name='DealerShard',
+            fields=[
+                ('dealer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='api.dealer')),
+                ('shard', models.CharField(max_length=50)),
+                ('moving', models.BooleanField(default=False)),
+            ],
+            options={
+                'db_table': 'dealer_shards',
+            },
+        ),
+    ]
@@ -23,5 +23,58 @@ class Car(models.Model):
 
     class Meta:
         db_table = "cars"
+        indexes = [
+            # пересчёт min/max группы (дилер, фирма) после удаления
+            models.Index(fields=["dealer", "firm"], name="cars_dealer_firm_idx"),
+        ]
 
 
+class DealerFirmStats(models.Model):
+    """Материализованные агрегаты по автомобилям дилера в разрезе фирмы.
+
+    Поддерживаются инкрементально из событий CREATE/UPDATE/DELETE
+    (см. api.stats.DealerStatsAggregator), полный пересчёт — rebuild_dealer_stats.
+    """
+
+    dealer = models.ForeignKey(Dealer, on_delete=models.CASCADE, related_name="firm_stats")
+    firm = models.CharField(max_length=50)
+    car_count = models.IntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    price_min = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    power_sum = models.BigIntegerField(default=0)
+    power_min = models.IntegerField(null=True)
+    power_max = models.IntegerField(null=True)
+    # гистограмма мощности: нижняя граница корзины (л.с.) -> количество
+    power_buckets = models.JSONField(default=dict)
+
+    class Meta:
+        db_table = "dealer_firm_stats"
+        constraints = [
+            models.UniqueConstraint(fields=["dealer", "firm"], name="dealer_firm_stats_uniq"),
+        ]
+
+
+class DealerShard(models.Model):
+    """Шард, на котором лежат автомобили дилера (api.sharding).
+
+    Запись создаётся при первом обращении к дилеру; moving=True, пока
+    rebalance_car_shards переносит автомобили, — запись по дилеру отклоняется.
+    """
+
+    dealer = models.OneToOneField(Dealer, on_delete=models.CASCADE, primary_key=True, related_name="shard")
+    shard = models.CharField(max_length=50)
+    moving = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "dealer_shards"
+
+
+class CarIdBlock(models.Model):
+    """Блок ID автомобилей [hi * ID_BLOCK_SIZE, (hi + 1) * ID_BLOCK_SIZE), выданный шарду (hi/lo)."""
+
+    hi = models.BigIntegerField(primary_key=True)
+    shard = models.CharField(max_length=50)
+
+    class Meta:
+        db_table = "car_id_blocks"
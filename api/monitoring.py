@@ -0,0 +1,138 @@
+"""Мониторинг отставания потребителей: глубина очередей событий и число потребителей.
+
+QueueLagMonitor периодически делает пассивный queue_declare (очередь не создаётся
+и не меняется) и публикует результат в метриках; при превышении порогов пишет
+предупреждение в лог и выставляет cars_events_queue_alert=1.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+import pika
+from pika.exceptions import AMQPError, ChannelClosedByBroker
+
+from . import amqp
+from .lanes import LANES
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+QUEUE_MESSAGES = registry.gauge("cars_events_queue_messages", "Сообщений в очереди (готовых к доставке)", ["queue"])
+QUEUE_CONSUMERS = registry.gauge("cars_events_queue_consumers", "Потребителей очереди", ["queue"])
+QUEUE_ALERT = registry.gauge("cars_events_queue_alert", "1, если порог очереди превышен", ["queue", "reason"])
+MONITOR_UP = registry.gauge("cars_events_monitor_up", "1, если последняя проверка очередей удалась")
+LAST_CHECK = registry.gauge("cars_events_monitor_last_check_timestamp_seconds", "Время последней успешной проверки")
+
+
+@dataclass(frozen=True)
+class QueueThresholds:
+    max_depth: int
+    min_consumers: int = 0
+
+
+@dataclass
+class QueueState:
+    depth: Optional[int] = None
+    consumers: Optional[int] = None
+    alerts: tuple = ()
+
+
+def default_thresholds() -> Dict[str, QueueThresholds]:
+    """Рабочие очереди (или партиции) обеих полос и parking lot; пороги — из окружения."""
+    work = QueueThresholds(
+        max_depth=int(os.getenv("LAG_ALERT_DEPTH", "1000")),
+        min_consumers=int(os.getenv("LAG_ALERT_MIN_CONSUMERS", "1")),
+    )
+    thresholds = {queue: work for lane in LANES for queue in amqp.work_queues(lane)}
+    thresholds[amqp.PARKING_QUEUE] = QueueThresholds(max_depth=int(os.getenv("LAG_ALERT_PARKED", "0")))
+    return thresholds
+
+
+class QueueLagMonitor:
+    def __init__(
+        self,
+        thresholds: Optional[Mapping[str, QueueThresholds]] = None,
+        interval: float = 15.0,
+    ) -> None:
+        self.thresholds = dict(thresholds or default_thresholds())
+        self.interval = interval
+        self._state: Dict[str, QueueState] = {queue: QueueState() for queue in self.thresholds}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def snapshot(self) -> Dict[str, QueueState]:
+        with self._lock:
+            return dict(self._state)
+
+    def alerting(self) -> bool:
+        return any(state.alerts for state in self.snapshot().values())
+
+    def start(self) -> None:
+        """Запускает проверки в фоновом потоке (например, внутри веб-процесса)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.run, name="queue-lag-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.check_once()
+            except AMQPError:
+                MONITOR_UP.set(0)
+                logger.warning("Queue lag check failed: RabbitMQ unavailable")
+            self._stopped.wait(self.interval)
+
+    def check_once(self) -> Dict[str, QueueState]:
+        connection = pika.BlockingConnection(amqp.connection_parameters())
+        try:
+            channel = connection.channel()
+            for queue, thresholds in self.thresholds.items():
+                try:
+                    result = channel.queue_declare(queue=queue, passive=True)
+                except ChannelClosedByBroker as e:
+                    # 404: очередь ещё не объявлена; брокер закрыл канал — открываем новый
+                    logger.warning("Queue %s is not declared: %s", queue, e.reply_text)
+                    channel = connection.channel()
+                    self._update(queue, thresholds, None, None)
+                    continue
+                self._update(queue, thresholds, result.method.message_count, result.method.consumer_count)
+        finally:
+            if connection.is_open:
+                connection.close()
+        MONITOR_UP.set(1)
+        LAST_CHECK.set(time.time())
+        return self.snapshot()
+
+    def _update(self, queue: str, thresholds: QueueThresholds, depth, consumers) -> None:
+        alerts = []
+        if depth is not None and depth > thresholds.max_depth:
+            alerts.append("depth")
+        if consumers is not None and consumers < thresholds.min_consumers:
+            alerts.append("consumers")
+        if depth is None:
+            alerts.append("missing")
+
+        with self._lock:
+            previous = self._state.get(queue, QueueState())
+            self._state[queue] = QueueState(depth, consumers, tuple(alerts))
+
+        QUEUE_MESSAGES.set(depth if depth is not None else -1, queue=queue)
+        QUEUE_CONSUMERS.set(consumers if consumers is not None else -1, queue=queue)
+        for reason in ("depth", "consumers", "missing"):
+            QUEUE_ALERT.set(1 if reason in alerts else 0, queue=queue, reason=reason)
+
+        # в лог пишем только смену состояния, а не каждую проверку
+        if alerts and set(alerts) != set(previous.alerts):
+            logger.warning(
+                "Queue %s alert %s: depth=%s (max %s), consumers=%s (min %s)",
+                queue, ",".join(alerts), depth, thresholds.max_depth, consumers, thresholds.min_consumers,
+            )
+        elif not alerts and previous.alerts:
+            logger.info("Queue %s back to normal: depth=%s consumers=%s", queue, depth, consumers)
@@ -0,0 +1,239 @@
+"""Выборочное профилирование запросов.
+
+Статистический профайлер: фоновый поток раз в PROFILING_INTERVAL_MS снимает
+стек потоков, обрабатывающих профилируемые запросы (sys._current_frames), и
+считает одинаковые стеки. Участки, обёрнутые в span() (SQL-запросы, публикация
+в RabbitMQ), добавляются к стеку листом вида "[db] SELECT ...", а их длительность
+суммируется отдельно. Результат — collapsed stacks ("a;b;c 12"), которые
+понимают flamegraph.pl и speedscope.
+
+Модуль не импортирует Django на верхнем уровне: span() вызывается из api.events,
+который используется и в app.py.
+"""
+import hmac
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+HEADER = "X-Profile"
+RESPONSE_HEADER = "X-Profile-Id"
+
+_active: ContextVar[Optional["Profile"]] = ContextVar("active_profile", default=None)
+
+
+class Profile:
+    def __init__(self, method: str, path: str) -> None:
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.status: Optional[int] = None
+        self.samples: Counter = Counter()
+        # kind -> {"count", "total_ms"}
+        self.spans: Dict[str, dict] = {}
+        self.slowest: List[dict] = []
+        # лист стека для сэмплера: что поток делает прямо сейчас
+        self.current_span: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def record_span(self, kind: str, detail: str, elapsed_ms: float, keep_slowest: int = 10) -> None:
+        with self._lock:
+            totals = self.spans.setdefault(kind, {"count": 0, "total_ms": 0.0})
+            totals["count"] += 1
+            totals["total_ms"] += elapsed_ms
+            self.slowest.append({"kind": kind, "detail": detail, "ms": round(elapsed_ms, 3)})
+            self.slowest.sort(key=lambda s: s["ms"], reverse=True)
+            del self.slowest[keep_slowest:]
+
+    def add_sample(self, stack: str) -> None:
+        with self._lock:
+            self.samples[stack] += 1
+
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "id": self.id,
+                "method": self.method,
+                "path": self.path,
+                "status": self.status,
+                "started_at": self.started_at,
+                "duration_ms": round(self.duration_ms, 3),
+                "samples": sum(self.samples.values()),
+                "spans": {k: {"count": v["count"], "total_ms": round(v["total_ms"], 3)} for k, v in self.spans.items()},
+            }
+
+    def to_dict(self) -> dict:
+        data = self.summary()
+        with self._lock:
+            data["slowest"] = list(self.slowest)
+        data["collapsed"] = self.collapsed()
+        return data
+
+
+@contextmanager
+def span(kind: str, detail: str = ""):
+    """Замеряет участок кода внутри профилируемого запроса; вне профиля почти бесплатен."""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    label = f"[{kind}] {detail}".strip()
+    outer = profile.current_span
+    profile.current_span = label
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.current_span = outer
+        profile.record_span(kind, detail, (time.perf_counter() - start) * 1000)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler:
+    """Один поток на процесс; работает, пока есть хотя бы один профилируемый запрос."""
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 128) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self._targets: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int, profile: Profile) -> None:
+        with self._lock:
+            self._targets[thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id: int) -> None:
+        with self._lock:
+            self._targets.pop(thread_id, None)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = dict(self._targets)
+            frames = sys._current_frames()
+            for thread_id, profile in targets.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                names.reverse()
+                leaf = profile.current_span
+                if leaf:
+                    # ";" и переводы строк ломают формат collapsed stacks
+                    names.append(" ".join(leaf.replace(";", ",").split()))
+                profile.add_sample(";".join(names))
+
+
+class ProfileStore:
+    """Последние maxsize профилей в памяти процесса."""
+
+    def __init__(self, maxsize: int = 50) -> None:
+        self._profiles: deque = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self._profiles = deque(self._profiles, maxlen=maxsize)
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[Profile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+
+store = ProfileStore()
+sampler = Sampler()
+
+
+def is_authorized(request, token: str) -> bool:
+    supplied = request.headers.get(HEADER, "")
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+class ProfilingMiddleware:
+    """Профилирует долю PROFILING_SAMPLE_RATE запросов и каждый запрос с X-Profile: <PROFILING_TOKEN>.
+
+    Id профиля возвращается в X-Profile-Id; сами профили — GET /admin/profiles.
+    """
+
+    def __init__(self, get_response):
+        from django.conf import settings
+
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.token = settings.PROFILING_TOKEN
+        sampler.interval = settings.PROFILING_INTERVAL_MS / 1000
+        store.resize(settings.PROFILING_MAX_PROFILES)
+
+    def _should_profile(self, request) -> bool:
+        if request.path.startswith("/admin/profiles"):
+            return False
+        if HEADER in request.headers:
+            return is_authorized(request, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        from django.db import connections
+
+        profile = Profile(request.method, request.path)
+        token = _active.set(profile)
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        sampler.start(thread_id, profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_db_span(connection.alias)))
+                response = self.get_response(request)
+        finally:
+            sampler.stop(thread_id)
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            _active.reset(token)
+        profile.status = response.status_code
+        store.add(profile)
+        response[RESPONSE_HEADER] = profile.id
+        return response
+
+
+def _db_span(alias: str):
+    def wrapper(execute, sql, params, many, context):
+        with span(f"db {alias}", sql[:120]):
+            return execute(sql, params, many, context)
+
+    return wrapper
@@ -0,0 +1,95 @@
+"""pytest-плагин бюджетов SQL-запросов (см. dal.audit).
+
+Подключение: `pytest -p api.pytest_plugin` или `pytest_plugins = ["api.pytest_plugin"]`
+в conftest.py. Фикстура query_audit переводит проверку в режим raise: запрос
+тестового клиента Django или Flask, превысивший бюджет или повторивший одну
+форму запроса (N+1), падает с QueryBudgetExceeded. Заодно она проверяет,
+что у каждого представления api.views и каждого маршрута app.py есть
+@query_budget.
+"""
+import sys
+from contextlib import ExitStack, contextmanager
+from typing import List, Optional
+
+import pytest
+
+from dal import audit
+
+VIEWS_MODULE = "api.views"
+
+
+def _django_configured() -> bool:
+    try:
+        from django.conf import settings
+    except ImportError:
+        return False
+    return settings.configured
+
+
+def django_views() -> list:
+    """(маршрут, представление) для URL, которые обслуживает api.views."""
+    if not _django_configured():
+        return []
+    from django.urls import get_resolver
+
+    def walk(patterns):
+        for pattern in patterns:
+            if hasattr(pattern, "url_patterns"):
+                yield from walk(pattern.url_patterns)
+            else:
+                yield pattern
+
+    return [
+        (str(pattern.pattern), pattern.callback)
+        for pattern in walk(get_resolver().url_patterns)
+        if pattern.callback.__module__ == VIEWS_MODULE
+    ]
+
+
+def flask_views() -> list:
+    """(маршрут, обработчик) приложения app.py."""
+    # app.py при импорте создаёт publisher; проверяем маршруты, только если
+    # тесты сами его импортировали
+    module = sys.modules.get("app")
+    flask_app = getattr(module, "app", None)
+    if flask_app is None:
+        return []
+    return [
+        (rule.rule, flask_app.view_functions[rule.endpoint])
+        for rule in flask_app.url_map.iter_rules()
+        if rule.endpoint != "static"
+    ]
+
+
+def missing_budgets() -> List[str]:
+    """Маршруты api.views и app.py без @query_budget."""
+    return [
+        f"{route} ({getattr(view, '__name__', view)})"
+        for route, view in django_views() + flask_views()
+        if not getattr(view, "query_budgets", None)
+    ]
+
+
+@pytest.fixture
+def query_audit():
+    """Бюджеты запросов проверяются в режиме raise на время теста."""
+    missing = missing_budgets()
+    assert not missing, "Routes without @query_budget: " + ", ".join(missing)
+    with audit.enforcing("raise"):
+        yield
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, max_repeats: int = audit.DEFAULT_MAX_REPEATS,
+                       label: Optional[str] = None):
+    """Бюджет для произвольного блока кода в тесте, не только HTTP-запроса.
+
+    Учитываются запросы соединений Django (если настроен) и курсоров dal.pool.
+    """
+    with audit.auditing() as record, ExitStack() as stack:
+        if _django_configured():
+            from .query_audit import recording
+
+            stack.enter_context(recording())
+        yield record
+    audit.check(record, audit.Budget(max_queries, max_repeats), label or "block", "raise")
@@ -0,0 +1,71 @@
+"""Бюджеты SQL-запросов для представлений Django (см. dal.audit).
+
+Middleware учитывает запросы ко всем базам на время обработки и сверяет их
+с бюджетом представления (@query_budget в api/views.py; без него —
+QUERY_BUDGET_DEFAULT). QUERY_AUDIT_MODE: log — предупреждение в лог, raise —
+QueryBudgetExceeded, off — аудит выключен.
+"""
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from dal import audit
+
+from .metrics import registry
+
+EXCEEDED = registry.counter("cars_query_budget_exceeded_total", "Превышения бюджета SQL-запросов", ["view"])
+QUERIES = registry.histogram(
+    "cars_request_queries", "SQL-запросов на HTTP-запрос", ["view"],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+
+def view_label(view_func) -> str:
+    # у представлений @api_view имя функции — "view", имя обработчика — у cls
+    name = getattr(getattr(view_func, "cls", None), "__name__", view_func.__name__)
+    return f"{view_func.__module__}.{name}"
+
+
+@contextmanager
+def recording():
+    """Запросы всех соединений Django внутри блока учитываются активным аудитом."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(audit.record_execute))
+        yield
+
+
+class QueryAuditMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode = settings.QUERY_AUDIT_MODE
+        self.default_budget = audit.Budget(settings.QUERY_BUDGET_DEFAULT)
+
+    def __call__(self, request):
+        if audit.current_mode(self.mode) == "off":
+            return self.get_response(request)
+
+        token = audit.begin()
+        try:
+            with recording():
+                response = self.get_response(request)
+        finally:
+            record = audit.finish(token)
+
+        view = getattr(request, "query_audit_view", None)
+        if view is None:
+            # URL не найден — проверять нечего
+            return response
+        label = view_label(view)
+        QUERIES.observe(record.count, view=label)
+        budget = audit.budget_for(view, request.method) or self.default_budget
+        problems = audit.violations(record, budget)
+        if problems:
+            EXCEEDED.inc(view=label)
+            audit.report(problems, f"{request.method} {label}", audit.current_mode(self.mode))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_audit_view = view_func
+        return None
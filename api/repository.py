@@ -1,53 +1,41 @@
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass
+from dataclasses import asdict
 from typing import List, Optional
 
-from .models import Car, Dealer
+from django.db import transaction
 
+from dal import CAR_COLUMNS, CarData, car_to_dict
 
-@dataclass
-class CarData:
-    firm: str
-    model: str
-    year: int
-    power: int
-    color: str
-    price: float
-    dealer_id: int
-
-    @classmethod
-    def from_dict(cls, data: dict) -> "CarData":
-        return cls(
-            firm=data["firm"],
-            model=data["model"],
-            year=data["year"],
-            power=data["power"],
-            color=data["color"],
-            price=data["price"],
-            dealer_id=data["dealer_id"],
-        )
+from .models import Car, Dealer
+
+__all__ = ["CarData", "CarRepository", "car_to_dict", "page_car_rows"]
 
 
-def car_to_dict(car: Car) -> dict:
-    return {
-        "id": car.id,
-        "firm": car.firm,
-        "model": car.model,
-        "year": car.year,
-        "power": car.power,
-        "color": car.color,
-        "price": float(car.price) if car.price is not None else None,
-        "dealer_id": car.dealer_id,
-    }
+def page_car_rows(cars, after_id: Optional[int] = None, limit: Optional[int] = None) -> list:
+    """Строки CAR_COLUMNS по возрастанию id; after_id/limit — keyset-пагинация."""
+    cars = cars.order_by("id")
+    if after_id is not None:
+        cars = cars.filter(id__gt=after_id)
+    if limit is not None:
+        cars = cars[:limit]
+    return list(cars.values_list(*CAR_COLUMNS))
 
 
 class CarRepository:
     """Отвечает только за работу с БД (без событий)."""
 
+    def atomic(self):
+        """Транзакция записи; CarRepositoryWithEvents выполняет в ней и подписчиков."""
+        return transaction.atomic()
+
     def list_cars(self) -> List[Car]:
         return list(Car.objects.all().order_by("id"))
 
+    def list_car_rows(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> list:
+        """Строки в порядке CAR_COLUMNS, без создания ORM-объектов."""
+        return page_car_rows(Car.objects.all(), after_id, limit)
+
     def get_car(self, car_id: int) -> Optional[Car]:
         try:
             return Car.objects.get(pk=car_id)
@@ -68,26 +56,38 @@ class CarRepository:
         return car
 
     def update_car(self, car_id: int, data: CarData) -> Optional[Car]:
+        return self.patch_car(car_id, asdict(data))
+
+    def patch_car(self, car_id: int, fields: dict) -> Optional[Car]:
+        """Обновляет переданные поля; в UPDATE попадают только реально изменившиеся колонки.
+
+        Бросает Dealer.DoesNotExist для несуществующего дилера и ValidationError
+        для значений, которые нельзя привести к типу поля.
+        """
         car = self.get_car(car_id)
         if car is None:
             return None
-        dealer = Dealer.objects.get(pk=data.dealer_id)
-        car.firm = data.firm
-        car.model = data.model
-        car.year = data.year
-        car.power = data.power
-        car.color = data.color
-        car.price = data.price
-        car.dealer = dealer
-        car.save()
+        changed = self._set_fields(car, fields)
+        if "dealer_id" in changed and not Dealer.objects.filter(pk=car.dealer_id).exists():
+            raise Dealer.DoesNotExist
+        if changed:
+            car.save(update_fields=changed)
         return car
 
+    @staticmethod
+    def _set_fields(car: Car, fields: dict) -> list:
+        """Присваивает значения, приведённые к типам полей; возвращает изменившиеся поля."""
+        changed = []
+        for name, value in fields.items():
+            value = Car._meta.get_field(name).to_python(value)
+            if getattr(car, name) != value:
+                setattr(car, name, value)
+                changed.append(name)
+        return changed
+
     def delete_car(self, car_id: int) -> bool:
         car = self.get_car(car_id)
         if car is None:
             return False
         car.delete()
         return True
-
-
-
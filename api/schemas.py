@@ -0,0 +1,251 @@
+"""Описание API для drf_yasg: схемы запросов/ответов и swagger_auto_schema для views.
+
+Модуль импортирует drf_yasg и поэтому подключается только при генерации схемы
+(api.docs, команда generate_openapi_schema), а не при импорте api.views.
+"""
+import threading
+
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+
+from . import views
+
+dealer_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "id": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "name": openapi.Schema(type=openapi.TYPE_STRING),
+        "city": openapi.Schema(type=openapi.TYPE_STRING),
+        "address": openapi.Schema(type=openapi.TYPE_STRING),
+        "area": openapi.Schema(type=openapi.TYPE_STRING),
+        "rating": openapi.Schema(type=openapi.TYPE_NUMBER),
+    },
+)
+
+dealer_create_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    required=["name", "city", "address", "area", "rating"],
+    properties={
+        "name": openapi.Schema(type=openapi.TYPE_STRING),
+        "city": openapi.Schema(type=openapi.TYPE_STRING),
+        "address": openapi.Schema(type=openapi.TYPE_STRING),
+        "area": openapi.Schema(type=openapi.TYPE_STRING),
+        "rating": openapi.Schema(type=openapi.TYPE_NUMBER),
+    },
+)
+
+car_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "id": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "firm": openapi.Schema(type=openapi.TYPE_STRING),
+        "model": openapi.Schema(type=openapi.TYPE_STRING),
+        "year": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "power": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "color": openapi.Schema(type=openapi.TYPE_STRING),
+        "price": openapi.Schema(type=openapi.TYPE_NUMBER),
+        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
+    },
+)
+
+price_summary_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "avg": openapi.Schema(type=openapi.TYPE_NUMBER),
+        "min": openapi.Schema(type=openapi.TYPE_NUMBER),
+        "max": openapi.Schema(type=openapi.TYPE_NUMBER),
+    },
+)
+
+dealer_stats_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "car_count": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "price": price_summary_schema,
+        "by_firm": openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "firm": openapi.Schema(type=openapi.TYPE_STRING),
+                    "car_count": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "price": price_summary_schema,
+                    "power": openapi.Schema(type=openapi.TYPE_OBJECT),
+                },
+            ),
+        ),
+    },
+)
+
+car_patch_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "firm": openapi.Schema(type=openapi.TYPE_STRING),
+        "model": openapi.Schema(type=openapi.TYPE_STRING),
+        "year": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "power": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "color": openapi.Schema(type=openapi.TYPE_STRING),
+        "price": openapi.Schema(type=openapi.TYPE_NUMBER),
+        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
+    },
+)
+
+search_hit_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "id": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "firm": openapi.Schema(type=openapi.TYPE_STRING),
+        "model": openapi.Schema(type=openapi.TYPE_STRING),
+        "color": openapi.Schema(type=openapi.TYPE_STRING),
+        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "dealer_name": openapi.Schema(type=openapi.TYPE_STRING),
+        "city": openapi.Schema(type=openapi.TYPE_STRING),
+    },
+)
+
+car_create_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    required=["firm", "model", "year", "power", "color", "price", "dealer_id"],
+    properties={
+        "firm": openapi.Schema(type=openapi.TYPE_STRING),
+        "model": openapi.Schema(type=openapi.TYPE_STRING),
+        "year": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "power": openapi.Schema(type=openapi.TYPE_INTEGER),
+        "color": openapi.Schema(type=openapi.TYPE_STRING),
+        "price": openapi.Schema(type=openapi.TYPE_NUMBER),
+        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
+    },
+)
+
+
+_annotated = False
+_lock = threading.Lock()
+
+
+def annotate_views() -> None:
+    """Навешивает swagger_auto_schema на views; повторные вызовы ничего не делают."""
+    global _annotated
+    with _lock:
+        if _annotated:
+            return
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Получить список дилеров",
+            responses={200: openapi.Response("Список дилеров", schema=openapi.Schema(type=openapi.TYPE_ARRAY, items=dealer_schema))},
+        )(views.dealers_list)
+        swagger_auto_schema(
+            method="post",
+            operation_summary="Создать дилера",
+            request_body=dealer_create_schema,
+            responses={201: openapi.Response("ID созданного дилера", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)}))},
+        )(views.dealers_list)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Получить дилера по ID",
+            responses={200: dealer_schema, 404: "Дилер не найден"},
+        )(views.dealer_detail)
+        swagger_auto_schema(
+            method="put",
+            operation_summary="Обновить дилера",
+            request_body=dealer_create_schema,
+            responses={200: openapi.Response("ID обновлённого дилера", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)}))},
+        )(views.dealer_detail)
+        swagger_auto_schema(
+            method="delete",
+            operation_summary="Удалить дилера",
+            responses={204: "Дилер удалён", 404: "Дилер не найден"},
+        )(views.dealer_detail)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Статистика дилера",
+            operation_description="Количество автомобилей, средняя/минимальная/максимальная цена и распределение мощности по фирмам. Берётся из материализованной таблицы dealer_firm_stats.",
+            responses={200: dealer_stats_schema, 404: "Дилер не найден"},
+        )(views.dealer_stats_detail)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Сводная статистика",
+            operation_description="Итоги по всем дилерам и распределение мощности по фирмам.",
+            responses={200: openapi.Response("Сводная статистика", schema=openapi.Schema(type=openapi.TYPE_OBJECT))},
+        )(views.stats_summary_view)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Получить список автомобилей",
+            operation_description="Возвращает список всех автомобилей. При создании/обновлении/удалении автомобиля отправляется событие в RabbitMQ. С limit/after — страница по возрастанию id; ссылка на следующую страницу — в заголовке Link.",
+            manual_parameters=[
+                openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="Размер страницы, до 1000"),
+                openapi.Parameter("after", openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description="id последнего автомобиля предыдущей страницы"),
+            ],
+            responses={200: openapi.Response("Список автомобилей", schema=openapi.Schema(type=openapi.TYPE_ARRAY, items=car_schema))},
+        )(views.cars_list)
+        swagger_auto_schema(
+            method="post",
+            operation_summary="Создать автомобиль",
+            operation_description="Создаёт новый автомобиль и отправляет событие CREATE в RabbitMQ.",
+            request_body=car_create_schema,
+            responses={
+                201: openapi.Response("ID созданного автомобиля", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)})),
+                400: "Ошибка валидации или дилер не найден",
+            },
+        )(views.cars_list)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Получить автомобиль по ID",
+            responses={200: car_schema, 404: "Автомобиль не найден"},
+        )(views.car_detail)
+        swagger_auto_schema(
+            method="put",
+            operation_summary="Обновить автомобиль",
+            operation_description="Обновляет автомобиль и отправляет событие UPDATE в RabbitMQ.",
+            request_body=car_create_schema,
+            responses={
+                200: openapi.Response("ID обновлённого автомобиля", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)})),
+                400: "Ошибка валидации или дилер не найден",
+                404: "Автомобиль не найден",
+            },
+        )(views.car_detail)
+        swagger_auto_schema(
+            method="patch",
+            operation_summary="Частично обновить автомобиль",
+            operation_description="Обновляет только переданные поля и отправляет событие UPDATE с diff изменившихся полей (old/new). Если значения не изменились, запись и событие не выполняются.",
+            request_body=car_patch_schema,
+            responses={
+                200: openapi.Response("ID обновлённого автомобиля", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)})),
+                400: "Ошибка валидации или дилер не найден",
+                404: "Автомобиль не найден",
+            },
+        )(views.car_detail)
+        swagger_auto_schema(
+            method="delete",
+            operation_summary="Удалить автомобиль",
+            operation_description="Удаляет автомобиль и отправляет событие DELETE в RabbitMQ.",
+            responses={204: "Автомобиль удалён", 404: "Автомобиль не найден"},
+        )(views.car_detail)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Поиск автомобилей",
+            operation_description="Префиксный полнотекстовый поиск по фирме, модели, цвету, имени и городу дилера (type-ahead).",
+            manual_parameters=[
+                openapi.Parameter("q", openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True),
+                openapi.Parameter("limit", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            ],
+            responses={200: openapi.Response("Найденные автомобили", schema=openapi.Schema(type=openapi.TYPE_ARRAY, items=search_hit_schema))},
+        )(views.search)
+        swagger_auto_schema(
+            method="get",
+            operation_summary="Аналитический запрос по каталогу",
+            operation_description="Считает количество и агрегаты по колоночному снимку автомобилей с городом и рейтингом дилера. Фильтры: <колонка>=значение (через запятую — любое из), <колонка>__gte/__gt/__lte/__lt для чисел. Доступен при CATALOG_SNAPSHOT=1.",
+            manual_parameters=[
+                openapi.Parameter("year__gte", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+                openapi.Parameter("year__lte", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+                openapi.Parameter("power__gte", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+                openapi.Parameter("power__lte", openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+                openapi.Parameter("price__lt", openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+                openapi.Parameter("city", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+                openapi.Parameter("firm", openapi.IN_QUERY, type=openapi.TYPE_STRING),
+                openapi.Parameter("agg", openapi.IN_QUERY, type=openapi.TYPE_STRING, description="avg:price,min:price,max:power,sum:price"),
+                openapi.Parameter("group_by", openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=["firm", "model", "color", "city"]),
+            ],
+            responses={200: openapi.Response("Количество и агрегаты", schema=openapi.Schema(type=openapi.TYPE_OBJECT)), 400: "Неверный фильтр", 503: "Снимок ещё строится"},
+        )(views.cars_query)
+        _annotated = True
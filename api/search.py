@@ -0,0 +1,250 @@
+"""Полнотекстовый префиксный поиск по фирме, модели, цвету, имени и городу дилера.
+
+Индекс — отдельная таблица car_search: FTS5 для SQLite, tsvector + GIN для PostgreSQL.
+Он денормализован (имя и город дилера хранятся в строке автомобиля), поэтому
+поиск не делает join и отвечает за миллисекунды даже на миллионах строк.
+Индекс поддерживается из событий об автомобилях (SearchIndexer) и изменений
+дилеров; полная перестройка — rebuild_search_index.
+"""
+import logging
+import re
+from typing import List, Optional
+
+from django.db import connection, connections, transaction
+
+from . import sharding
+from .models import Car, Dealer
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SEARCH_COLUMNS = ("id", "firm", "model", "color", "dealer_id", "dealer_name", "city")
+# Бэкенды возвращают после SEARCH_COLUMNS оценку релевантности (меньше — лучше);
+# по ней сливаются ответы шардов.
+
+
+def tokenize(query: str) -> List[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(query)][:8]
+
+
+class _SqliteBackend:
+    def create(self, cursor) -> None:
+        # prefix='2 3' — дополнительные префиксные индексы для type-ahead по 2-3 символам
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS car_search USING fts5(
+                firm, model, color, dealer_name, city,
+                dealer_id UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+            """
+        )
+
+    def drop(self, cursor) -> None:
+        cursor.execute("DROP TABLE IF EXISTS car_search")
+
+    def rebuild(self, cursor) -> None:
+        cursor.execute("DELETE FROM car_search")
+        cursor.execute(
+            """
+            INSERT INTO car_search (rowid, firm, model, color, dealer_name, city, dealer_id)
+            SELECT c.id, c.firm, c.model, c.color, d.name, d.city, c.dealer_id
+            FROM cars c JOIN dealers d ON d.id = c.dealer_id
+            """
+        )
+
+    def upsert(self, cursor, car_id: int, firm, model, color, dealer_name, city, dealer_id) -> None:
+        cursor.execute("DELETE FROM car_search WHERE rowid = %s", [car_id])
+        cursor.execute(
+            "INSERT INTO car_search (rowid, firm, model, color, dealer_name, city, dealer_id)"
+            " VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [car_id, firm, model, color, dealer_name, city, dealer_id],
+        )
+
+    def delete(self, cursor, car_id: int) -> None:
+        cursor.execute("DELETE FROM car_search WHERE rowid = %s", [car_id])
+
+    def update_dealer(self, cursor, dealer_id: int, name, city) -> None:
+        cursor.execute(
+            "UPDATE car_search SET dealer_name = %s, city = %s WHERE dealer_id = %s",
+            [name, city, dealer_id],
+        )
+
+    def delete_dealer(self, cursor, dealer_id: int) -> None:
+        cursor.execute("DELETE FROM car_search WHERE dealer_id = %s", [dealer_id])
+
+    def search(self, cursor, tokens: List[str], limit: int) -> list:
+        match = " ".join('"%s"*' % t.replace('"', '""') for t in tokens)
+        cursor.execute(
+            "SELECT rowid, firm, model, color, dealer_id, dealer_name, city, rank FROM car_search"
+            " WHERE car_search MATCH %s ORDER BY rank, rowid LIMIT %s",
+            [match, limit],
+        )
+        return cursor.fetchall()
+
+
+class _PostgresBackend:
+    _DOCUMENT = (
+        "to_tsvector('simple', coalesce(firm, '') || ' ' || coalesce(model, '') || ' ' ||"
+        " coalesce(color, '') || ' ' || coalesce(dealer_name, '') || ' ' || coalesce(city, ''))"
+    )
+
+    def create(self, cursor) -> None:
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS car_search (
+                car_id bigint PRIMARY KEY,
+                firm varchar(50),
+                model varchar(50),
+                color varchar(30),
+                dealer_id bigint,
+                dealer_name varchar(100),
+                city varchar(50),
+                document tsvector GENERATED ALWAYS AS ({self._DOCUMENT}) STORED
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS car_search_document_idx ON car_search USING gin (document)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS car_search_dealer_idx ON car_search (dealer_id)")
+
+    def drop(self, cursor) -> None:
+        cursor.execute("DROP TABLE IF EXISTS car_search")
+
+    def rebuild(self, cursor) -> None:
+        cursor.execute("TRUNCATE car_search")
+        cursor.execute(
+            """
+            INSERT INTO car_search (car_id, firm, model, color, dealer_name, city, dealer_id)
+            SELECT c.id, c.firm, c.model, c.color, d.name, d.city, c.dealer_id
+            FROM cars c JOIN dealers d ON d.id = c.dealer_id
+            """
+        )
+
+    def upsert(self, cursor, car_id: int, firm, model, color, dealer_name, city, dealer_id) -> None:
+        cursor.execute(
+            """
+            INSERT INTO car_search (car_id, firm, model, color, dealer_name, city, dealer_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (car_id) DO UPDATE SET
+                firm = EXCLUDED.firm, model = EXCLUDED.model, color = EXCLUDED.color,
+                dealer_name = EXCLUDED.dealer_name, city = EXCLUDED.city, dealer_id = EXCLUDED.dealer_id
+            """,
+            [car_id, firm, model, color, dealer_name, city, dealer_id],
+        )
+
+    def delete(self, cursor, car_id: int) -> None:
+        cursor.execute("DELETE FROM car_search WHERE car_id = %s", [car_id])
+
+    def update_dealer(self, cursor, dealer_id: int, name, city) -> None:
+        cursor.execute(
+            "UPDATE car_search SET dealer_name = %s, city = %s WHERE dealer_id = %s",
+            [name, city, dealer_id],
+        )
+
+    def delete_dealer(self, cursor, dealer_id: int) -> None:
+        cursor.execute("DELETE FROM car_search WHERE dealer_id = %s", [dealer_id])
+
+    def search(self, cursor, tokens: List[str], limit: int) -> list:
+        tsquery = " & ".join("%s:*" % re.sub(r"[^\w]", "", t) for t in tokens)
+        cursor.execute(
+            "SELECT car_id, firm, model, color, dealer_id, dealer_name, city,"
+            " -ts_rank(document, to_tsquery('simple', %s)) AS score FROM car_search"
+            " WHERE document @@ to_tsquery('simple', %s)"
+            " ORDER BY score, car_id LIMIT %s",
+            [tsquery, tsquery, limit],
+        )
+        return cursor.fetchall()
+
+
+def get_backend(conn=None):
+    vendor = (conn or connection).vendor
+    if vendor == "sqlite":
+        return _SqliteBackend()
+    if vendor == "postgresql":
+        return _PostgresBackend()
+    raise NotImplementedError(f"Search index is not supported for {vendor}")
+
+
+def _search(conn, tokens: List[str], limit: int) -> list:
+    with conn.cursor() as cursor:
+        return get_backend(conn).search(cursor, tokens, limit)
+
+
+def search_cars(query: str, limit: int = 20) -> list:
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if sharding.enabled():
+        # оценки разных шардов сравнимы лишь приближённо (статистика корпуса у каждого своя)
+        rows = sharding.merge_sorted(
+            sharding.scatter(lambda alias: _search(connections[alias], tokens, limit)),
+            key=lambda r: (r[-1], r[0]),
+            limit=limit,
+        )
+    else:
+        rows = _search(connection, tokens, limit)
+    # zip отбрасывает оценку релевантности
+    return [dict(zip(SEARCH_COLUMNS, r)) for r in rows]
+
+
+def rebuild_search_index() -> None:
+    for conn in sharding.car_connections():
+        with conn.cursor() as cursor:
+            get_backend(conn).rebuild(cursor)
+
+
+def reindex_dealer(dealer_id: int, alias: str) -> None:
+    """Пересобирает строки дилера в car_search базы alias (после переноса между шардами)."""
+    conn = connections[alias]
+    backend = get_backend(conn)
+    dealer = Dealer.objects.using(alias).only("name", "city").get(pk=dealer_id)
+    with conn.cursor() as cursor:
+        backend.delete_dealer(cursor, dealer_id)
+        for car_id, firm, model, color in (
+            Car.objects.using(alias).filter(dealer_id=dealer_id).values_list("id", "firm", "model", "color").iterator()
+        ):
+            backend.upsert(cursor, car_id, firm, model, color, dealer.name, dealer.city, dealer_id)
+
+
+class SearchIndexer:
+    """Поддерживает car_search в актуальном состоянии по событиям об автомобилях и дилерах."""
+
+    def on_car_event(self, event_type: str, car: Car, previous: Optional[Car] = None) -> None:
+        # индекс лежит рядом с автомобилем — в его шарде
+        conn = sharding.connection_for(car)
+        try:
+            # точка сохранения: сбой индекса не должен ломать транзакцию записи автомобиля
+            with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+                backend = get_backend(conn)
+                if event_type == "DELETE":
+                    backend.delete(cursor, car.id)
+                    return
+                dealer = Dealer.objects.only("name", "city").get(pk=car.dealer_id)
+                backend.upsert(
+                    cursor, car.id, car.firm, car.model, car.color, dealer.name, dealer.city, car.dealer_id
+                )
+            if previous is not None and sharding.connection_for(previous) is not conn:
+                # смена дилера перенесла автомобиль в другой шард
+                old = sharding.connection_for(previous)
+                with transaction.atomic(using=old.alias), old.cursor() as cursor:
+                    get_backend(old).delete(cursor, car.id)
+        except Exception:
+            logger.exception("Failed to update search index for car_id=%s", car.id)
+
+    def on_dealer_changed(self, dealer: Dealer) -> None:
+        try:
+            for conn in sharding.car_connections():
+                with conn.cursor() as cursor:
+                    get_backend(conn).update_dealer(cursor, dealer.id, dealer.name, dealer.city)
+        except Exception:
+            logger.exception("Failed to update search index for dealer_id=%s", dealer.id)
+
+    def on_dealer_deleted(self, dealer_id: int) -> None:
+        try:
+            for conn in sharding.car_connections():
+                with conn.cursor() as cursor:
+                    get_backend(conn).delete_dealer(cursor, dealer_id)
+        except Exception:
+            logger.exception("Failed to update search index for dealer_id=%s", dealer_id)
@@ -0,0 +1,525 @@
+"""Горизонтальное шардирование автомобилей по дилеру.
+
+При заданных CAR_SHARDS (см. config/settings.py) таблица cars живёт в базах
+shard0..shardN-1, и все автомобили одного дилера лежат в одной базе. Основная БД
+(default) остаётся источником истины для дилеров и хранит:
+
+- dealer_shards — размещение дилера. Назначается при первом обращении
+  (crc32(dealer_id) % N) и дальше меняется только rebalance_car_shards, поэтому
+  добавление шардов не перемешивает уже размещённых дилеров;
+- car_id_blocks — блоки ID (hi/lo). Процесс забирает блок из ID_BLOCK_SIZE
+  идентификаторов одной вставкой и раздаёт их без обращения к БД; ID уникальны
+  во всех шардах, а блок помнит шард, где автомобиль создан, — get_car ищет там первым.
+
+Дилеры копируются в каждый шард сигналами post_save/post_delete: на шарде
+работают внешний ключ cars.dealer_id и join'ы поискового индекса. Списки и поиск
+опрашивают шарды параллельно и сливают отсортированные ответы (scatter-gather).
+"""
+import contextvars
+import heapq
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from rest_framework.exceptions import APIException
+
+from dal import CarData, audit
+
+from .models import Car, CarIdBlock, Dealer, DealerShard
+from .repository import CarRepository, page_car_rows
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Размер блока ID; менять нельзя — по нему ID сопоставляется с блоком
+ID_BLOCK_SIZE = 1000
+
+
+def enabled() -> bool:
+    return bool(settings.CAR_SHARDS)
+
+
+class DealerMoving(APIException):
+    """Автомобили дилера переносятся между шардами; запись по нему временно отклоняется."""
+
+    status_code = 503
+    default_detail = "Dealer is being moved between shards, retry later"
+    default_code = "dealer_moving"
+
+    def __init__(self) -> None:
+        super().__init__()
+        # DRF превращает wait в заголовок Retry-After
+        self.wait = max(1, round(settings.CAR_SHARD_MAP_TTL))
+
+
+# --- scatter-gather ----------------------------------------------------------
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=min(32, 4 * len(settings.CAR_SHARDS)), thread_name_prefix="shard-scatter"
+            )
+        return _executor
+
+
+def _on_shard(fn: Callable[[str], T], alias: str) -> T:
+    try:
+        if audit.active() is None:
+            return fn(alias)
+        # запросы потоков пула тоже входят в аудит запроса
+        with connections[alias].execute_wrapper(audit.record_execute):
+            return fn(alias)
+    finally:
+        # соединения потоков пула не закрываются по request_finished — следим сами
+        connections[alias].close_if_unusable_or_obsolete()
+
+
+def scatter(fn: Callable[[str], T], aliases: Optional[Sequence[str]] = None) -> List[T]:
+    """fn(alias) на каждом шарде параллельно; результаты в порядке aliases."""
+    aliases = list(aliases or settings.CAR_SHARDS)
+    if len(aliases) == 1:
+        return [fn(aliases[0])]
+    # каждой задаче — копия контекста вызывающего потока (аудит запросов, профиль)
+    executor = _get_executor()
+    futures = [executor.submit(contextvars.copy_context().run, _on_shard, fn, alias) for alias in aliases]
+    return [future.result() for future in futures]
+
+
+def merge_sorted(results: Iterable[Iterable[T]], key: Callable[[T], object], limit: Optional[int] = None, id_of=itemgetter(0)) -> List[T]:
+    """Сливает ответы шардов, отсортированные по key, и обрезает до limit.
+
+    Пока rebalance_car_shards переносит дилера, его автомобиль может на мгновение
+    оказаться в двух шардах — в ответ он попадает один раз.
+    """
+    merged: List[T] = []
+    seen = set()
+    for item in heapq.merge(*results, key=key):
+        item_id = id_of(item)
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        merged.append(item)
+        if limit is not None and len(merged) >= limit:
+            break
+    return merged
+
+
+def car_values(*fields: str) -> list:
+    """values_list(*fields) всех автомобилей по возрастанию id; fields[0] — "id"."""
+    if not enabled():
+        return list(Car.objects.order_by("id").values_list(*fields))
+    return merge_sorted(
+        scatter(lambda alias: list(Car.objects.using(alias).order_by("id").values_list(*fields))),
+        key=itemgetter(0),
+    )
+
+
+def car_managers() -> list:
+    """Менеджеры Car по одному на базу с автомобилями."""
+    if not enabled():
+        return [Car.objects]
+    return [Car.objects.using(alias) for alias in settings.CAR_SHARDS]
+
+
+def cars_of(car: Car):
+    """Менеджер Car базы, в которой лежит car; вне шардов решает роутер."""
+    if car._state.db in settings.CAR_SHARDS:
+        return Car.objects.using(car._state.db)
+    return Car.objects
+
+
+def connection_for(car: Car):
+    if car._state.db in settings.CAR_SHARDS:
+        return connections[car._state.db]
+    return connection
+
+
+def car_connections() -> list:
+    """Соединения всех баз с автомобилями (для производных таблиц вроде car_search)."""
+    if not enabled():
+        return [connection]
+    return [connections[alias] for alias in settings.CAR_SHARDS]
+
+
+# --- размещение дилеров и ID -------------------------------------------------
+
+
+class ShardMap:
+    """dealer_id -> (шард, идёт ли перенос); кэшируется на ttl секунд."""
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = settings.CAR_SHARD_MAP_TTL if ttl is None else ttl
+        self._cache: Dict[int, Tuple[str, bool, float]] = {}
+        self._lock = threading.Lock()
+
+    def placement(self, dealer_id: int) -> Tuple[str, bool]:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(dealer_id)
+        if cached is not None and now - cached[2] < self.ttl:
+            return cached[0], cached[1]
+        row = (
+            DealerShard.objects.using(DEFAULT_DB_ALIAS)
+            .filter(dealer_id=dealer_id)
+            .values_list("shard", "moving")
+            .first()
+        )
+        if row is None:
+            row = self._assign(dealer_id)
+        with self._lock:
+            self._cache[dealer_id] = (row[0], row[1], now)
+        return row
+
+    def shard_for_write(self, dealer_id: int) -> str:
+        shard, moving = self.placement(dealer_id)
+        if moving:
+            raise DealerMoving()
+        return shard
+
+    def invalidate(self, dealer_id: int) -> None:
+        with self._lock:
+            self._cache.pop(dealer_id, None)
+
+    def _assign(self, dealer_id: int) -> Tuple[str, bool]:
+        shards = settings.CAR_SHARDS
+        shard = shards[zlib.crc32(str(dealer_id).encode()) % len(shards)]
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                DealerShard.objects.using(DEFAULT_DB_ALIAS).create(dealer_id=dealer_id, shard=shard)
+        except IntegrityError:
+            # другой процесс назначил шард раньше — или дилера нет, тогда его
+            # отсутствие обнаружит вызывающий код
+            row = DealerShard.objects.using(DEFAULT_DB_ALIAS).filter(dealer_id=dealer_id).values_list("shard", "moving").first()
+            if row is not None:
+                return row
+        return shard, False
+
+
+class IdAllocator:
+    """hi/lo: блоки ID выдаются шардам вставкой в car_id_blocks основной БД."""
+
+    def __init__(self) -> None:
+        self._next: Dict[str, Tuple[int, int]] = {}
+        self._home: Dict[int, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def next_id(self, shard: str) -> int:
+        with self._lock:
+            current, end = self._next.get(shard, (0, 0))
+            if current >= end:
+                hi = self._allocate_block(shard)
+                current, end = hi * ID_BLOCK_SIZE, (hi + 1) * ID_BLOCK_SIZE
+                self._home[hi] = shard
+            self._next[shard] = (current + 1, end)
+            return current
+
+    def home_shard(self, car_id: int) -> Optional[str]:
+        """Шард, которому выдан блок car_id; None для ID, созданных до шардирования."""
+        hi = car_id // ID_BLOCK_SIZE
+        with self._lock:
+            if hi in self._home:
+                return self._home[hi]
+        # блок не меняет владельца, поэтому кэшируется навсегда
+        shard = CarIdBlock.objects.using(DEFAULT_DB_ALIAS).filter(hi=hi).values_list("shard", flat=True).first()
+        with self._lock:
+            self._home[hi] = shard
+        return shard
+
+    def _allocate_block(self, shard: str) -> int:
+        blocks = CarIdBlock.objects.using(DEFAULT_DB_ALIAS)
+        for _ in range(10):
+            last = blocks.aggregate(hi=Max("hi"))["hi"]
+            hi = last + 1 if last is not None else self._first_hi()
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    blocks.create(hi=hi, shard=shard)
+                return hi
+            except IntegrityError:
+                # блок забрал другой процесс — берём следующий
+                continue
+        raise RuntimeError("Could not allocate a car id block")
+
+    @staticmethod
+    def _first_hi() -> int:
+        # первый блок начинается выше всех существующих ID, включая перенесённые из default
+        top = max(
+            Car.objects.using(alias).aggregate(top=Max("id"))["top"] or 0
+            for alias in (DEFAULT_DB_ALIAS, *settings.CAR_SHARDS)
+        )
+        return top // ID_BLOCK_SIZE + 1
+
+
+shard_map = ShardMap()
+id_allocator = IdAllocator()
+
+
+class ShardedCarRepository(CarRepository):
+    """CarRepository поверх шардов: запись — в шард дилера, списки — scatter-gather."""
+
+    def __init__(self, shards: Optional[ShardMap] = None, ids: Optional[IdAllocator] = None) -> None:
+        self.shards = shards or shard_map
+        self.ids = ids or id_allocator
+        self._shard_transactions: Optional[ExitStack] = None
+        self._enlisted: set = set()
+
+    @contextmanager
+    def atomic(self):
+        """Транзакция основной БД (статистика дилеров) и шардов, в которые пишет репозиторий.
+
+        Шард входит в транзакцию при первой записи в него (_enlist), поэтому запись
+        блокирует только свои шарды. Ошибка внутри откатывает все базы; шарды
+        фиксируются раньше основной БД, и только сбой фиксации основной БД после
+        них оставит статистику расходящейся — до rebuild_dealer_stats.
+        """
+        if self._shard_transactions is not None:
+            yield
+            return
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), ExitStack() as stack:
+            self._shard_transactions, self._enlisted = stack, set()
+            try:
+                yield
+            finally:
+                self._shard_transactions = None
+
+    def _enlist(self, alias: str) -> None:
+        if self._shard_transactions is not None and alias not in self._enlisted:
+            self._shard_transactions.enter_context(transaction.atomic(using=alias))
+            self._enlisted.add(alias)
+
+    def list_cars(self) -> List[Car]:
+        return merge_sorted(
+            scatter(lambda alias: list(Car.objects.using(alias).order_by("id"))),
+            key=lambda car: car.id,
+            id_of=lambda car: car.id,
+        )
+
+    def list_car_rows(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> list:
+        # каждый шард отдаёт до limit строк после after_id, слияние берёт первые limit
+        return merge_sorted(
+            scatter(lambda alias: page_car_rows(Car.objects.using(alias), after_id, limit)),
+            key=itemgetter(0),
+            limit=limit,
+        )
+
+    def get_car(self, car_id: int) -> Optional[Car]:
+        home = self.ids.home_shard(car_id)
+        # автомобиль обычно там, где создан; после переноса дилера — ищем по остальным
+        for alias in sorted(settings.CAR_SHARDS, key=lambda a: a != home):
+            car = Car.objects.using(alias).filter(pk=car_id).first()
+            if car is not None:
+                return car
+        return None
+
+    def create_car(self, data: CarData) -> Car:
+        shard = self.shards.shard_for_write(data.dealer_id)
+        self._enlist(shard)
+        dealer = Dealer.objects.using(shard).get(pk=data.dealer_id)
+        return Car.objects.using(shard).create(
+            id=self.ids.next_id(shard),
+            firm=data.firm,
+            model=data.model,
+            year=data.year,
+            power=data.power,
+            color=data.color,
+            price=data.price,
+            dealer=dealer,
+        )
+
+    def patch_car(self, car_id: int, fields: dict) -> Optional[Car]:
+        car = self.get_car(car_id)
+        if car is None:
+            return None
+        self.shards.shard_for_write(car.dealer_id)
+        self._enlist(car._state.db)
+        changed = self._set_fields(car, fields)
+        if "dealer_id" in changed:
+            target = self.shards.shard_for_write(car.dealer_id)
+            self._enlist(target)
+            if not Dealer.objects.using(target).filter(pk=car.dealer_id).exists():
+                raise Dealer.DoesNotExist
+            if target != car._state.db:
+                return self._move(car, target)
+        if changed:
+            # роутер направляет запись в базу, из которой загружен car
+            car.save(update_fields=changed)
+        return car
+
+    def delete_car(self, car_id: int) -> bool:
+        car = self.get_car(car_id)
+        if car is None:
+            return False
+        self.shards.shard_for_write(car.dealer_id)
+        self._enlist(car._state.db)
+        car.delete()
+        return True
+
+    @staticmethod
+    def _move(car: Car, target: str) -> Car:
+        """Смена дилера на дилера другого шарда: запись в новый шард, затем удаление из старого.
+
+        Копия с тем же id в target (например, от прерванного move_dealer)
+        перезаписывается, а не роняет запрос на первичном ключе.
+        """
+        source = car._state.db
+        exists = Car.objects.using(target).filter(pk=car.pk).exists()
+        car.save(using=target, force_update=exists, force_insert=not exists)
+        Car.objects.using(source).filter(pk=car.pk).delete()
+        return car
+
+
+# --- копии дилеров -----------------------------------------------------------
+
+
+def _dealer_values(dealer: Dealer) -> dict:
+    return {f.attname: getattr(dealer, f.attname) for f in Dealer._meta.concrete_fields if not f.primary_key}
+
+
+def _replicate_dealer(sender, instance: Dealer, using: str, **kwargs) -> None:
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for alias in settings.CAR_SHARDS:
+        Dealer.objects.using(alias).update_or_create(pk=instance.pk, defaults=_dealer_values(instance))
+
+
+def _drop_dealer_replicas(sender, instance: Dealer, using: str, **kwargs) -> None:
+    if using != DEFAULT_DB_ALIAS:
+        return
+    # удаление копии каскадно удаляет автомобили дилера на шарде
+    for alias in settings.CAR_SHARDS:
+        Dealer.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+def connect_signals() -> None:
+    post_save.connect(_replicate_dealer, sender=Dealer, dispatch_uid="sharding_replicate_dealer")
+    post_delete.connect(_drop_dealer_replicas, sender=Dealer, dispatch_uid="sharding_drop_dealer")
+
+
+def sync_dealers() -> int:
+    """Копирует всех дилеров основной БД в каждый шард (вставка или обновление)."""
+    dealers = list(Dealer.objects.using(DEFAULT_DB_ALIAS).order_by("id"))
+    fields = [f.name for f in Dealer._meta.concrete_fields if not f.primary_key]
+    for alias in settings.CAR_SHARDS:
+        Dealer.objects.using(alias).bulk_create(
+            dealers, batch_size=500, update_conflicts=True, unique_fields=["id"], update_fields=fields
+        )
+    return len(dealers)
+
+
+# --- перенос дилеров ---------------------------------------------------------
+
+
+def copy_dealer_cars(dealer_id: int, source: str, target: str, batch_size: int = 1000) -> int:
+    """Копирует автомобили дилера пачками по id (keyset) и возвращает число вставленных.
+
+    Строки, уже лежащие в target (копия прерванного запуска), пропускаются,
+    поэтому повторный запуск продолжает с того места, где остановился прошлый.
+    """
+    copied, after = 0, 0
+    while True:
+        batch = list(
+            Car.objects.using(source).filter(dealer_id=dealer_id, id__gt=after).order_by("id")[:batch_size]
+        )
+        if not batch:
+            return copied
+        after = batch[-1].id
+        existing = set(Car.objects.using(target).filter(id__in=[car.id for car in batch]).values_list("id", flat=True))
+        missing = [car for car in batch if car.id not in existing]
+        Car.objects.using(target).bulk_create(missing, ignore_conflicts=True)
+        copied += len(missing)
+
+
+def move_dealer(dealer_id: int, target: str, batch_size: int = 1000, pause: Optional[float] = None) -> int:
+    """Переносит автомобили дилера в шард target. Возвращает число скопированных строк.
+
+    На время переноса дилер помечается moving: запись по нему отклоняется с 503.
+    Перед копированием ждём CAR_SHARD_MAP_TTL — за это время все процессы
+    перечитают размещение и перестанут писать в исходный шард.
+
+    Шаги идут в порядке, допускающем перезапуск: копия в target (уже
+    скопированные id пропускаются), переключение dealer_shards на target,
+    удаление автомобилей дилера из остальных шардов и только затем снятие
+    moving. При сбое дилер остаётся moving, копия в target не удаляется, и
+    повторный вызов (в том числе с другим target) продолжает перенос, а не
+    отвечает DealerMoving.
+    """
+    if target not in settings.CAR_SHARDS:
+        raise ValueError(f"Unknown shard: {target}")
+    # размещение — из базы, а не из кэша: перезапуск должен видеть флаг moving
+    shard_map.invalidate(dealer_id)
+    source, moving = shard_map.placement(dealer_id)
+    if source == target and not moving:
+        return 0
+
+    placements = DealerShard.objects.using(DEFAULT_DB_ALIAS).filter(dealer_id=dealer_id)
+    try:
+        if not moving:
+            placements.update(moving=True)
+            time.sleep(settings.CAR_SHARD_MAP_TTL if pause is None else pause)
+        else:
+            logger.warning("Resuming interrupted move of dealer_id=%s from %s to %s", dealer_id, source, target)
+        moved = copy_dealer_cars(dealer_id, source, target, batch_size) if source != target else 0
+        placements.update(shard=target)
+        # в шардах, кроме target, автомобилей дилера быть не должно — в том числе
+        # частичной копии прерванного переноса в другой шард
+        for alias in settings.CAR_SHARDS:
+            if alias != target:
+                Car.objects.using(alias).filter(dealer_id=dealer_id).delete()
+        placements.update(moving=False)
+    except Exception:
+        logger.exception(
+            "Move of dealer_id=%s to %s failed; writes stay paused until it is rerun", dealer_id, target
+        )
+        raise
+    finally:
+        shard_map.invalidate(dealer_id)
+    logger.info("Moved dealer_id=%s (%s cars) from %s to %s", dealer_id, moved, source, target)
+    return moved
+
+
+def dealer_loads() -> Dict[str, Dict[int, int]]:
+    """shard -> {dealer_id: число автомобилей}."""
+    counts = scatter(
+        lambda alias: dict(
+            Car.objects.using(alias).values_list("dealer_id").annotate(n=Count("id")).order_by()
+        )
+    )
+    return dict(zip(settings.CAR_SHARDS, counts))
+
+
+def plan_rebalance(loads: Dict[str, Dict[int, int]], max_moves: int = 10) -> List[Tuple[int, str, str]]:
+    """Жадный план: крупнейший дилер с самого загруженного шарда — на самый свободный,
+    пока перенос уменьшает разрыв. Возвращает [(dealer_id, source, target)]."""
+    loads = {shard: dict(dealers) for shard, dealers in loads.items()}
+    totals = {shard: sum(dealers.values()) for shard, dealers in loads.items()}
+    plan = []
+    while len(plan) < max_moves:
+        source = max(totals, key=totals.get)
+        target = min(totals, key=totals.get)
+        gap = totals[source] - totals[target]
+        # перенос n строк сокращает разрыв, только если n < gap
+        candidates = [(n, dealer_id) for dealer_id, n in loads[source].items() if 0 < n < gap]
+        if not candidates:
+            break
+        n, dealer_id = max(candidates)
+        plan.append((dealer_id, source, target))
+        del loads[source][dealer_id]
+        loads[target][dealer_id] = n
+        totals[source] -= n
+        totals[target] += n
+    return plan
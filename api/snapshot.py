@@ -0,0 +1,407 @@
+"""Колоночный снимок каталога (Car ⋈ Dealer) в памяти процесса для аналитических запросов.
+
+Каждое поле — массив NumPy; строки firm, model, color и city хранятся
+словарными кодами. Запрос /cars/query вычисляет предикаты векторными масками и возвращает
+количество и агрегаты, не загружая строки целиком.
+
+Снимок строится при старте воркера и поддерживается событиями из
+exchange событий (через общий relay api.live), поэтому видит изменения всех
+процессов. Удалённые строки помечаются в колонке alive; после переполнения
+буфера relay (событие reset) и раз в CATALOG_SNAPSHOT_REFRESH секунд снимок
+перестраивается целиком — в том числе чтобы подхватить изменения дилеров.
+Строит снимок только фоновый поток: пока первое построение не закончено,
+запрос недолго ждёт его и затем получает 503 (SnapshotWarmingUp).
+
+NumPy обязателен при CATALOG_SNAPSHOT=1: без него приложение не стартует
+(check_numpy в ApiConfig.ready), а не переходит молча на медленный подсчёт
+циклом. Модуль импортируется и без NumPy — views использует parse_query.
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from rest_framework.exceptions import APIException
+
+from . import sharding
+from .models import Dealer
+
+try:
+    import numpy as np
+except ImportError:  # нужен только снимку; см. check_numpy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# код типа колонки -> dtype numpy
+_DTYPES = {"q": "int64", "d": "float64", "i": "int32", "b": "bool"}
+
+NUMERIC_COLUMNS = {"id": "q", "year": "q", "power": "q", "price": "d", "dealer_id": "q", "rating": "d"}
+CATEGORICAL_COLUMNS = ("firm", "model", "color", "city")
+COLUMNS = ("id", "firm", "model", "year", "power", "color", "price", "dealer_id", "city", "rating")
+
+RANGE_OPS = ("gte", "gt", "lte", "lt")
+AGGREGATES = ("sum", "avg", "min", "max")
+
+Predicate = Tuple[str, str, object]
+
+_NO_DEALER = ("", math.nan)
+
+
+class SnapshotWarmingUp(APIException):
+    """Первое построение снимка ещё идёт."""
+
+    status_code = 503
+    default_detail = "Catalog snapshot is warming up, retry later"
+    default_code = "snapshot_warming_up"
+
+    def __init__(self) -> None:
+        super().__init__()
+        # DRF превращает wait в заголовок Retry-After
+        self.wait = 1
+
+
+def check_numpy() -> None:
+    """Снимок без NumPy не включается: ImproperlyConfigured вместо медленного фолбэка."""
+    if np is None:
+        raise ImproperlyConfigured("CATALOG_SNAPSHOT=1 requires numpy (see requirements.txt)")
+
+
+def _allocate(typecode: str, length: int):
+    return np.zeros(length, dtype=_DTYPES[typecode])
+
+
+def _grow(column, length: int):
+    grown = np.zeros(length, dtype=column.dtype)
+    grown[: len(column)] = column
+    return grown
+
+
+def _number(value) -> float:
+    return float(value) if value is not None else math.nan
+
+
+class _Dictionary:
+    """Словарное кодирование строковой колонки: значение <-> код int32."""
+
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        value = value or ""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class CatalogSnapshot:
+    def __init__(
+        self, refresh_interval: float = 300.0, initial_capacity: int = 1024, warmup_timeout: float = 1.0
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self.initial_capacity = initial_capacity
+        # сколько запрос ждёт первого построения, прежде чем ответить 503
+        self.warmup_timeout = warmup_timeout
+        self.built_at: Optional[float] = None
+        self._built = threading.Event()
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._reset_storage(initial_capacity)
+
+    def _reset_storage(self, capacity: int) -> None:
+        self._size = 0
+        self._capacity = capacity
+        self._dictionaries = {name: _Dictionary() for name in CATEGORICAL_COLUMNS}
+        self._columns = {name: _allocate(code, capacity) for name, code in NUMERIC_COLUMNS.items()}
+        self._columns.update({name: _allocate("i", capacity) for name in CATEGORICAL_COLUMNS})
+        self._alive = _allocate("b", capacity)
+        self._row_by_id: Dict[int, int] = {}
+        self._dealers: Dict[int, Tuple[str, float]] = {}
+
+    # --- построение и обновление -------------------------------------------------
+
+    def start(self) -> None:
+        """Строит снимок и поддерживает его по событиям в фоновом потоке."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="catalog-snapshot", daemon=True)
+                self._thread.start()
+
+    def wait_built(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт первого построения снимка фоновым потоком (запускает его при необходимости)."""
+        if not self._built.is_set():
+            self.start()
+        return self._built.wait(timeout)
+
+    def rebuild(self) -> None:
+        started = time.perf_counter()
+        dealers = {
+            pk: (city, _number(rating))
+            for pk, city, rating in Dealer.objects.values_list("id", "city", "rating")
+        }
+        rows = sharding.car_values("id", "firm", "model", "year", "power", "color", "price", "dealer_id")
+        # новый снимок заполняется без блокировки, запросы видят старый до подмены
+        fresh = CatalogSnapshot(self.refresh_interval, max(self.initial_capacity, len(rows) * 5 // 4))
+        fresh._dealers = dealers
+        for row in rows:
+            fresh._upsert(dict(zip(("id", "firm", "model", "year", "power", "color", "price", "dealer_id"), row)))
+        with self._lock:
+            for name in ("_size", "_capacity", "_dictionaries", "_columns", "_alive", "_row_by_id", "_dealers"):
+                setattr(self, name, getattr(fresh, name))
+            self.built_at = time.time()
+        self._built.set()
+        logger.info("Built catalog snapshot: %s cars in %.1f ms", len(rows), (time.perf_counter() - started) * 1000)
+
+    def _run(self) -> None:
+        from .live import RESET, relay
+
+        # подписка до построения: события, пришедшие во время rebuild, не теряются
+        subscription = relay.subscribe()
+        while True:
+            try:
+                self.rebuild()
+                break
+            except Exception:
+                logger.exception("Failed to build catalog snapshot, retrying in 5s")
+                time.sleep(5)
+            finally:
+                close_old_connections()
+        while True:
+            try:
+                message = subscription.get(timeout=max(1.0, self.refresh_interval / 10))
+            except queue.Empty:
+                message = None
+            try:
+                if message is RESET or time.time() - (self.built_at or 0) >= self.refresh_interval:
+                    self.rebuild()
+                elif message is not None:
+                    self.apply_event(message)
+            except Exception:
+                logger.exception("Failed to update catalog snapshot")
+            finally:
+                # поток живёт долго: соединение с БД закрывается так же, как после запроса
+                close_old_connections()
+
+    def apply_event(self, event: Mapping) -> None:
+        car = event.get("car") or {}
+        car_id = car.get("id")
+        if car_id is None:
+            return
+        if event.get("eventType") != "DELETE":
+            dealer_id = (event.get("changes") or {}).get("dealer_id", {}).get("new", car.get("dealer_id"))
+            if dealer_id is not None:
+                self._prefetch_dealer(int(dealer_id))
+        with self._lock:
+            if event.get("eventType") == "DELETE":
+                self._delete(car_id)
+            elif "changes" in event:
+                self._patch(car_id, {name: change.get("new") for name, change in event["changes"].items()})
+            else:
+                self._upsert(car)
+
+    def _prefetch_dealer(self, dealer_id: int) -> None:
+        # запрос к БД — до self._lock, чтобы не задерживать запросы к снимку
+        if dealer_id in self._dealers:
+            return
+        row = Dealer.objects.filter(pk=dealer_id).values_list("city", "rating").first()
+        dealer = (row[0], _number(row[1])) if row else _NO_DEALER
+        with self._lock:
+            self._dealers.setdefault(dealer_id, dealer)
+
+    def _dealer(self, dealer_id: int) -> Tuple[str, float]:
+        return self._dealers.get(dealer_id, _NO_DEALER)
+
+    def _upsert(self, car: Mapping) -> None:
+        row = self._row_by_id.get(car["id"])
+        if row is None:
+            if self._size == self._capacity:
+                self._capacity *= 2
+                for name, column in self._columns.items():
+                    self._columns[name] = _grow(column, self._capacity)
+                self._alive = _grow(self._alive, self._capacity)
+            row = self._size
+            self._size += 1
+            self._row_by_id[car["id"]] = row
+        self._alive[row] = True
+        self._set(row, car)
+
+    def _patch(self, car_id: int, fields: Mapping) -> None:
+        row = self._row_by_id.get(car_id)
+        if row is None or not self._alive[row]:
+            # UPDATE для неизвестной строки (например, пропущен CREATE) — нужна полная перестройка
+            self.built_at = 0.0
+            return
+        self._set(row, fields)
+
+    def _set(self, row: int, fields: Mapping) -> None:
+        for name, value in fields.items():
+            if name in CATEGORICAL_COLUMNS:
+                self._columns[name][row] = self._dictionaries[name].encode(value)
+            elif name == "price":
+                self._columns[name][row] = _number(value)
+            elif name in NUMERIC_COLUMNS:
+                self._columns[name][row] = int(value)
+        if "dealer_id" in fields:
+            city, rating = self._dealer(int(fields["dealer_id"]))
+            self._columns["city"][row] = self._dictionaries["city"].encode(city)
+            self._columns["rating"][row] = rating
+
+    def _delete(self, car_id: int) -> None:
+        row = self._row_by_id.pop(car_id, None)
+        if row is not None:
+            self._alive[row] = False
+
+    # --- запросы -------------------------------------------------------------------
+
+    def query(
+        self,
+        predicates: Sequence[Predicate] = (),
+        aggregates: Sequence[Tuple[str, str]] = (),
+        group_by: Optional[str] = None,
+    ) -> dict:
+        """predicates — (колонка, op, значение), op: eq, in, gte, gt, lte, lt;
+        aggregates — (функция, колонка), функция: sum, avg, min, max."""
+        if not self.wait_built(self.warmup_timeout):
+            raise SnapshotWarmingUp()
+        with self._lock:
+            result = self._query(predicates, aggregates, group_by)
+            result["rows"] = len(self._row_by_id)
+            result["built_at"] = self.built_at
+        return result
+
+    def _encode_filter(self, name: str, op: str, value):
+        """Значение предиката в представлении колонки; None — заведомо пустой результат."""
+        if name not in CATEGORICAL_COLUMNS:
+            return value
+        codes = self._dictionaries[name].codes
+        if op == "in":
+            return [codes[v] for v in value if v in codes] or None
+        return codes.get(value)
+
+    def _query(self, predicates, aggregates, group_by) -> dict:
+        n = self._size
+        mask = self._alive[:n].copy()
+        for name, op, value in predicates:
+            value = self._encode_filter(name, op, value)
+            if value is None:
+                mask[:] = False
+                break
+            column = self._columns[name][:n]
+            if op == "eq":
+                mask &= column == value
+            elif op == "in":
+                mask &= np.isin(column, value)
+            elif op == "gte":
+                mask &= column >= value
+            elif op == "gt":
+                mask &= column > value
+            elif op == "lte":
+                mask &= column <= value
+            elif op == "lt":
+                mask &= column < value
+
+        result = {"count": int(np.count_nonzero(mask))}
+        if group_by is None:
+            result["aggregates"] = {
+                f"{func}:{name}": _numpy_aggregate(func, self._columns[name][:n][mask]) for func, name in aggregates
+            }
+            return result
+
+        codes = self._columns[group_by][:n][mask]
+        counts = np.bincount(codes, minlength=len(self._dictionaries[group_by].values))
+        present = np.flatnonzero(counts)
+        groups = [{group_by: self._dictionaries[group_by].values[c], "count": int(counts[c])} for c in present]
+        for func, name in aggregates:
+            values = self._columns[name][:n][mask].astype("float64")
+            valid = ~np.isnan(values)
+            group_codes, values = codes[valid], values[valid]
+            size = len(counts)
+            if func in ("sum", "avg"):
+                sums = np.bincount(group_codes, weights=values, minlength=size)
+                if func == "avg":
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        sums = sums / np.bincount(group_codes, minlength=size)
+                per_group = sums
+            else:
+                per_group = np.full(size, np.inf if func == "min" else -np.inf)
+                (np.minimum if func == "min" else np.maximum).at(per_group, group_codes, values)
+            for group, code in zip(groups, present):
+                value = float(per_group[code])
+                group[f"{func}:{name}"] = value if math.isfinite(value) else None
+        result["groups"] = groups
+        return result
+
+
+def _numpy_aggregate(func: str, values) -> Optional[float]:
+    values = values.astype("float64")
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    return float({"sum": np.sum, "avg": np.mean, "min": np.min, "max": np.max}[func](values))
+
+
+def parse_query(params: Mapping[str, List[str]]) -> Tuple[List[Predicate], List[Tuple[str, str]], Optional[str]]:
+    """Разбирает параметры /cars/query; при ошибке бросает ValueError.
+
+    year__gte=2018&year__lte=2021&power__gte=150&price__lt=30000&city=Minsk
+    &firm=Toyota,Honda&agg=avg:price,max:power&group_by=firm
+    """
+    predicates: List[Predicate] = []
+    aggregates: List[Tuple[str, str]] = []
+    group_by = None
+    for key, values in params.items():
+        value = values[-1]
+        if key == "agg":
+            for spec in filter(None, value.split(",")):
+                func, _, name = spec.partition(":")
+                if func == "count" and not name:
+                    continue
+                if func not in AGGREGATES or name not in NUMERIC_COLUMNS:
+                    raise ValueError(f"Unsupported aggregate: {spec}")
+                aggregates.append((func, name))
+            continue
+        if key == "group_by":
+            if value not in CATEGORICAL_COLUMNS:
+                raise ValueError(f"group_by must be one of {', '.join(CATEGORICAL_COLUMNS)}")
+            group_by = value
+            continue
+        name, _, op = key.partition("__")
+        if name not in COLUMNS:
+            raise ValueError(f"Unknown column: {name}")
+        if op and (op not in RANGE_OPS or name in CATEGORICAL_COLUMNS):
+            raise ValueError(f"Unsupported filter: {key}")
+        cast = str if name in CATEGORICAL_COLUMNS else (float if NUMERIC_COLUMNS[name] == "d" else int)
+        try:
+            if op:
+                predicates.append((name, op, cast(value)))
+            elif "," in value:
+                predicates.append((name, "in", [cast(v) for v in value.split(",")]))
+            else:
+                predicates.append((name, "eq", cast(value)))
+        except ValueError:
+            raise ValueError(f"Invalid value for {key}: {value}")
+    return predicates, aggregates, group_by
+
+
+_catalog: Optional[CatalogSnapshot] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> CatalogSnapshot:
+    """Снимок процесса; создаётся и запускается при первом обращении."""
+    global _catalog
+    check_numpy()
+    with _catalog_lock:
+        if _catalog is None:
+            from django.conf import settings
+
+            _catalog = CatalogSnapshot(settings.CATALOG_SNAPSHOT_REFRESH)
+            _catalog.start()
+        return _catalog
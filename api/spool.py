@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+
+def default_spool_path() -> Path:
+    base_dir = Path(__file__).resolve().parent.parent
+    return Path(os.getenv("EVENTS_SPOOL_PATH", base_dir / "events_spool.db"))
+
+
+@dataclass
+class SpooledEvent:
+    id: int
+    exchange: str
+    routing_key: str
+    body: bytes
+    properties: dict
+
+
+def _upgrade(conn: sqlite3.Connection) -> None:
+    """Файлы, созданные до message_id, хранили в колонке headers только заголовки AMQP."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(spooled_events)")}
+        if "headers" in columns:
+            conn.execute("ALTER TABLE spooled_events RENAME COLUMN headers TO properties")
+            conn.execute("UPDATE spooled_events SET properties = json_object('headers', json(properties))")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class EventSpool:
+    """Локальный append-only буфер событий (SQLite), пока брокер недоступен.
+
+    Порядок сохраняется автоинкрементным id. Файл может разделяться несколькими
+    процессами. Пачка отправляется без открытой транзакции и без блокировки, чтобы
+    долгая отправка не задерживала append() и count() других запросов; если два
+    процесса выберут одну пачку, событие уйдёт дважды, и такие дубли отсекает
+    потребитель по message_id.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path) if path else default_spool_path()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # одна отправка пачки за раз в процессе; _lock на время send() не держится
+        self._drain_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS spooled_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    exchange TEXT NOT NULL,
+                    routing_key TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    properties TEXT NOT NULL
+                )
+                """
+            )
+            _upgrade(conn)
+            self._conn = conn
+        return self._conn
+
+    def append(self, exchange: str, routing_key: str, body: bytes, properties: dict) -> None:
+        """properties — свойства AMQP-сообщения (message_id, timestamp, headers, ...)."""
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO spooled_events (exchange, routing_key, body, properties) VALUES (?, ?, ?, ?)",
+                (exchange, routing_key, body, json.dumps(properties)),
+            )
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            row = self._connection().execute("SELECT 1 FROM spooled_events LIMIT 1").fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM spooled_events").fetchone()[0]
+
+    def drain(self, send, batch_size: int = 100) -> int:
+        """Отправляет через send(event) очередную пачку по порядку и удаляет отправленное.
+
+        Если send бросает исключение, уже отправленная часть пачки всё равно удаляется,
+        а исключение пробрасывается дальше. Возвращает число отправленных событий.
+        """
+        with self._drain_lock:
+            with self._lock:
+                rows = self._connection().execute(
+                    "SELECT id, exchange, routing_key, body, properties FROM spooled_events ORDER BY id LIMIT ?",
+                    (batch_size,),
+                ).fetchall()
+            sent_upto = None
+            try:
+                for row in rows:
+                    send(SpooledEvent(row[0], row[1], row[2], bytes(row[3]), json.loads(row[4])))
+                    sent_upto = row[0]
+            finally:
+                if sent_upto is not None:
+                    # id растут монотонно, так что <= sent_upto — ровно отправленная часть пачки
+                    with self._lock:
+                        self._connection().execute("DELETE FROM spooled_events WHERE id <= ?", (sent_upto,))
+        return len(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,219 @@
+from decimal import Decimal
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Coalesce
+
+from . import sharding
+from .models import Car, DealerFirmStats
+
+POWER_BUCKET = 50  # ширина корзины гистограммы мощности, л.с.
+
+
+def power_bucket(power: int) -> str:
+    return str(power // POWER_BUCKET * POWER_BUCKET)
+
+
+class DealerStatsAggregator:
+    """Инкрементально поддерживает таблицу dealer_firm_stats по событиям об автомобилях.
+
+    Счётчики и суммы обновляются за O(1). min/max при удалении пересчитываются
+    только для одной группы (дилер, фирма) по индексу cars_dealer_firm_idx —
+    и только если удалённое значение было граничным.
+    Вызывается внутри транзакции записи автомобиля (CarRepositoryWithEvents):
+    ошибка пробрасывается и откатывает запись, так что агрегаты не расходятся с cars.
+    """
+
+    def on_car_event(self, event_type: str, car: Car, previous: Optional[Car] = None) -> None:
+        if event_type == "CREATE":
+            self._add(car)
+        elif event_type == "UPDATE":
+            if previous is not None:
+                self._remove(previous)
+            self._add(car)
+        elif event_type == "DELETE":
+            self._remove(car)
+
+    def _add(self, car: Car) -> None:
+        stats, _ = DealerFirmStats.objects.select_for_update().get_or_create(
+            dealer_id=car.dealer_id, firm=car.firm
+        )
+        price = Decimal(str(car.price))
+        stats.car_count += 1
+        stats.price_sum += price
+        stats.price_min = price if stats.price_min is None else min(stats.price_min, price)
+        stats.price_max = price if stats.price_max is None else max(stats.price_max, price)
+        stats.power_sum += car.power
+        stats.power_min = car.power if stats.power_min is None else min(stats.power_min, car.power)
+        stats.power_max = car.power if stats.power_max is None else max(stats.power_max, car.power)
+        bucket = power_bucket(car.power)
+        stats.power_buckets[bucket] = stats.power_buckets.get(bucket, 0) + 1
+        stats.save()
+
+    def _remove(self, car: Car) -> None:
+        stats = (
+            DealerFirmStats.objects.select_for_update()
+            .filter(dealer_id=car.dealer_id, firm=car.firm)
+            .first()
+        )
+        if stats is None:
+            return
+        if stats.car_count <= 1:
+            stats.delete()
+            return
+
+        price = Decimal(str(car.price))
+        stats.car_count -= 1
+        stats.price_sum -= price
+        stats.power_sum -= car.power
+        bucket = power_bucket(car.power)
+        left = stats.power_buckets.get(bucket, 0) - 1
+        if left > 0:
+            stats.power_buckets[bucket] = left
+        else:
+            stats.power_buckets.pop(bucket, None)
+
+        if price in (stats.price_min, stats.price_max) or car.power in (stats.power_min, stats.power_max):
+            # событие приходит после записи в cars, поэтому удалённая строка уже не учитывается
+            bounds = sharding.cars_of(car).filter(dealer_id=car.dealer_id, firm=car.firm).aggregate(
+                price_min=Min("price"),
+                price_max=Max("price"),
+                power_min=Min("power"),
+                power_max=Max("power"),
+            )
+            stats.price_min = bounds["price_min"]
+            stats.price_max = bounds["price_max"]
+            stats.power_min = bounds["power_min"]
+            stats.power_max = bounds["power_max"]
+        stats.save()
+
+
+def rebuild_dealer_stats() -> int:
+    """Полный пересчёт dealer_firm_stats (backfill). Возвращает число групп.
+
+    При шардировании группы считаются в каждом шарде: дилер целиком лежит в одном.
+    """
+    groups = []
+    buckets: dict = {}
+    for cars in sharding.car_managers():
+        groups.extend(
+            cars.values("dealer_id", "firm")
+            .annotate(
+                car_count=Count("id"),
+                price_sum=Coalesce(Sum("price"), Decimal("0")),
+                price_min=Min("price"),
+                price_max=Max("price"),
+                power_sum=Coalesce(Sum("power"), 0),
+                power_min=Min("power"),
+                power_max=Max("power"),
+            )
+            .order_by()
+        )
+        for dealer_id, firm, power in cars.values_list("dealer_id", "firm", "power").iterator():
+            group = buckets.setdefault((dealer_id, firm), {})
+            key = power_bucket(power)
+            group[key] = group.get(key, 0) + 1
+
+    rows = [
+        DealerFirmStats(power_buckets=buckets.get((g["dealer_id"], g["firm"]), {}), **g)
+        for g in groups
+    ]
+    with transaction.atomic():
+        DealerFirmStats.objects.all().delete()
+        DealerFirmStats.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _price_summary(price_sum, count, price_min, price_max) -> dict:
+    return {
+        "avg": float(price_sum) / count if count else None,
+        "min": float(price_min) if price_min is not None else None,
+        "max": float(price_max) if price_max is not None else None,
+    }
+
+
+def dealer_stats(dealer_id: int) -> dict:
+    by_firm = []
+    total_count = 0
+    total_price = Decimal("0")
+    price_min = price_max = None
+    for s in DealerFirmStats.objects.filter(dealer_id=dealer_id).order_by("firm"):
+        total_count += s.car_count
+        total_price += s.price_sum
+        price_min = s.price_min if price_min is None else min(price_min, s.price_min)
+        price_max = s.price_max if price_max is None else max(price_max, s.price_max)
+        by_firm.append(
+            {
+                "firm": s.firm,
+                "car_count": s.car_count,
+                "price": _price_summary(s.price_sum, s.car_count, s.price_min, s.price_max),
+                "power": {
+                    "avg": s.power_sum / s.car_count if s.car_count else None,
+                    "min": s.power_min,
+                    "max": s.power_max,
+                    "buckets": {
+                        k: s.power_buckets[k] for k in sorted(s.power_buckets, key=int)
+                    },
+                },
+            }
+        )
+    return {
+        "dealer_id": dealer_id,
+        "car_count": total_count,
+        "price": _price_summary(total_price, total_count, price_min, price_max),
+        "by_firm": by_firm,
+    }
+
+
+def stats_summary() -> dict:
+    dealers = (
+        DealerFirmStats.objects.values("dealer_id")
+        .annotate(
+            car_count=Sum("car_count"),
+            price_sum=Sum("price_sum"),
+            price_min=Min("price_min"),
+            price_max=Max("price_max"),
+        )
+        .order_by("dealer_id")
+    )
+    firms = (
+        DealerFirmStats.objects.values("firm")
+        .annotate(
+            car_count=Sum("car_count"),
+            power_sum=Sum("power_sum"),
+            power_min=Min("power_min"),
+            power_max=Max("power_max"),
+        )
+        .order_by("firm")
+    )
+    total = DealerFirmStats.objects.aggregate(
+        car_count=Coalesce(Sum("car_count"), 0),
+        price_sum=Sum("price_sum"),
+        price_min=Min("price_min"),
+        price_max=Max("price_max"),
+    )
+    return {
+        "car_count": total["car_count"],
+        "price": _price_summary(
+            total["price_sum"] or 0, total["car_count"], total["price_min"], total["price_max"]
+        ),
+        "dealers": [
+            {
+                "dealer_id": d["dealer_id"],
+                "car_count": d["car_count"],
+                "price": _price_summary(d["price_sum"], d["car_count"], d["price_min"], d["price_max"]),
+            }
+            for d in dealers
+        ],
+        "power_by_firm": [
+            {
+                "firm": f["firm"],
+                "car_count": f["car_count"],
+                "avg": f["power_sum"] / f["car_count"] if f["car_count"] else None,
+                "min": f["power_min"],
+                "max": f["power_max"],
+            }
+            for f in firms
+        ],
+    }
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -6,11 +7,23 @@ urlpatterns = [
     # Dealers
     path("dealers", views.dealers_list),
     path("dealers/<int:dealer_id>", views.dealer_detail),
+    path("dealers/<int:dealer_id>/stats", views.dealer_stats_detail),
+    # Stats
+    path("stats/summary", views.stats_summary_view),
     # Cars
     path("cars", views.cars_list),
     path("cars/<int:car_id>", views.car_detail),
+    path("cars/events", views.car_events_stream),
+    # Search
+    path("search", views.search),
+    # Metrics
+    path("metrics", views.metrics),
+    # Profiling
+    path("admin/profiles", views.profiles_list),
+    path("admin/profiles/<str:profile_id>", views.profile_detail),
     # Simple UI for cars
     path("cars-ui", views.cars_ui),
 ]
 
-
+if settings.CATALOG_SNAPSHOT_ENABLED:
+    urlpatterns.append(path("cars/query", views.cars_query))
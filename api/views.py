@@ -1,108 +1,60 @@
 import json
+import time
 from pathlib import Path
 
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
+
+from dal import CAR_FIELDS, DEALER_COLUMNS, DEALER_FIELDS, car_row_to_dict, dealer_row_to_dict, dealer_to_dict
+from dal.audit import query_budget
 
 from .models import Dealer, Car
 from .repository import CarRepository, CarData, car_to_dict
-from .events import CarRepositoryWithEvents, RabbitMQEventPublisher
+from .events import CarRepositoryWithEvents, default_publisher
+from .idempotency import QUERY_OVERHEAD as IDEMPOTENCY_QUERIES, idempotent
+from .live import sse_stream
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry as metrics_registry
+from .profiling import is_authorized, store as profile_store
+from .search import SearchIndexer, search_cars
+from .sharding import ShardedCarRepository, enabled as sharding_enabled
+from .snapshot import get_catalog, parse_query
+from .stats import DealerStatsAggregator, dealer_stats, stats_summary
 
 # Глобальный экземпляр publisher'а для переиспользования соединения
-_rabbitmq_publisher = RabbitMQEventPublisher()
-
-
-# Функция _parse_json больше не нужна, используем request.data из DRF
-
+_rabbitmq_publisher = default_publisher()
+# Локальные подписчики на изменения автомобилей
+_search_indexer = SearchIndexer()
+_car_listeners = [DealerStatsAggregator(), _search_indexer]
 
-dealer_schema = openapi.Schema(
-    type=openapi.TYPE_OBJECT,
-    properties={
-        "id": openapi.Schema(type=openapi.TYPE_INTEGER),
-        "name": openapi.Schema(type=openapi.TYPE_STRING),
-        "city": openapi.Schema(type=openapi.TYPE_STRING),
-        "address": openapi.Schema(type=openapi.TYPE_STRING),
-        "area": openapi.Schema(type=openapi.TYPE_STRING),
-        "rating": openapi.Schema(type=openapi.TYPE_NUMBER),
-    },
-)
 
-dealer_create_schema = openapi.Schema(
-    type=openapi.TYPE_OBJECT,
-    required=["name", "city", "address", "area", "rating"],
-    properties={
-        "name": openapi.Schema(type=openapi.TYPE_STRING),
-        "city": openapi.Schema(type=openapi.TYPE_STRING),
-        "address": openapi.Schema(type=openapi.TYPE_STRING),
-        "area": openapi.Schema(type=openapi.TYPE_STRING),
-        "rating": openapi.Schema(type=openapi.TYPE_NUMBER),
-    },
-)
+def _car_repository() -> CarRepositoryWithEvents:
+    repository = ShardedCarRepository() if sharding_enabled() else CarRepository()
+    return CarRepositoryWithEvents(repository, _rabbitmq_publisher, _car_listeners)
 
-car_schema = openapi.Schema(
-    type=openapi.TYPE_OBJECT,
-    properties={
-        "id": openapi.Schema(type=openapi.TYPE_INTEGER),
-        "firm": openapi.Schema(type=openapi.TYPE_STRING),
-        "model": openapi.Schema(type=openapi.TYPE_STRING),
-        "year": openapi.Schema(type=openapi.TYPE_INTEGER),
-        "power": openapi.Schema(type=openapi.TYPE_INTEGER),
-        "color": openapi.Schema(type=openapi.TYPE_STRING),
-        "price": openapi.Schema(type=openapi.TYPE_NUMBER),
-        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
-    },
-)
 
-car_create_schema = openapi.Schema(
-    type=openapi.TYPE_OBJECT,
-    required=["firm", "model", "year", "power", "color", "price", "dealer_id"],
-    properties={
-        "firm": openapi.Schema(type=openapi.TYPE_STRING),
-        "model": openapi.Schema(type=openapi.TYPE_STRING),
-        "year": openapi.Schema(type=openapi.TYPE_INTEGER),
-        "power": openapi.Schema(type=openapi.TYPE_INTEGER),
-        "color": openapi.Schema(type=openapi.TYPE_STRING),
-        "price": openapi.Schema(type=openapi.TYPE_NUMBER),
-        "dealer_id": openapi.Schema(type=openapi.TYPE_INTEGER),
-    },
-)
+# Функция _parse_json больше не нужна, используем request.data из DRF
 
 
+# Бюджеты SQL-запросов (api.query_audit) — запросов к одной базе, с запасом
+# над текущим числом; списки не должны зависеть от числа строк (N+1). Изменяющие
+# методы с @idempotent учитывают кэш Idempotency-Key в основной БД.
+@query_budget(GET=3, POST=8 + IDEMPOTENCY_QUERIES)
 @api_view(["GET", "POST"])
-@swagger_auto_schema(
-    method="get",
-    operation_summary="Получить список дилеров",
-    responses={200: openapi.Response("Список дилеров", schema=openapi.Schema(type=openapi.TYPE_ARRAY, items=dealer_schema))},
-)
-@swagger_auto_schema(
-    method="post",
-    operation_summary="Создать дилера",
-    request_body=dealer_create_schema,
-    responses={201: openapi.Response("ID созданного дилера", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)}))},
-)
-@api_view(["GET", "POST"])
+@idempotent
 def dealers_list(request):
     if request.method == "GET":
         dealers = [
-            {
-                "id": d.id,
-                "name": d.name,
-                "city": d.city,
-                "address": d.address,
-                "area": d.area,
-                "rating": float(d.rating) if d.rating is not None else None,
-            }
-            for d in Dealer.objects.all().order_by("id")
+            dealer_row_to_dict(r)
+            for r in Dealer.objects.order_by("id").values_list(*DEALER_COLUMNS)
         ]
         return Response(dealers)
 
     if request.method == "POST":
         data = request.data
-        required = ["name", "city", "address", "area", "rating"]
-        if any(k not in data for k in required):
+        if any(k not in data for k in DEALER_FIELDS):
             return Response({"error": "Missing required fields"}, status=400)
         dealer = Dealer.objects.create(
             name=data["name"],
@@ -114,23 +66,9 @@ def dealers_list(request):
         return Response({"id": dealer.id}, status=201)
 
 
-@swagger_auto_schema(
-    method="get",
-    operation_summary="Получить дилера по ID",
-    responses={200: dealer_schema, 404: "Дилер не найден"},
-)
-@swagger_auto_schema(
-    method="put",
-    operation_summary="Обновить дилера",
-    request_body=dealer_create_schema,
-    responses={200: openapi.Response("ID обновлённого дилера", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)}))},
-)
-@swagger_auto_schema(
-    method="delete",
-    operation_summary="Удалить дилера",
-    responses={204: "Дилер удалён", 404: "Дилер не найден"},
-)
+@query_budget(GET=3, PUT=8 + IDEMPOTENCY_QUERIES, DELETE=15 + IDEMPOTENCY_QUERIES)
 @api_view(["GET", "PUT", "DELETE"])
+@idempotent
 def dealer_detail(request, dealer_id: int):
     try:
         dealer = Dealer.objects.get(pk=dealer_id)
@@ -138,20 +76,11 @@ def dealer_detail(request, dealer_id: int):
         return Response(status=404)
 
     if request.method == "GET":
-        data = {
-            "id": dealer.id,
-            "name": dealer.name,
-            "city": dealer.city,
-            "address": dealer.address,
-            "area": dealer.area,
-            "rating": float(dealer.rating) if dealer.rating is not None else None,
-        }
-        return Response(data)
+        return Response(dealer_to_dict(dealer))
 
     if request.method == "PUT":
         data = request.data
-        required = ["name", "city", "address", "area", "rating"]
-        if any(k not in data for k in required):
+        if any(k not in data for k in DEALER_FIELDS):
             return Response({"error": "Missing required fields"}, status=400)
         dealer.name = data["name"]
         dealer.city = data["city"]
@@ -159,41 +88,54 @@ def dealer_detail(request, dealer_id: int):
         dealer.area = data["area"]
         dealer.rating = data["rating"]
         dealer.save()
+        _search_indexer.on_dealer_changed(dealer)
         return Response({"id": dealer.id})
 
     if request.method == "DELETE":
         dealer.delete()
+        _search_indexer.on_dealer_deleted(dealer_id)
         return Response(status=204)
 
 
-@swagger_auto_schema(
-    method="get",
-    operation_summary="Получить список автомобилей",
-    operation_description="Возвращает список всех автомобилей. При создании/обновлении/удалении автомобиля отправляется событие в RabbitMQ.",
-    responses={200: openapi.Response("Список автомобилей", schema=openapi.Schema(type=openapi.TYPE_ARRAY, items=car_schema))},
-)
-@swagger_auto_schema(
-    method="post",
-    operation_summary="Создать автомобиль",
-    operation_description="Создаёт новый автомобиль и отправляет событие CREATE в RabbitMQ.",
-    request_body=car_create_schema,
-    responses={
-        201: openapi.Response("ID созданного автомобиля", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)})),
-        400: "Ошибка валидации или дилер не найден",
-    },
-)
+@query_budget(4)
+@api_view(["GET"])
+def dealer_stats_detail(request, dealer_id: int):
+    if not Dealer.objects.filter(pk=dealer_id).exists():
+        return Response(status=404)
+    return Response(dealer_stats(dealer_id))
+
+
+@query_budget(5)
+@api_view(["GET"])
+def stats_summary_view(request):
+    return Response(stats_summary())
+
+
+@query_budget(GET=3, POST=16 + IDEMPOTENCY_QUERIES)
 @api_view(["GET", "POST"])
+@idempotent
 def cars_list(request):
-    repo = CarRepositoryWithEvents(CarRepository(), _rabbitmq_publisher)
+    repo = _car_repository()
 
     if request.method == "GET":
-        cars = [car_to_dict(c) for c in repo.list_cars()]
-        return Response(cars)
+        params = request.query_params
+        if "limit" not in params and "after" not in params:
+            return Response([car_row_to_dict(r) for r in repo.list_car_rows()])
+        # keyset-пагинация: страница после id=after, ссылка на следующую — в Link
+        try:
+            limit = min(max(int(params.get("limit", 100)), 1), 1000)
+            after = int(params["after"]) if "after" in params else None
+        except ValueError:
+            return Response({"error": "limit and after must be integers"}, status=400)
+        rows = repo.list_car_rows(after_id=after, limit=limit)
+        response = Response([car_row_to_dict(r) for r in rows])
+        if len(rows) == limit:
+            response["Link"] = f'</cars?after={rows[-1][0]}&limit={limit}>; rel="next"'
+        return response
 
     if request.method == "POST":
         data = request.data
-        required = ["firm", "model", "year", "power", "color", "price", "dealer_id"]
-        if any(k not in data for k in required):
+        if any(k not in data for k in CAR_FIELDS):
             return Response({"error": "Missing required fields"}, status=400)
         # Проверка существования дилера внутри репозитория: вернёт исключение Dealer.DoesNotExist
         try:
@@ -204,59 +146,50 @@ def cars_list(request):
         return Response({"id": car.id}, status=201)
 
 
-@swagger_auto_schema(
-    method="get",
-    operation_summary="Получить автомобиль по ID",
-    responses={200: car_schema, 404: "Автомобиль не найден"},
-)
-@swagger_auto_schema(
-    method="put",
-    operation_summary="Обновить автомобиль",
-    operation_description="Обновляет автомобиль и отправляет событие UPDATE в RabbitMQ.",
-    request_body=car_create_schema,
-    responses={
-        200: openapi.Response("ID обновлённого автомобиля", schema=openapi.Schema(type=openapi.TYPE_OBJECT, properties={"id": openapi.Schema(type=openapi.TYPE_INTEGER)})),
-        400: "Ошибка валидации или дилер не найден",
-        404: "Автомобиль не найден",
-    },
+@query_budget(
+    GET=3,
+    PUT=20 + IDEMPOTENCY_QUERIES,
+    PATCH=22 + IDEMPOTENCY_QUERIES,
+    DELETE=12 + IDEMPOTENCY_QUERIES,
 )
-@swagger_auto_schema(
-    method="delete",
-    operation_summary="Удалить автомобиль",
-    operation_description="Удаляет автомобиль и отправляет событие DELETE в RabbitMQ.",
-    responses={204: "Автомобиль удалён", 404: "Автомобиль не найден"},
-)
-@api_view(["GET", "PUT", "DELETE"])
+@api_view(["GET", "PUT", "PATCH", "DELETE"])
+@idempotent
 def car_detail(request, car_id: int):
-    repo = CarRepositoryWithEvents(CarRepository(), _rabbitmq_publisher)
+    repo = _car_repository()
 
     car = repo.get_car(car_id)
     if car is None:
         return Response(status=404)
 
     if request.method == "GET":
-        data = {
-            "id": car.id,
-            "firm": car.firm,
-            "model": car.model,
-            "year": car.year,
-            "power": car.power,
-            "color": car.color,
-            "price": float(car.price) if car.price is not None else None,
-            "dealer_id": car.dealer_id,
-        }
-        return Response(data)
+        return Response(car_to_dict(car))
 
     if request.method == "PUT":
         data = request.data
-        required = ["firm", "model", "year", "power", "color", "price", "dealer_id"]
-        if any(k not in data for k in required):
+        if any(k not in data for k in CAR_FIELDS):
             return Response({"error": "Missing required fields"}, status=400)
         try:
             car_data = CarData.from_dict(data)
             car = repo.update_car(car_id, car_data)
         except Dealer.DoesNotExist:
             return Response({"error": "Dealer not found"}, status=400)
+        except ValidationError as e:
+            return Response({"error": e.messages}, status=400)
+        if car is None:
+            return Response(status=404)
+        return Response({"id": car.id})
+
+    if request.method == "PATCH":
+        data = request.data
+        unknown = [k for k in data if k not in CAR_FIELDS]
+        if not data or unknown:
+            return Response({"error": "Unknown or missing fields", "fields": unknown}, status=400)
+        try:
+            car = repo.patch_car(car_id, {k: data[k] for k in CAR_FIELDS if k in data})
+        except Dealer.DoesNotExist:
+            return Response({"error": "Dealer not found"}, status=400)
+        except ValidationError as e:
+            return Response({"error": e.messages}, status=400)
         if car is None:
             return Response(status=404)
         return Response({"id": car.id})
@@ -268,6 +201,77 @@ def car_detail(request, car_id: int):
         return Response(status=204)
 
 
+@query_budget(3)
+@api_view(["GET"])
+def search(request):
+    try:
+        limit = min(max(int(request.query_params.get("limit", 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+    return Response(search_cars(request.query_params.get("q", ""), limit))
+
+
+@query_budget(4)
+@api_view(["GET"])
+def cars_query(request):
+    try:
+        predicates, aggregates, group_by = parse_query(dict(request.query_params.lists()))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    started = time.perf_counter()
+    result = get_catalog().query(predicates, aggregates, group_by)
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return Response(result)
+
+
+@query_budget(0)
+def car_events_stream(request):
+    """Поток изменений автомобилей (Server-Sent Events) для web UI."""
+    response = StreamingHttpResponse(sse_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx не должен буферизовать поток
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@query_budget(0)
+def metrics(request):
+    """Метрики процесса в текстовом формате Prometheus."""
+    return HttpResponse(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def _profiles_forbidden(request):
+    if not settings.PROFILING_TOKEN:
+        return HttpResponse(status=404)
+    if not is_authorized(request, settings.PROFILING_TOKEN):
+        return HttpResponse(status=403)
+    return None
+
+
+@query_budget(0)
+def profiles_list(request):
+    """Последние профили запросов этого процесса (нужен заголовок X-Profile с токеном)."""
+    forbidden = _profiles_forbidden(request)
+    if forbidden:
+        return forbidden
+    return JsonResponse([p.summary() for p in profile_store.list()], safe=False)
+
+
+@query_budget(0)
+def profile_detail(request, profile_id: str):
+    """Профиль запроса; ?format=collapsed отдаёт стеки для flamegraph.pl/speedscope."""
+    forbidden = _profiles_forbidden(request)
+    if forbidden:
+        return forbidden
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        return HttpResponse(status=404)
+    if request.GET.get("format") == "collapsed":
+        return HttpResponse(profile.collapsed(), content_type="text/plain; charset=utf-8")
+    return JsonResponse(profile.to_dict())
+
+
+@query_budget(0)
 def cars_ui(request):
     """Простой одностраничный UI поверх REST API."""
     from pathlib import Path
@@ -1,243 +1,171 @@
-from flask import Flask, jsonify, request, abort
-import psycopg2
 import os
 
+from flask import Flask, Response, request, abort, g
+
+from api.events import RabbitMQEventPublisher
+from dal import CAR_FIELDS, DEALER_FIELDS, CarData, CarRepositoryWithEvents, DealerData, car_row_to_dict, car_to_dict, dealer_row_to_dict, dumps
+from dal import audit
+from dal.audit import query_budget
+from dal.pool import PgPool
+from dal.postgres import DealerNotFound, PgCarRepository, PgDealerRepository
+
 app = Flask(__name__)
 
+# Общие для всех запросов: пул соединений и publisher событий
+pool = PgPool()
+dealers = PgDealerRepository(pool)
+publisher = RabbitMQEventPublisher()
+cars = CarRepositoryWithEvents(PgCarRepository(pool), publisher)
+if os.getenv("RABBITMQ_PRECONNECT", "1") == "1":
+    publisher.start()
+
+
+# Аудит SQL-запросов (см. dal.audit): off | log | raise
+QUERY_AUDIT_MODE = os.getenv("QUERY_AUDIT_MODE", "log")
+DEFAULT_BUDGET = audit.Budget(int(os.getenv("QUERY_BUDGET_DEFAULT", "50")))
+
+
+def json_response(data, status: int = 200) -> Response:
+    return Response(dumps(data), status=status, mimetype="application/json")
 
-def get_conn():
-    return psycopg2.connect(
-        dbname=os.getenv("PG_DB", "cars_db"),
-        user=os.getenv("PG_USER", "postgres"),
-        password=os.getenv("PG_PASSWORD", "rms100605"),
-        host=os.getenv("PG_HOST", "localhost"),
-        port=os.getenv("PG_PORT", "5432"),
-    )
 
+@app.before_request
+def _begin_query_audit():
+    if audit.current_mode(QUERY_AUDIT_MODE) != "off":
+        g.query_audit_token = audit.begin()
 
+
+@app.after_request
+def _check_query_budget(response: Response) -> Response:
+    token = g.pop("query_audit_token", None)
+    if token is None:
+        return response
+    record = audit.finish(token)
+    view = app.view_functions.get(request.endpoint)
+    if view is not None:
+        budget = audit.budget_for(view, request.method) or DEFAULT_BUDGET
+        audit.check(record, budget, f"{request.method} {request.endpoint}", audit.current_mode(QUERY_AUDIT_MODE))
+    return response
+
+
+@app.teardown_request
+def _drop_query_audit(exc=None):
+    # after_request не вызывается при необработанном исключении
+    token = g.pop("query_audit_token", None)
+    if token is not None:
+        audit.finish(token)
+
+
+# Бюджеты с учётом PREPARE при первом выполнении запроса в соединении
 @app.get("/dealers")
+@query_budget(2)
 def list_dealers():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, name, city, address, area, rating FROM dealers ORDER BY id")
-            rows = cur.fetchall()
-    dealers = [
-        {
-            "id": r[0],
-            "name": r[1],
-            "city": r[2],
-            "address": r[3],
-            "area": r[4],
-            "rating": float(r[5]) if r[5] is not None else None,
-        }
-        for r in rows
-    ]
-    return jsonify(dealers)
+    return json_response([dealer_row_to_dict(r) for r in dealers.list_dealer_rows()])
 
 
 @app.get("/dealers/<int:dealer_id>")
+@query_budget(2)
 def get_dealer(dealer_id: int):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, name, city, address, area, rating FROM dealers WHERE id=%s",
-                (dealer_id,),
-            )
-            r = cur.fetchone()
+    r = dealers.get_dealer_row(dealer_id)
     if not r:
         abort(404)
-    dealer = {
-        "id": r[0],
-        "name": r[1],
-        "city": r[2],
-        "address": r[3],
-        "area": r[4],
-        "rating": float(r[5]) if r[5] is not None else None,
-    }
-    return jsonify(dealer)
+    return json_response(dealer_row_to_dict(r))
 
 
 @app.post("/dealers")
+@query_budget(2)
 def create_dealer():
     data = request.get_json(silent=True) or {}
-    required = ["name", "city", "address", "area", "rating"]
-    if any(k not in data for k in required):
+    if any(k not in data for k in DEALER_FIELDS):
         abort(400)
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO dealers (name, city, address, area, rating)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-                """,
-                (data["name"], data["city"], data["address"], data["area"], data["rating"]),
-            )
-            new_id = cur.fetchone()[0]
-            conn.commit()
-    return jsonify({"id": new_id}), 201
+    new_id = dealers.create_dealer(DealerData.from_dict(data))
+    return json_response({"id": new_id}, 201)
 
 
 @app.put("/dealers/<int:dealer_id>")
+@query_budget(2)
 def update_dealer(dealer_id: int):
     data = request.get_json(silent=True) or {}
-    required = ["name", "city", "address", "area", "rating"]
-    if any(k not in data for k in required):
+    if any(k not in data for k in DEALER_FIELDS):
         abort(400)
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE dealers
-                SET name=%s, city=%s, address=%s, area=%s, rating=%s
-                WHERE id=%s
-                """,
-                (
-                    data["name"],
-                    data["city"],
-                    data["address"],
-                    data["area"],
-                    data["rating"],
-                    dealer_id,
-                ),
-            )
-            if cur.rowcount == 0:
-                abort(404)
-            conn.commit()
-    return jsonify({"id": dealer_id})
+    if not dealers.update_dealer(dealer_id, DealerData.from_dict(data)):
+        abort(404)
+    return json_response({"id": dealer_id})
 
 
 @app.delete("/dealers/<int:dealer_id>")
+@query_budget(2)
 def delete_dealer(dealer_id: int):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM dealers WHERE id=%s", (dealer_id,))
-            if cur.rowcount == 0:
-                abort(404)
-            conn.commit()
+    if not dealers.delete_dealer(dealer_id):
+        abort(404)
     return ("", 204)
 
 
 @app.get("/cars")
+@query_budget(2)
 def list_cars():
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, firm, model, year, power, color, price, dealer_id FROM cars ORDER BY id"
-            )
-            rows = cur.fetchall()
-    cars = [
-        {
-            "id": r[0],
-            "firm": r[1],
-            "model": r[2],
-            "year": r[3],
-            "power": r[4],
-            "color": r[5],
-            "price": float(r[6]) if r[6] is not None else None,
-            "dealer_id": r[7],
-        }
-        for r in rows
-    ]
-    return jsonify(cars)
+    return json_response([car_row_to_dict(r) for r in cars.list_car_rows()])
 
 
 @app.get("/cars/<int:car_id>")
+@query_budget(2)
 def get_car(car_id: int):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT id, firm, model, year, power, color, price, dealer_id FROM cars WHERE id=%s",
-                (car_id,),
-            )
-            r = cur.fetchone()
-    if not r:
+    car = cars.get_car(car_id)
+    if car is None:
         abort(404)
-    car = {
-        "id": r[0],
-        "firm": r[1],
-        "model": r[2],
-        "year": r[3],
-        "power": r[4],
-        "color": r[5],
-        "price": float(r[6]) if r[6] is not None else None,
-        "dealer_id": r[7],
-    }
-    return jsonify(car)
+    return json_response(car_to_dict(car))
 
 
 @app.post("/cars")
+@query_budget(4)
 def create_car():
     data = request.get_json(silent=True) or {}
-    required = ["firm", "model", "year", "power", "color", "price", "dealer_id"]
-    if any(k not in data for k in required):
+    if any(k not in data for k in CAR_FIELDS):
         abort(400)
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO cars (firm, model, year, power, color, price, dealer_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-                """,
-                (
-                    data["firm"],
-                    data["model"],
-                    data["year"],
-                    data["power"],
-                    data["color"],
-                    data["price"],
-                    data["dealer_id"],
-                ),
-            )
-            new_id = cur.fetchone()[0]
-            conn.commit()
-    return jsonify({"id": new_id}), 201
+    try:
+        car = cars.create_car(CarData.from_dict(data))
+    except DealerNotFound:
+        return json_response({"error": "Dealer not found"}, 400)
+    return json_response({"id": car.id}, 201)
 
 
 @app.put("/cars/<int:car_id>")
+@query_budget(6)
 def update_car(car_id: int):
     data = request.get_json(silent=True) or {}
-    required = ["firm", "model", "year", "power", "color", "price", "dealer_id"]
-    if any(k not in data for k in required):
+    if any(k not in data for k in CAR_FIELDS):
         abort(400)
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE cars
-                SET firm=%s, model=%s, year=%s, power=%s, color=%s, price=%s, dealer_id=%s
-                WHERE id=%s
-                """,
-                (
-                    data["firm"],
-                    data["model"],
-                    data["year"],
-                    data["power"],
-                    data["color"],
-                    data["price"],
-                    data["dealer_id"],
-                    car_id,
-                ),
-            )
-            if cur.rowcount == 0:
-                abort(404)
-            conn.commit()
-    return jsonify({"id": car_id})
+    try:
+        car = cars.update_car(car_id, CarData.from_dict(data))
+    except DealerNotFound:
+        return json_response({"error": "Dealer not found"}, 400)
+    if car is None:
+        abort(404)
+    return json_response({"id": car_id})
+
+
+@app.patch("/cars/<int:car_id>")
+@query_budget(6)
+def patch_car(car_id: int):
+    data = request.get_json(silent=True) or {}
+    if not data or any(k not in CAR_FIELDS for k in data):
+        abort(400)
+    try:
+        car = cars.patch_car(car_id, data)
+    except DealerNotFound:
+        return json_response({"error": "Dealer not found"}, 400)
+    if car is None:
+        abort(404)
+    return json_response({"id": car_id})
 
 
 @app.delete("/cars/<int:car_id>")
+@query_budget(4)
 def delete_car(car_id: int):
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM cars WHERE id=%s", (car_id,))
-            if cur.rowcount == 0:
-                abort(404)
-            conn.commit()
+    if not cars.delete_car(car_id):
+        abort(404)
     return ("", 204)
 
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
-
-
@@ -16,17 +16,33 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
-    "drf_yasg",
     "api",
 ]
 
+# Документация (/swagger.json, /swagger/, /redoc/). В рабочих процессах без документации
+# (API_DOCS=0) drf_yasg не импортируется вовсе.
+API_DOCS_ENABLED = os.getenv("API_DOCS", "1") == "1"
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index("api"), "drf_yasg")
+# Готовая схема от `manage.py generate_openapi_schema`; если файла нет, схема строится при первом запросе
+OPENAPI_SCHEMA_PATH = Path(os.getenv("OPENAPI_SCHEMA_PATH", BASE_DIR / "openapi.json"))
+# Swagger UI и ReDoc загружают схему с кэшируемого /swagger.json
+SWAGGER_SETTINGS = {"SPEC_URL": ("schema-json", {"format": ".json"})}
+REDOC_SETTINGS = {"SPEC_URL": ("schema-json", {"format": ".json"})}
+
 MIDDLEWARE = [
+    "api.correlation.CorrelationIdMiddleware",
+    "api.lanes.EventLaneMiddleware",
+    "api.profiling.ProfilingMiddleware",
+    "api.query_audit.QueryAuditMiddleware",
+    "api.admission.AdmissionControlMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "api.db_router.ReadYourWritesMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -49,12 +65,137 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
-DATABASES = {
-    "default": {
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+
+
+def _sqlite_database(name, init_command: str = "") -> dict:
+    return {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "cars_dealers.db",
+        "NAME": name,
+        # постоянные соединения вместо нового подключения на каждый запрос
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            # WAL: читатели не блокируются писателем; NORMAL безопасен в режиме WAL
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))};"
+                "PRAGMA temp_store=MEMORY;"
+                + init_command
+            ),
+            # busy timeout, с; IMMEDIATE берёт блокировку записи в начале транзакции
+            "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "5")),
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+
+
+def _postgres_database(host: str) -> dict:
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("PG_DB", "cars_db"),
+        "USER": os.getenv("PG_USER", "postgres"),
+        "PASSWORD": os.getenv("PG_PASSWORD", "rms100605"),
+        "HOST": host,
+        "PORT": os.getenv("PG_PORT", "5432"),
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
     }
+
+
+# Основная БД принимает все записи; чтения распределяются по read-алиасам
+# (см. api.db_router.PrimaryReplicaRouter).
+if os.getenv("DB_ENGINE", "sqlite") == "postgresql":
+    DATABASES = {"default": _postgres_database(os.getenv("PG_HOST", "localhost"))}
+    # PG_REPLICA_HOSTS="replica1:5432,replica2" — хосты реплик (порт опционален)
+    for i, replica in enumerate(filter(None, os.getenv("PG_REPLICA_HOSTS", "").split(",")), start=1):
+        host, _, port = replica.strip().partition(":")
+        DATABASES[f"replica{i}"] = _postgres_database(host)
+        if port:
+            DATABASES[f"replica{i}"]["PORT"] = port
+else:
+    _sqlite_path = BASE_DIR / "cars_dealers.db"
+    DATABASES = {"default": _sqlite_database(_sqlite_path)}
+    # В режиме WAL отдельные соединения на чтение не ждут писателя;
+    # query_only защищает от случайной записи через read-алиас
+    for i in range(1, int(os.getenv("SQLITE_READ_CONNECTIONS", "1")) + 1):
+        DATABASES[f"replica{i}"] = _sqlite_database(_sqlite_path, "PRAGMA query_only=ON;")
+
+for _alias in DATABASES:
+    if _alias != "default":
+        DATABASES[_alias]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["api.db_router.PrimaryReplicaRouter"]
+DATABASE_READ_ALIASES = [a for a in DATABASES if a != "default"]
+# Сколько секунд после записи клиент читает из основной БД (read-your-writes)
+DATABASE_STICKY_SECONDS = int(os.getenv("DB_STICKY_SECONDS", "5"))
+
+# Шардирование автомобилей по дилеру (api.sharding). Таблица cars живёт в базах
+# shard0..shardN-1, дилеры копируются в каждую; основная БД хранит справочник
+# размещения дилеров и блоки ID. Без шардов всё работает как раньше.
+if os.getenv("DB_ENGINE", "sqlite") == "postgresql":
+    # PG_SHARD_HOSTS="shard-a:5432,shard-b" — по хосту на шард (порт опционален)
+    for i, shard in enumerate(filter(None, os.getenv("PG_SHARD_HOSTS", "").split(","))):
+        host, _, port = shard.strip().partition(":")
+        DATABASES[f"shard{i}"] = _postgres_database(host)
+        if port:
+            DATABASES[f"shard{i}"]["PORT"] = port
+else:
+    for i in range(int(os.getenv("CAR_SHARDS", "0"))):
+        DATABASES[f"shard{i}"] = _sqlite_database(BASE_DIR / f"cars_shard{i}.db")
+CAR_SHARDS = [a for a in DATABASES if a.startswith("shard")]
+# Как долго процесс кэширует размещение дилера; rebalance_car_shards ждёт столько же
+CAR_SHARD_MAP_TTL = float(os.getenv("CAR_SHARD_MAP_TTL", "5"))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Ответы на запросы с Idempotency-Key. Кэш общий для всех воркеров: по умолчанию
+    # таблица idempotency_cache в основной БД (создаётся миграцией), можно Redis или
+    # Memcached. Локальные для процесса бэкенды отклоняются при старте (api.idempotency)
+    "idempotency": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "idempotency_cache",
+        "TIMEOUT": int(os.getenv("IDEMPOTENCY_TTL", str(24 * 60 * 60))),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))},
+    },
+}
+
+IDEMPOTENCY_CACHE = "idempotency"
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Подключать publisher к RabbitMQ при старте WSGI-воркера и держать соединение в фоне
+RABBITMQ_PRECONNECT = os.getenv("RABBITMQ_PRECONNECT", "1") == "1"
+
+# Колоночный снимок каталога в памяти (api.snapshot) и /cars/query; перестраивается
+# целиком раз в CATALOG_SNAPSHOT_REFRESH секунд
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT", "0") == "1"
+CATALOG_SNAPSHOT_REFRESH = float(os.getenv("CATALOG_SNAPSHOT_REFRESH", "300"))
+
+# Профилирование (api.profiling): доля случайно профилируемых запросов и токен
+# для заголовка X-Profile; пустой токен отключает и заголовок, и /admin/profiles
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+
+# Аудит SQL-запросов (api.query_audit): off | log | raise
+QUERY_AUDIT_MODE = os.getenv("QUERY_AUDIT_MODE", "log")
+# Бюджет представлений без @query_budget
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "50"))
+
+# Admission control (api.admission): лимиты на изменяющие запросы и сброс нагрузки
+ADMISSION_WRITE_RATE = float(os.getenv("ADMISSION_WRITE_RATE", "20"))  # запросов/с на клиента
+ADMISSION_WRITE_BURST = float(os.getenv("ADMISSION_WRITE_BURST", "40"))
+ADMISSION_MAX_CONCURRENT = {
+    "read": int(os.getenv("ADMISSION_MAX_READS", "64")),
+    "write": int(os.getenv("ADMISSION_MAX_WRITES", "16")),
 }
+ADMISSION_MAX_SPOOLED_EVENTS = int(os.getenv("ADMISSION_MAX_SPOOLED_EVENTS", "1000"))
+ADMISSION_MAX_DB_LATENCY_MS = float(os.getenv("ADMISSION_MAX_DB_LATENCY_MS", "500"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
 
 LANGUAGE_CODE = "ru-ru"
 
@@ -1,42 +1,15 @@
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import include, path, re_path
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Cars API",
-        default_version="v1",
-        description="API для управления автомобилями с интеграцией RabbitMQ",
-        contact=openapi.Contact(email="admin@example.com"),
-    ),
-    public=True,
-)
+from django.urls import include, path
 
 urlpatterns = [
     path("", include("api.urls")),
-    # Swagger UI
-    re_path(
-        r"^swagger(?P<format>\.json|\.yaml)$",
-        schema_view.without_ui(cache_timeout=0),
-        name="schema-json",
-    ),
-    path(
-        "swagger/",
-        schema_view.with_ui("swagger", cache_timeout=0),
-        name="schema-swagger-ui",
-    ),
-    # ReDoc
-    path(
-        "redoc/",
-        schema_view.with_ui("redoc", cache_timeout=0),
-        name="schema-redoc",
-    ),
 ]
 
+# Swagger UI, ReDoc и схема; api.docs импортирует drf_yasg, поэтому подключается только по настройке
+if settings.API_DOCS_ENABLED:
+    urlpatterns += [path("", include("api.docs"))]
+
 # Раздача статических файлов в режиме разработки
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.BASE_DIR / "web_ui")
-
-
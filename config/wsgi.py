@@ -1,9 +1,21 @@
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
 
+# Соединение с RabbitMQ устанавливается при загрузке воркера, а не на первой записи.
+# Здесь, а не в ApiConfig.ready(): ready() выполняется и для migrate, и для потребителей.
+if settings.RABBITMQ_PRECONNECT:
+    from api.events import default_publisher
 
+    default_publisher().start()
+
+# Снимок каталога строится в фоне, чтобы первый /cars/query его не ждал
+if settings.CATALOG_SNAPSHOT_ENABLED:
+    from api.snapshot import get_catalog
+
+    get_catalog()
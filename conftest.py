@@ -0,0 +1,40 @@
+"""Окружение тестов: тестовые БД Django, буфер событий во временном каталоге.
+
+RabbitMQ для тестов не нужен: без соединения события уходят в буфер.
+"""
+import importlib.util
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("EVENTS_SPOOL_PATH", os.path.join(tempfile.mkdtemp(prefix="cars-tests-"), "events_spool.db"))
+os.environ.setdefault("RABBITMQ_CONNECT_TIMEOUT", "0.2")
+os.environ.setdefault("RABBITMQ_PRECONNECT", "0")
+# снимок каталога требует numpy; без него /cars/query не подключается
+if importlib.util.find_spec("numpy") is not None:
+    os.environ.setdefault("CATALOG_SNAPSHOT", "1")
+os.environ.setdefault("PROFILING_TOKEN", "test-profiling-token")
+
+import django  # noqa: E402
+
+django.setup()
+
+pytest_plugins = ["api.pytest_plugin"]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def django_test_databases():
+    from django.test.utils import (
+        setup_databases,
+        setup_test_environment,
+        teardown_databases,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    config = setup_databases(verbosity=0, interactive=False)
+    yield
+    teardown_databases(config, verbosity=0)
+    teardown_test_environment()
@@ -0,0 +1,34 @@
+"""Общий слой доступа к данным для Django API (api/) и Flask-приложения (app.py).
+
+Модули без внешних зависимостей реэкспортируются здесь; пул и репозитории
+PostgreSQL (psycopg2) импортируются явно из dal.pool и dal.postgres.
+
+Общие для обоих сервисов: записи и наборы полей (dal.records), сериализация,
+CarRepositoryWithEvents и аудит запросов. Пул с prepared statements использует
+только Flask: Django работает через свои соединения (CONN_MAX_AGE), потому что
+на них построены роутер реплик, шарды и транзакция, в которой вместе с
+автомобилем обновляются статистика и поисковый индекс, — второй пул открыл бы
+отдельные соединения вне этой транзакции. Поэтому CRUD автомобилей и дилеров
+реализован дважды: ORM в api.repository и SQL в dal.postgres с одинаковым
+интерфейсом.
+"""
+from .events import CarRepositoryWithEvents
+from .records import CAR_COLUMNS, CAR_FIELDS, DEALER_COLUMNS, DEALER_FIELDS, CarData, CarRecord, DealerData
+from .serializers import car_row_to_dict, car_to_dict, dealer_row_to_dict, dealer_to_dict, diff, dumps
+
+__all__ = [
+    "CAR_COLUMNS",
+    "CAR_FIELDS",
+    "DEALER_COLUMNS",
+    "DEALER_FIELDS",
+    "CarData",
+    "CarRecord",
+    "CarRepositoryWithEvents",
+    "DealerData",
+    "car_row_to_dict",
+    "car_to_dict",
+    "dealer_row_to_dict",
+    "dealer_to_dict",
+    "diff",
+    "dumps",
+]
@@ -0,0 +1,212 @@
+"""Аудит SQL-запросов запроса: число, время и повторяющиеся формы (N+1).
+
+Запросы учитываются, пока активен аудит (auditing() или begin()/finish());
+вне аудита timed() почти бесплатен. Формы запросов — SQL с литералами,
+заменёнными на "?", и свёрнутыми списками IN (...): один и тот же запрос
+с разными параметрами даёт одну форму, и её повторы выдают N+1.
+
+Бюджет задаётся на обработчик декоратором @query_budget и проверяется
+check(): при превышении — предупреждение в лог или QueryBudgetExceeded.
+Запросы считаются по базам, и бюджет ограничивает самую нагруженную: так он
+не зависит от числа шардов, по которым расходится scatter-gather.
+Модуль не зависит ни от Django, ни от Flask: его используют api.query_audit
+и app.py (через курсор dal.pool).
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "log", "raise")
+# Сколько запросов одной формы допустимо за обработку, если бюджет не говорит иного
+DEFAULT_MAX_REPEATS = 3
+
+_active: ContextVar[Optional["QueryAudit"]] = ContextVar("query_audit", default=None)
+# режим, навязанный вызывающим кодом (pytest-плагином) поверх настроек
+_forced_mode: ContextVar[Optional[str]] = ContextVar("query_audit_mode", default=None)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*(?:\?|%s|\$\d+)(?:\s*,\s*(?:\?|%s|\$\d+))*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def query_shape(sql: str) -> str:
+    shape = _STRING_RE.sub("?", sql)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("(...)", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Обработчик превысил бюджет запросов (режим raise)."""
+
+
+@dataclass(frozen=True)
+class Budget:
+    # запросов к одной базе
+    max_queries: int
+    max_repeats: int = DEFAULT_MAX_REPEATS
+    max_ms: Optional[float] = None
+
+
+class QueryAudit:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_ms = 0.0
+        self.by_database: Counter = Counter()
+        # по (база, исходный SQL): нормализация откладывается до проверки и
+        # делается один раз на уникальную строку
+        self._statements: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, sql: str, elapsed_ms: float, database: str = "default") -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.by_database[database] += 1
+            self._statements[database, sql] += 1
+
+    def busiest(self) -> Tuple[str, int]:
+        with self._lock:
+            return max(self.by_database.items(), key=lambda item: item[1], default=("", 0))
+
+    def shapes(self) -> Counter:
+        """(база, форма запроса) -> сколько раз выполнялся."""
+        with self._lock:
+            statements = list(self._statements.items())
+        shapes: Counter = Counter()
+        for (database, sql), n in statements:
+            shapes[database, query_shape(sql)] += n
+        return shapes
+
+    def repeated(self, max_repeats: int) -> List[Tuple[str, str, int]]:
+        return [(database, shape, n) for (database, shape), n in self.shapes().most_common() if n > max_repeats]
+
+    def summary(self) -> dict:
+        return {"queries": self.count, "by_database": dict(self.by_database), "total_ms": round(self.total_ms, 3)}
+
+
+def active() -> Optional[QueryAudit]:
+    return _active.get()
+
+
+def begin() -> Token:
+    return _active.set(QueryAudit())
+
+
+def finish(token: Token) -> QueryAudit:
+    audit = _active.get()
+    _active.reset(token)
+    return audit
+
+
+@contextmanager
+def auditing():
+    token = begin()
+    try:
+        yield _active.get()
+    finally:
+        finish(token)
+
+
+@contextmanager
+def timed(sql: str, database: str = "default"):
+    audit = _active.get()
+    if audit is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        audit.record(sql, (time.perf_counter() - start) * 1000, database)
+
+
+def record_execute(execute, sql, params, many, context):
+    """Обёртка для Django connection.execute_wrapper()."""
+    with timed(sql, context["connection"].alias):
+        return execute(sql, params, many, context)
+
+
+def query_budget(
+    max_queries: Optional[int] = None,
+    *,
+    max_repeats: int = DEFAULT_MAX_REPEATS,
+    max_ms: Optional[float] = None,
+    **methods: int,
+) -> Callable:
+    """Бюджет обработчика: @query_budget(2) или по методам — @query_budget(GET=1, POST=6).
+
+    Не оборачивает функцию, а ставит ей атрибут, поэтому порядок с другими
+    декораторами не важен, если этот — внешний.
+    """
+    budgets: Dict[str, Budget] = {
+        method.upper(): Budget(n, max_repeats, max_ms) for method, n in methods.items()
+    }
+    if max_queries is not None:
+        budgets["*"] = Budget(max_queries, max_repeats, max_ms)
+
+    def decorator(view):
+        view.query_budgets = budgets
+        return view
+
+    return decorator
+
+
+def budget_for(view, method: str) -> Optional[Budget]:
+    budgets = getattr(view, "query_budgets", None) or {}
+    return budgets.get(method.upper()) or budgets.get("*")
+
+
+def violations(audit: QueryAudit, budget: Budget) -> List[str]:
+    problems = []
+    database, count = audit.busiest()
+    if count > budget.max_queries:
+        problems.append(f"{count} queries to {database} (budget {budget.max_queries})")
+    for database, shape, n in audit.repeated(budget.max_repeats):
+        problems.append(f"{n}x repeated on {database} (max {budget.max_repeats}): {shape[:200]}")
+    if budget.max_ms is not None and audit.total_ms > budget.max_ms:
+        problems.append(f"{audit.total_ms:.1f} ms in queries (budget {budget.max_ms:g} ms)")
+    return problems
+
+
+def current_mode(configured: str) -> str:
+    return _forced_mode.get() or configured
+
+
+@contextmanager
+def enforcing(mode: str = "raise"):
+    """Режим проверки бюджетов внутри блока, независимо от настроек (для тестов)."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown query audit mode: {mode!r}")
+    token = _forced_mode.set(mode)
+    try:
+        yield
+    finally:
+        _forced_mode.reset(token)
+
+
+def report(problems: List[str], label: str, mode: str) -> None:
+    """Лог или QueryBudgetExceeded — в зависимости от режима."""
+    if not problems:
+        return
+    message = f"Query budget exceeded in {label}: " + "; ".join(problems)
+    if mode == "raise":
+        raise QueryBudgetExceeded(message)
+    if mode == "log":
+        logger.warning(message)
+
+
+def check(audit: QueryAudit, budget: Budget, label: str, mode: str) -> List[str]:
+    """Сверяет аудит с бюджетом; в режиме raise бросает QueryBudgetExceeded."""
+    problems = violations(audit, budget)
+    report(problems, label, mode)
+    return problems
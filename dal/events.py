@@ -0,0 +1,85 @@
+from contextlib import nullcontext
+from typing import Literal, Optional, Protocol
+
+from .serializers import car_to_dict, diff
+
+EventType = Literal["CREATE", "UPDATE", "DELETE"]
+
+
+class EventPublisher(Protocol):
+    def publish_event(self, event_type: EventType, car, changes: Optional[dict] = None) -> None: ...
+
+
+class CarRepositoryWithEvents:
+    """Репозиторий с публикацией событий.
+
+    listeners — локальные подписчики (например, материализованная статистика),
+    вызываются синхронно через on_car_event(event_type, car, previous). Если
+    репозиторий умеет atomic(), запись и подписчики выполняются в одной его
+    транзакции: ошибка подписчика откатывает запись и пробрасывается вызывающему.
+    Событие публикуется после фиксации. UPDATE публикуется только при реальных
+    изменениях и несёт их diff.
+    """
+
+    def __init__(self, repository, publisher: EventPublisher, listeners=()):
+        self._repository = repository
+        self._publisher = publisher
+        self._listeners = list(listeners)
+
+    def _transaction(self):
+        atomic = getattr(self._repository, "atomic", None)
+        return atomic() if atomic is not None else nullcontext()
+
+    def _apply(self, event_type: EventType, car, previous=None) -> None:
+        for listener in self._listeners:
+            listener.on_car_event(event_type, car, previous)
+
+    def list_cars(self):
+        return self._repository.list_cars()
+
+    def list_car_rows(self, **page):
+        # page — after_id/limit для репозиториев с keyset-пагинацией
+        return self._repository.list_car_rows(**page)
+
+    def get_car(self, car_id: int):
+        return self._repository.get_car(car_id)
+
+    def create_car(self, data):
+        with self._transaction():
+            car = self._repository.create_car(data)
+            self._apply("CREATE", car)
+        self._publisher.publish_event("CREATE", car)
+        return car
+
+    def update_car(self, car_id: int, data):
+        return self._update(car_id, lambda: self._repository.update_car(car_id, data))
+
+    def patch_car(self, car_id: int, fields: dict):
+        return self._update(car_id, lambda: self._repository.patch_car(car_id, fields))
+
+    def _update(self, car_id: int, write):
+        changes = None
+        with self._transaction():
+            # старое состояние нужно для diff и подписчикам, чтобы вычесть его из агрегатов
+            previous = self._repository.get_car(car_id)
+            if previous is None:
+                return None
+            before = car_to_dict(previous)
+            car = write()
+            if car is not None:
+                changes = diff(before, car_to_dict(car))
+                if changes:
+                    self._apply("UPDATE", car, previous)
+        if changes:
+            self._publisher.publish_event("UPDATE", car, changes)
+        return car
+
+    def delete_car(self, car_id: int) -> bool:
+        with self._transaction():
+            car = self._repository.get_car(car_id)
+            ok = self._repository.delete_car(car_id)
+            if ok and car is not None:
+                self._apply("DELETE", car)
+        if ok and car is not None:
+            self._publisher.publish_event("DELETE", car)
+        return ok
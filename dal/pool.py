@@ -0,0 +1,114 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import psycopg2
+from psycopg2.extensions import connection as _PgConnection, cursor as _PgCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from . import audit
+
+
+class PreparingConnection(_PgConnection):
+    """Соединение, которое помнит, какие prepared statements уже созданы в его сессии."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set = set()
+
+
+class AuditingCursor(_PgCursor):
+    """Курсор, запросы которого учитываются активным аудитом (dal.audit)."""
+
+    def execute(self, query, vars=None):
+        if audit.active() is None:
+            return super().execute(query, vars)
+        with audit.timed(self._sql(query)):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        if audit.active() is None:
+            return super().executemany(query, vars_list)
+        with audit.timed(self._sql(query)):
+            return super().executemany(query, vars_list)
+
+    def _sql(self, query) -> str:
+        if isinstance(query, bytes):
+            return query.decode()
+        if isinstance(query, str):
+            return query
+        return query.as_string(self)  # psycopg2.sql.Composable
+
+
+class PgPool:
+    """Пул соединений PostgreSQL с поддержкой prepared statements."""
+
+    def __init__(self, minconn: Optional[int] = None, maxconn: Optional[int] = None, **dsn) -> None:
+        self._dsn = dsn or dict(
+            dbname=os.getenv("PG_DB", "cars_db"),
+            user=os.getenv("PG_USER", "postgres"),
+            password=os.getenv("PG_PASSWORD", "rms100605"),
+            host=os.getenv("PG_HOST", "localhost"),
+            port=os.getenv("PG_PORT", "5432"),
+        )
+        self._minconn = minconn if minconn is not None else int(os.getenv("PG_POOL_MIN", "1"))
+        self._maxconn = maxconn if maxconn is not None else int(os.getenv("PG_POOL_MAX", "10"))
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        # ленивое создание: импорт модуля не должен требовать доступной БД
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(
+                        self._minconn,
+                        self._maxconn,
+                        connection_factory=PreparingConnection,
+                        cursor_factory=AuditingCursor,
+                        **self._dsn,
+                    )
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула на время блока; commit при успехе, rollback при ошибке."""
+        pool = self._get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except psycopg2.InterfaceError:
+            broken = True
+            raise
+        except BaseException:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken or conn.closed != 0)
+
+    def closeall(self) -> None:
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+
+
+def execute_prepared(cur, name: str, sql: str, params=()) -> None:
+    """Выполняет именованный prepared statement, создавая его при первом использовании.
+
+    sql записывается с параметрами $1, $2, ...; план строится один раз на соединение.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
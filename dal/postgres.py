@@ -0,0 +1,142 @@
+"""Репозитории PostgreSQL поверх пула и prepared statements.
+
+Интерфейс совпадает с api.repository.CarRepository, поэтому их можно
+оборачивать тем же CarRepositoryWithEvents.
+"""
+from typing import List, Optional
+
+from .pool import PgPool, execute_prepared
+from .records import CAR_FIELDS, CarData, CarRecord, DealerData
+
+_CAR_SELECT = "SELECT id, firm, model, year, power, color, price, dealer_id FROM cars"
+_DEALER_SELECT = "SELECT id, name, city, address, area, rating FROM dealers"
+
+
+class DealerNotFound(Exception):
+    pass
+
+
+class PgCarRepository:
+    def __init__(self, pool: PgPool) -> None:
+        self._pool = pool
+
+    def list_car_rows(self) -> list:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "cars_list", f"{_CAR_SELECT} ORDER BY id")
+            return cur.fetchall()
+
+    def list_cars(self) -> List[CarRecord]:
+        return [CarRecord.from_row(r) for r in self.list_car_rows()]
+
+    def get_car(self, car_id: int) -> Optional[CarRecord]:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "cars_get", f"{_CAR_SELECT} WHERE id=$1", (car_id,))
+            row = cur.fetchone()
+        return CarRecord.from_row(row) if row else None
+
+    def create_car(self, data: CarData) -> CarRecord:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            if not _dealer_exists(cur, data.dealer_id):
+                raise DealerNotFound(data.dealer_id)
+            execute_prepared(
+                cur,
+                "cars_insert",
+                "INSERT INTO cars (firm, model, year, power, color, price, dealer_id)"
+                " VALUES ($1, $2, $3, $4, $5, $6, $7)"
+                " RETURNING id, firm, model, year, power, color, price, dealer_id",
+                _car_params(data),
+            )
+            return CarRecord.from_row(cur.fetchone())
+
+    def update_car(self, car_id: int, data: CarData) -> Optional[CarRecord]:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            if not _dealer_exists(cur, data.dealer_id):
+                raise DealerNotFound(data.dealer_id)
+            execute_prepared(
+                cur,
+                "cars_update",
+                "UPDATE cars SET firm=$1, model=$2, year=$3, power=$4, color=$5, price=$6, dealer_id=$7"
+                " WHERE id=$8"
+                " RETURNING id, firm, model, year, power, color, price, dealer_id",
+                (*_car_params(data), car_id),
+            )
+            row = cur.fetchone()
+        return CarRecord.from_row(row) if row else None
+
+    def patch_car(self, car_id: int, fields: dict) -> Optional[CarRecord]:
+        """Обновляет только переданные колонки; для каждого набора колонок свой prepared statement."""
+        names = [f for f in CAR_FIELDS if f in fields]
+        if not names:
+            return self.get_car(car_id)
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            if "dealer_id" in fields and not _dealer_exists(cur, fields["dealer_id"]):
+                raise DealerNotFound(fields["dealer_id"])
+            assignments = ", ".join(f"{name}=${i}" for i, name in enumerate(names, start=1))
+            execute_prepared(
+                cur,
+                "cars_patch_" + "_".join(names),
+                f"UPDATE cars SET {assignments} WHERE id=${len(names) + 1}"
+                " RETURNING id, firm, model, year, power, color, price, dealer_id",
+                (*(fields[name] for name in names), car_id),
+            )
+            row = cur.fetchone()
+        return CarRecord.from_row(row) if row else None
+
+    def delete_car(self, car_id: int) -> bool:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "cars_delete", "DELETE FROM cars WHERE id=$1", (car_id,))
+            return cur.rowcount > 0
+
+
+class PgDealerRepository:
+    def __init__(self, pool: PgPool) -> None:
+        self._pool = pool
+
+    def list_dealer_rows(self) -> list:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "dealers_list", f"{_DEALER_SELECT} ORDER BY id")
+            return cur.fetchall()
+
+    def get_dealer_row(self, dealer_id: int):
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "dealers_get", f"{_DEALER_SELECT} WHERE id=$1", (dealer_id,))
+            return cur.fetchone()
+
+    def create_dealer(self, data: DealerData) -> int:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(
+                cur,
+                "dealers_insert",
+                "INSERT INTO dealers (name, city, address, area, rating)"
+                " VALUES ($1, $2, $3, $4, $5) RETURNING id",
+                _dealer_params(data),
+            )
+            return cur.fetchone()[0]
+
+    def update_dealer(self, dealer_id: int, data: DealerData) -> bool:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(
+                cur,
+                "dealers_update",
+                "UPDATE dealers SET name=$1, city=$2, address=$3, area=$4, rating=$5 WHERE id=$6",
+                (*_dealer_params(data), dealer_id),
+            )
+            return cur.rowcount > 0
+
+    def delete_dealer(self, dealer_id: int) -> bool:
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            execute_prepared(cur, "dealers_delete", "DELETE FROM dealers WHERE id=$1", (dealer_id,))
+            return cur.rowcount > 0
+
+
+def _dealer_exists(cur, dealer_id: int) -> bool:
+    execute_prepared(cur, "dealers_exists", "SELECT 1 FROM dealers WHERE id=$1", (dealer_id,))
+    return cur.fetchone() is not None
+
+
+def _car_params(data: CarData) -> tuple:
+    return (data.firm, data.model, data.year, data.power, data.color, data.price, data.dealer_id)
+
+
+def _dealer_params(data: DealerData) -> tuple:
+    return (data.name, data.city, data.address, data.area, data.rating)
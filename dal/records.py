@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+# Порядок колонок в строках, которые возвращают репозитории (list/get "rows")
+CAR_COLUMNS = ("id", "firm", "model", "year", "power", "color", "price", "dealer_id")
+DEALER_COLUMNS = ("id", "name", "city", "address", "area", "rating")
+
+CAR_FIELDS = CAR_COLUMNS[1:]
+DEALER_FIELDS = DEALER_COLUMNS[1:]
+
+
+@dataclass
+class CarData:
+    firm: str
+    model: str
+    year: int
+    power: int
+    color: str
+    price: float
+    dealer_id: int
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CarData":
+        return cls(
+            firm=data["firm"],
+            model=data["model"],
+            year=data["year"],
+            power=data["power"],
+            color=data["color"],
+            price=data["price"],
+            dealer_id=data["dealer_id"],
+        )
+
+
+@dataclass
+class DealerData:
+    name: str
+    city: str
+    address: str
+    area: str
+    rating: float
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DealerData":
+        return cls(
+            name=data["name"],
+            city=data["city"],
+            address=data["address"],
+            area=data["area"],
+            rating=data["rating"],
+        )
+
+
+@dataclass
+class CarRecord:
+    """Автомобиль вне ORM; по атрибутам совместим с api.models.Car."""
+
+    id: int
+    firm: str
+    model: str
+    year: int
+    power: int
+    color: str
+    price: Optional[Decimal]
+    dealer_id: int
+
+    @classmethod
+    def from_row(cls, row) -> "CarRecord":
+        return cls(*row)
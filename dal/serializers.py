@@ -0,0 +1,79 @@
+"""Единая сериализация автомобилей и дилеров для обоих API.
+
+*_row_to_dict работают со строками в порядке CAR_COLUMNS/DEALER_COLUMNS и
+не требуют создания ORM-объектов — это самый быстрый путь для списков.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен
+    orjson = None
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def car_row_to_dict(r) -> dict:
+    return {
+        "id": r[0],
+        "firm": r[1],
+        "model": r[2],
+        "year": r[3],
+        "power": r[4],
+        "color": r[5],
+        "price": _number(r[6]),
+        "dealer_id": r[7],
+    }
+
+
+def dealer_row_to_dict(r) -> dict:
+    return {
+        "id": r[0],
+        "name": r[1],
+        "city": r[2],
+        "address": r[3],
+        "area": r[4],
+        "rating": _number(r[5]),
+    }
+
+
+def car_to_dict(car) -> dict:
+    return {
+        "id": car.id,
+        "firm": car.firm,
+        "model": car.model,
+        "year": car.year,
+        "power": car.power,
+        "color": car.color,
+        "price": _number(car.price),
+        "dealer_id": car.dealer_id,
+    }
+
+
+def dealer_to_dict(dealer) -> dict:
+    return {
+        "id": dealer.id,
+        "name": dealer.name,
+        "city": dealer.city,
+        "address": dealer.address,
+        "area": dealer.area,
+        "rating": _number(dealer.rating),
+    }
+
+
+def diff(before: dict, after: dict) -> dict:
+    """Изменившиеся поля: {поле: {"old": ..., "new": ...}}."""
+    return {
+        key: {"old": before.get(key), "new": value}
+        for key, value in after.items()
+        if before.get(key) != value
+    }
+
+
+def dumps(data) -> bytes:
+    """JSON в UTF-8; orjson, если установлен."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,116 @@
+"""Admission control (api.admission): token bucket, лимит параллельных запросов и сброс записи."""
+import json
+from types import SimpleNamespace
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from api import admission
+from api.admission import AdmissionControlMiddleware, ClientRateLimiter, LatencyTracker, TokenBucket
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_allows_burst_then_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert bucket.take() == 0.0
+    clock.now += 60
+    # накопление ограничено burst
+    assert [bucket.take() for _ in range(4)][-1] > 0
+
+
+def test_rate_limiter_keeps_buckets_per_client_and_evicts_oldest(clock):
+    limiter = ClientRateLimiter(rate=1, burst=1, max_clients=2)
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") > 0
+    assert limiter.acquire("b") == 0.0
+    limiter.acquire("c")
+    # "a" вытеснен и начинает с полного ведра
+    assert limiter.acquire("a") == 0.0
+
+
+def test_latency_tracker_averages_and_expires(clock):
+    tracker = LatencyTracker(alpha=0.5, ttl=5)
+    tracker.observe(1.0)
+    tracker.observe(0.0)
+    assert tracker.value() == pytest.approx(0.5)
+    clock.now += 6
+    assert tracker.value() == 0.0
+
+
+def ok(request):
+    return HttpResponse("ok")
+
+
+def reason_of(response) -> str:
+    return json.loads(response.content)["reason"]
+
+
+def middleware(get_response=ok, blocked=False, backlog=0, **settings):
+    with override_settings(**settings):
+        instance = AdmissionControlMiddleware(get_response)
+    instance.publisher = SimpleNamespace(blocked=blocked, backlog=lambda: backlog)
+    return instance
+
+
+def test_client_over_rate_gets_429_with_retry_after():
+    handle = middleware(ADMISSION_WRITE_RATE=0.5, ADMISSION_WRITE_BURST=1)
+    request = RequestFactory().post("/cars", REMOTE_ADDR="10.1.1.1")
+
+    assert handle(request).status_code == 200
+    rejected = handle(request)
+    assert rejected.status_code == 429
+    assert rejected["Retry-After"] == "2"
+    # чтение не ограничивается
+    assert handle(RequestFactory().get("/cars", REMOTE_ADDR="10.1.1.1")).status_code == 200
+
+
+@pytest.mark.parametrize("pressure, reason", [({"blocked": True}, "broker_blocked"), ({"backlog": 10**6}, "event_backlog")])
+def test_writes_are_shed_under_broker_pressure(pressure, reason):
+    handle = middleware(**pressure)
+
+    rejected = handle(RequestFactory().delete("/cars/1"))
+    assert rejected.status_code == 503
+    assert reason_of(rejected) == reason
+    assert rejected["Retry-After"] == "5"
+    assert handle(RequestFactory().get("/cars")).status_code == 200
+
+
+def test_writes_are_shed_while_db_is_slow():
+    handle = middleware()
+    handle.db_latency.observe(2.0)
+    rejected = handle(RequestFactory().post("/cars"))
+    assert rejected.status_code == 503
+    assert reason_of(rejected) == "db_latency"
+
+
+def test_requests_over_concurrency_limit_get_503_immediately():
+    inner = {}
+
+    def reentrant(request):
+        # второй запрос приходит, пока первый держит единственный слот
+        inner["response"] = handle(RequestFactory().get("/cars"))
+        return HttpResponse("ok")
+
+    handle = middleware(reentrant, ADMISSION_MAX_CONCURRENT={"read": 1, "write": 1})
+    assert handle(RequestFactory().get("/cars")).status_code == 200
+    assert inner["response"].status_code == 503
+    assert reason_of(inner["response"]) == "concurrency"
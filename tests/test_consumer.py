@@ -0,0 +1,83 @@
+"""Потребитель событий (api.consumer): переподключение и взвешенный выбор полос."""
+from collections import deque
+
+import pytest
+from pika.exceptions import AMQPConnectionError, ConnectionClosed
+
+from api import consumer as consumer_module
+from api.consumer import CarEventConsumer
+from api.lanes import BULK, INTERACTIVE
+
+
+class FakeConnection:
+    def __init__(self, fail_on_close: bool = False) -> None:
+        self.is_open = True
+        self.fail_on_close = fail_on_close
+        self.closed = 0
+
+    def close(self) -> None:
+        self.closed += 1
+        if self.fail_on_close:
+            raise ConnectionClosed(320, "CONNECTION_FORCED")
+        self.is_open = False
+
+
+@pytest.fixture
+def broker_down(monkeypatch):
+    def connect(parameters):
+        raise AMQPConnectionError("refused")
+
+    monkeypatch.setattr(consumer_module.pika, "BlockingConnection", connect)
+
+
+@pytest.mark.parametrize("fail_on_close", [False, True])
+def test_reconnect_closes_previous_connection_quietly(broker_down, fail_on_close):
+    consumer = CarEventConsumer(lambda payload: None)
+    old = consumer.connection = FakeConnection(fail_on_close)
+
+    # ошибка закрытия старого соединения не маскирует ошибку подключения
+    with pytest.raises(AMQPConnectionError):
+        consumer._consume()
+
+    assert old.closed == 1
+    assert consumer.connection is None and consumer.channel is None
+
+
+def test_stop_closes_connection_once():
+    consumer = CarEventConsumer(lambda payload: None)
+    connection = consumer.connection = FakeConnection()
+    consumer.stop()
+    consumer.stop()
+    assert connection.closed == 1
+
+
+def fill(consumer, interactive: int, bulk: int) -> None:
+    consumer._pending = {
+        INTERACTIVE: deque((INTERACTIVE, n) for n in range(interactive)),
+        BULK: deque((BULK, n) for n in range(bulk)),
+    }
+    consumer._credits = {}
+
+
+def drain(consumer) -> list:
+    lanes = []
+    while (delivery := consumer._next_delivery()) is not None:
+        lanes.append(delivery[0])
+    return lanes
+
+
+def test_lanes_are_weighted_while_both_have_messages():
+    consumer = CarEventConsumer(lambda payload: None, lane_weights={INTERACTIVE: 2, BULK: 1})
+    fill(consumer, interactive=5, bulk=5)
+    lanes = drain(consumer)
+
+    assert lanes[:6] == [INTERACTIVE, INTERACTIVE, BULK] * 2
+    # interactive кончился — bulk забирает всю пропускную способность
+    assert lanes[6:] == [INTERACTIVE] + [BULK] * 3
+
+
+def test_lane_with_zero_weight_is_not_read():
+    consumer = CarEventConsumer(lambda payload: None, lane_weights={INTERACTIVE: 1, BULK: 0})
+    assert list(consumer.lane_weights) == [INTERACTIVE]
+    with pytest.raises(ValueError):
+        CarEventConsumer(lambda payload: None, lane_weights={INTERACTIVE: 0})
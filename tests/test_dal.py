@@ -0,0 +1,39 @@
+"""Общий слой dal: одинаковые записи и проверки в Django API и Flask-приложении."""
+from decimal import Decimal
+
+import pytest
+from django.test import Client
+
+from api.models import Car
+from dal import CAR_COLUMNS, CAR_FIELDS, DEALER_FIELDS, CarData, CarRecord, car_row_to_dict, car_to_dict
+
+ROW = (7, "Toyota", "Camry", 2020, 181, "white", Decimal("30000.00"), 3)
+
+
+def test_orm_car_and_record_serialize_identically():
+    orm_car = Car(**dict(zip(CAR_COLUMNS, ROW)))
+    record = CarRecord.from_row(ROW)
+
+    assert car_to_dict(orm_car) == car_to_dict(record) == car_row_to_dict(ROW)
+    assert car_row_to_dict(ROW)["price"] == 30000.0
+
+
+def test_car_data_takes_exactly_the_required_fields():
+    data = dict(zip(CAR_FIELDS, ROW[1:]), extra="ignored")
+    assert list(vars(CarData.from_dict(data))) == list(CAR_FIELDS)
+
+
+@pytest.fixture
+def flask_client():
+    import app as flask_module
+
+    return flask_module.app.test_client()
+
+
+@pytest.mark.parametrize("path, fields", [("/cars", CAR_FIELDS), ("/dealers", DEALER_FIELDS)])
+def test_both_services_reject_missing_fields(flask_client, path, fields):
+    # до обращения к БД: Flask-приложению PostgreSQL здесь не нужен
+    incomplete = {name: 1 for name in fields[:-1]}
+
+    assert Client().post(path, incomplete, content_type="application/json").status_code == 400
+    assert flask_client.post(path, json=incomplete).status_code == 400
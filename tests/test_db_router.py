@@ -0,0 +1,71 @@
+"""Чтение с реплик и закрепление за основной БД после записи (api.db_router)."""
+import time
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+from api.db_router import STICKY_COOKIE, PrimaryReplicaRouter, ReadYourWritesMiddleware, is_pinned
+from api.models import Car
+
+router = PrimaryReplicaRouter()
+
+
+@pytest.fixture(autouse=True)
+def one_replica():
+    with override_settings(DATABASE_READ_ALIASES=["replica1"], DATABASE_STICKY_SECONDS=5):
+        yield
+
+
+def handle(request, view):
+    """Запрос через ReadYourWritesMiddleware; view(request) выполняется внутри."""
+    seen = {}
+
+    def get_response(request):
+        seen["db"] = view(request)
+        return HttpResponse()
+
+    response = ReadYourWritesMiddleware(get_response)(request)
+    return response, seen["db"]
+
+
+def read(request):
+    return router.db_for_read(Car)
+
+
+def write_then_read(request):
+    router.db_for_write(Car)
+    return router.db_for_read(Car)
+
+
+def test_writes_outside_a_request_do_not_pin_reads():
+    # команды, потребитель и фоновые потоки пишут вне запроса
+    router.db_for_write(Car)
+    assert not is_pinned()
+    assert router.db_for_read(Car) == "replica1"
+
+
+def test_reads_go_to_replica_until_the_request_writes():
+    response, db = handle(RequestFactory().get("/cars"), read)
+    assert db == "replica1"
+    assert STICKY_COOKIE not in response.cookies
+
+    _, db = handle(RequestFactory().get("/cars"), write_then_read)
+    assert db == "default"
+    # закрепление не переживает запрос
+    assert not is_pinned()
+
+
+def test_write_request_sets_sticky_cookie_for_following_reads():
+    response, db = handle(RequestFactory().post("/cars"), read)
+    assert db == "default"
+    until = int(response.cookies[STICKY_COOKIE].value)
+    assert time.time() < until <= time.time() + 5
+
+    follow_up = RequestFactory().get("/cars")
+    follow_up.COOKIES[STICKY_COOKIE] = str(until)
+    assert handle(follow_up, read)[1] == "default"
+
+    expired = RequestFactory().get("/cars")
+    expired.COOKIES[STICKY_COOKIE] = str(int(time.time()) - 1)
+    assert handle(expired, read)[1] == "replica1"
@@ -0,0 +1,68 @@
+"""Материализованная статистика дилеров (api.stats): инкрементальное обновление в транзакции записи."""
+import json
+
+import pytest
+from django.test import Client
+
+from api import views
+from api.sharding import car_managers
+from api.stats import DealerStatsAggregator, dealer_stats, rebuild_dealer_stats
+
+DEALER = {"name": "Автоцентр", "city": "Минск", "address": "ул. Тестовая, 1", "area": "Центр", "rating": 4.5}
+
+
+def car_data(dealer_id: int, **fields) -> dict:
+    data = {"firm": "Toyota", "model": "Camry", "year": 2020, "power": 181, "color": "white", "price": 30000, "dealer_id": dealer_id}
+    data.update(fields)
+    return data
+
+
+@pytest.fixture
+def client():
+    return Client()
+
+
+def send(client, method: str, path: str, data=None):
+    if data is None:
+        return getattr(client, method)(path)
+    return getattr(client, method)(path, data=json.dumps(data), content_type="application/json")
+
+
+def car_count(dealer_id: int) -> int:
+    return sum(manager.filter(dealer_id=dealer_id).count() for manager in car_managers())
+
+
+def test_incremental_stats_match_full_rebuild(client):
+    dealer_id = send(client, "post", "/dealers", DEALER).json()["id"]
+    ids = [
+        send(client, "post", "/cars", car_data(dealer_id, firm=firm, price=price, power=power)).json()["id"]
+        for firm, price, power in [("Toyota", 30000, 181), ("Toyota", 25000, 120), ("BMW", 50000, 250), ("BMW", 45000, 190)]
+    ]
+    # удаление граничного значения пересчитывает min/max группы
+    send(client, "delete", f"/cars/{ids[0]}")
+    send(client, "patch", f"/cars/{ids[2]}", {"firm": "Toyota", "power": 260})
+    send(client, "put", f"/cars/{ids[3]}", car_data(dealer_id, firm="BMW", price=47000, power=200))
+
+    incremental = dealer_stats(dealer_id)
+    assert incremental["car_count"] == 3
+    assert [f["firm"] for f in incremental["by_firm"]] == ["BMW", "Toyota"]
+    rebuild_dealer_stats()
+    assert dealer_stats(dealer_id) == incremental
+
+
+def test_stats_failure_rolls_back_car_write(client, monkeypatch):
+    dealer_id = send(client, "post", "/dealers", DEALER).json()["id"]
+    published = []
+    monkeypatch.setattr(views._rabbitmq_publisher, "publish_event", lambda *args: published.append(args))
+
+    def broken(self, car):
+        raise RuntimeError("stats table unavailable")
+
+    monkeypatch.setattr(DealerStatsAggregator, "_add", broken)
+    with pytest.raises(RuntimeError):
+        send(client, "post", "/cars", car_data(dealer_id))
+
+    assert car_count(dealer_id) == 0
+    assert dealer_stats(dealer_id)["car_count"] == 0
+    # событие о несостоявшейся записи не публикуется
+    assert published == []
@@ -0,0 +1,54 @@
+"""Кэш OpenAPI-схемы (api.docs) и команда generate_openapi_schema."""
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.test import Client, override_settings
+
+from api import docs
+
+
+@pytest.fixture
+def schema_path(tmp_path):
+    path = tmp_path / "openapi.json"
+    docs._cache.clear()
+    with override_settings(OPENAPI_SCHEMA_PATH=path):
+        yield path
+    docs._cache.clear()
+
+
+def test_pregenerated_schema_is_served_without_introspection(schema_path, monkeypatch):
+    call_command("generate_openapi_schema", stdout=StringIO())
+    spec = json.loads(schema_path.read_bytes())
+    assert "/cars" in spec["paths"]
+
+    def fail():
+        raise AssertionError("drf_yasg must not run when the schema file exists")
+
+    monkeypatch.setattr(docs, "generate_schema", fail)
+    response = Client().get("/swagger.json")
+    assert response.status_code == 200
+    assert response.content == schema_path.read_bytes()
+
+
+def test_schema_is_generated_once_per_process(schema_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(docs, "generate_schema", lambda: calls.append(1) or b'{"paths": {}}')
+    client = Client()
+
+    assert client.get("/swagger.json").content == b'{"paths": {}}'
+    assert client.get("/swagger.yaml").content.strip() == b"paths: {}"
+    client.get("/swagger.json")
+    assert calls == [1]
+
+
+def test_unchanged_schema_is_revalidated_by_etag(schema_path, monkeypatch):
+    monkeypatch.setattr(docs, "generate_schema", lambda: b'{"paths": {}}')
+    client = Client()
+    first = client.get("/swagger.json")
+    assert "no-cache" in first["Cache-Control"]
+
+    again = client.get("/swagger.json", HTTP_IF_NONE_MATCH=first["ETag"])
+    assert again.status_code == 304
+    assert again.content == b""
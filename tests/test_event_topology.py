@@ -0,0 +1,211 @@
+"""Топология событий (api.amqp), партиции и маршрутизация неудачных сообщений (api.consumer).
+
+Брокер заменён FakeBroker: он хранит объявленные exchange/очереди и
+записывает вызовы канала, поэтому RabbitMQ для тестов не нужен.
+"""
+import json
+import zlib
+from collections import deque
+from types import SimpleNamespace
+
+import pika
+import pytest
+from pika.exceptions import ChannelClosedByBroker
+
+from api import amqp
+from api.consumer import CarEventConsumer
+from api.lanes import BULK
+from api.management.commands.consume_car_events import assigned_queues
+
+
+class FakeBroker:
+    def __init__(self, exchanges=(), queues=None) -> None:
+        self.exchanges = set(exchanges)
+        self.queues = {name: deque(messages) for name, messages in (queues or {}).items()}
+        self.calls = []
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def declared(self):
+        return {call[1]: call[2] for call in self.calls if call[0] in ("exchange_declare", "queue_declare")}
+
+
+class FakeChannel:
+    def __init__(self, broker: FakeBroker) -> None:
+        self.broker = broker
+        self._tags = 0
+
+    def exchange_declare(self, exchange, exchange_type=None, durable=False, arguments=None, passive=False):
+        if passive:
+            if exchange not in self.broker.exchanges:
+                raise ChannelClosedByBroker(404, "NOT_FOUND")
+            return
+        self.broker.calls.append(("exchange_declare", exchange, arguments))
+        self.broker.exchanges.add(exchange)
+
+    def queue_declare(self, queue, durable=False, arguments=None, passive=False):
+        if passive:
+            if queue not in self.broker.queues:
+                raise ChannelClosedByBroker(404, "NOT_FOUND")
+            return
+        self.broker.calls.append(("queue_declare", queue, arguments))
+        self.broker.queues.setdefault(queue, deque())
+
+    def exchange_bind(self, destination, source, routing_key=""):
+        self.broker.calls.append(("exchange_bind", destination, source))
+
+    def queue_bind(self, queue, exchange, routing_key=None):
+        self.broker.calls.append(("queue_bind", queue, exchange))
+
+    def queue_unbind(self, queue, exchange, routing_key=None):
+        self.broker.calls.append(("queue_unbind", queue, exchange))
+
+    def queue_delete(self, queue, if_empty=False):
+        assert not (if_empty and self.broker.queues[queue])
+        del self.broker.queues[queue]
+        self.broker.calls.append(("queue_delete", queue))
+
+    def basic_get(self, queue):
+        if not self.broker.queues[queue]:
+            return None, None, None
+        self._tags += 1
+        properties, body = self.broker.queues[queue].popleft()
+        return SimpleNamespace(delivery_tag=self._tags), properties, body
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.broker.calls.append(("publish", exchange, routing_key, body, properties))
+
+    def basic_ack(self, delivery_tag):
+        self.broker.calls.append(("ack", delivery_tag))
+
+    def basic_nack(self, delivery_tag, requeue=True):
+        self.broker.calls.append(("nack", delivery_tag, requeue))
+
+    def confirm_delivery(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def event(car_id: int) -> bytes:
+    return json.dumps({"eventType": "UPDATE", "car": {"id": car_id}}).encode()
+
+
+def test_topology_does_not_redeclare_legacy_names():
+    broker = FakeBroker()
+    amqp.declare_topology(broker.channel())
+
+    declared = broker.declared()
+    assert amqp.LEGACY_EXCHANGE not in declared
+    assert amqp.LEGACY_QUEUE not in declared
+    assert declared[amqp.EXCHANGE] == {"alternate-exchange": amqp.DEAD_LETTER_EXCHANGE}
+    assert declared[amqp.QUEUE]["x-dead-letter-exchange"] == amqp.DEAD_LETTER_EXCHANGE
+
+
+def test_migration_bridges_exchange_and_moves_legacy_messages():
+    properties = pika.BasicProperties(delivery_mode=2)
+    broker = FakeBroker(
+        exchanges=[amqp.LEGACY_EXCHANGE],
+        queues={amqp.LEGACY_QUEUE: [(properties, event(1)), (properties, event(2))]},
+    )
+
+    assert amqp.migrate_legacy_topology(broker) == 2
+
+    calls = [call[:3] for call in broker.calls]
+    bridge = calls.index(("exchange_bind", amqp.EXCHANGE, amqp.LEGACY_EXCHANGE))
+    assert bridge < calls.index(("queue_unbind", amqp.LEGACY_QUEUE, amqp.LEGACY_EXCHANGE))
+    published = [call[3] for call in broker.calls if call[0] == "publish" and call[1] == amqp.EXCHANGE]
+    assert published == [event(1), event(2)]
+    assert [call for call in broker.calls if call[0] == "ack"] == [("ack", 1), ("ack", 2)]
+    assert amqp.LEGACY_QUEUE not in broker.queues
+    # повторный запуск: мост уже есть, переносить нечего
+    assert amqp.migrate_legacy_topology(broker) == 0
+
+
+def test_migration_without_legacy_topology_only_declares_current_one():
+    broker = FakeBroker()
+    assert amqp.migrate_legacy_topology(broker) == 0
+    assert not [call for call in broker.calls if call[0] in ("exchange_bind", "queue_unbind", "publish")]
+
+
+@pytest.fixture
+def failing_consumer(monkeypatch):
+    monkeypatch.setenv("RABBITMQ_RETRY_DELAYS_MS", "100,200")
+
+    def handler(payload):
+        raise RuntimeError("handler failed")
+
+    consumer = CarEventConsumer(handler)
+    consumer._queue_by_tag = {"ctag": amqp.QUEUE}
+    return consumer
+
+
+def deliver(consumer, body: bytes, attempt: int = 0):
+    channel = FakeBroker().channel()
+    method = SimpleNamespace(consumer_tag="ctag", delivery_tag=7)
+    properties = pika.BasicProperties(headers={amqp.ATTEMPT_HEADER: attempt}, message_id="m-1")
+    consumer._on_message(channel, method, properties, body)
+    return channel.broker.calls
+
+
+def test_failed_event_goes_to_next_retry_level(failing_consumer):
+    calls = deliver(failing_consumer, event(1), attempt=1)
+
+    (publish, ack) = calls
+    assert publish[:3] == ("publish", amqp.RETRY_EXCHANGE, amqp.retry_queue_name(amqp.QUEUE, 200))
+    assert publish[4].headers[amqp.ATTEMPT_HEADER] == 2
+    assert ack == ("ack", 7)
+    # неудачная попытка не попадает в окно дедупликации
+    assert not failing_consumer.dedupe.seen("m-1")
+
+
+def test_event_is_parked_when_retries_are_exhausted(failing_consumer):
+    assert deliver(failing_consumer, event(1), attempt=2) == [("nack", 7, False)]
+
+
+def test_malformed_event_is_parked_without_retries(failing_consumer):
+    assert deliver(failing_consumer, b"not json") == [("nack", 7, False)]
+
+
+# --- партиции ------------------------------------------------------------------
+
+
+@pytest.fixture
+def partitions(monkeypatch):
+    monkeypatch.setenv("RABBITMQ_PARTITIONS", "4")
+
+
+def test_unpartitioned_mode_uses_one_queue(monkeypatch):
+    monkeypatch.setenv("RABBITMQ_PARTITIONS", "0")
+    assert amqp.routing_key_for(42) == ""
+    assert amqp.work_queues() == [amqp.QUEUE]
+    assert assigned_queues(0, 1) == [amqp.QUEUE]
+
+
+def test_car_always_maps_to_the_same_partition(partitions):
+    keys = {car_id: amqp.routing_key_for(car_id) for car_id in range(200)}
+    assert all(amqp.routing_key_for(car_id) == key for car_id, key in keys.items())
+    # crc32, а не hash(): одинаково во всех процессах
+    assert amqp.partition_for(42, 4) == zlib.crc32(b"42") % 4
+    assert set(keys.values()) == {f"p{p}" for p in range(4)}
+
+
+def test_partitioned_topology_has_single_active_consumer_queues(partitions):
+    broker = FakeBroker()
+    amqp.declare_topology(broker.channel())
+
+    declared = broker.declared()
+    for lane in amqp.LANES:
+        for queue in amqp.work_queues(lane):
+            assert declared[queue]["x-single-active-consumer"] is True
+    assert amqp.partition_queue_name(2, BULK) == f"{amqp.QUEUE}.p2.bulk"
+    binds = [call for call in broker.calls if call[0] == "queue_bind" and call[2] == amqp.PARTITION_EXCHANGE]
+    assert len(binds) == 4
+
+
+def test_workers_split_partitions_without_overlap(partitions):
+    queues = [assigned_queues(i, 3) for i in range(3)]
+    assert queues[0] == [amqp.partition_queue_name(0), amqp.partition_queue_name(3)]
+    assert sorted(q for qs in queues for q in qs) == sorted(amqp.work_queues())
@@ -0,0 +1,111 @@
+"""Idempotency-Key (api.idempotency) и дедупликация доставок по message_id (api.dedupe)."""
+import json
+from types import SimpleNamespace
+
+import pika
+import pytest
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import Client, override_settings
+
+from api import amqp
+from api.consumer import CarEventConsumer
+from api.dedupe import DedupeWindow
+from api.idempotency import check_cache
+from api.sharding import car_managers
+
+DEALER = {"name": "Повторов", "city": "Брест", "address": "ул. Ключевая, 3", "area": "Запад", "rating": 4.1}
+
+
+def post(client, path: str, data: dict, key: str, **extra):
+    return client.post(path, data=json.dumps(data), content_type="application/json", HTTP_IDEMPOTENCY_KEY=key, **extra)
+
+
+def car_data(dealer_id: int, **fields) -> dict:
+    data = {"firm": "Lada", "model": "Vesta", "year": 2021, "power": 106, "color": "red", "price": 15000, "dealer_id": dealer_id}
+    data.update(fields)
+    return data
+
+
+def cars_of(dealer_id: int) -> int:
+    return sum(manager.filter(dealer_id=dealer_id).count() for manager in car_managers())
+
+
+@pytest.fixture
+def dealer_id():
+    return Client().post("/dealers", data=json.dumps(DEALER), content_type="application/json").json()["id"]
+
+
+def test_replay_returns_stored_response_without_second_write(dealer_id):
+    client = Client()
+    first = post(client, "/cars", car_data(dealer_id), "replay-1")
+    again = post(client, "/cars", car_data(dealer_id), "replay-1")
+
+    assert first.status_code == again.status_code == 201
+    assert again.json() == first.json()
+    assert again["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first
+    assert cars_of(dealer_id) == 1
+
+
+def test_key_reused_with_different_body_is_rejected(dealer_id):
+    client = Client()
+    post(client, "/cars", car_data(dealer_id), "conflict-1")
+    response = post(client, "/cars", car_data(dealer_id, price=16000), "conflict-1")
+
+    assert response.status_code == 422
+    assert cars_of(dealer_id) == 1
+
+
+def test_key_is_scoped_to_the_client(dealer_id):
+    first = post(Client(), "/cars", car_data(dealer_id), "shared-key", REMOTE_ADDR="10.0.0.1")
+    other = post(Client(), "/cars", car_data(dealer_id), "shared-key", REMOTE_ADDR="10.0.0.2")
+
+    assert other.status_code == 201
+    assert "Idempotent-Replayed" not in other
+    assert other.json()["id"] != first.json()["id"]
+    assert cars_of(dealer_id) == 2
+
+
+def test_request_in_progress_with_same_key_gets_409(dealer_id, monkeypatch):
+    # блокировку ключа держит другой запрос
+    monkeypatch.setattr(type(caches["idempotency"]), "add", lambda self, *args, **kwargs: False)
+    response = post(Client(), "/cars", car_data(dealer_id), "busy-1")
+
+    assert response.status_code == 409
+    assert cars_of(dealer_id) == 0
+
+
+def test_process_local_cache_is_refused():
+    check_cache()
+    local = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "idempotency-test"}
+    with override_settings(CACHES={"default": local, "idempotency": local}):
+        with pytest.raises(ImproperlyConfigured, match="LocMemCache"):
+            check_cache()
+
+
+def test_dedupe_window_evicts_oldest_ids():
+    window = DedupeWindow(maxsize=2)
+    for message_id in ("a", "b", "c"):
+        window.add(message_id)
+
+    assert not window.seen("a")
+    assert window.seen("b") and window.seen("c")
+    assert not window.seen(None)
+    assert len(window) == 2
+
+
+def test_consumer_acks_duplicate_delivery_without_handling():
+    handled = []
+    consumer = CarEventConsumer(handled.append)
+    consumer._queue_by_tag = {"ctag": amqp.QUEUE}
+    calls = []
+    channel = SimpleNamespace(basic_ack=lambda delivery_tag: calls.append(("ack", delivery_tag)))
+    properties = pika.BasicProperties(headers={}, message_id="m-42")
+    body = json.dumps({"eventType": "CREATE", "car": {"id": 1}}).encode()
+
+    for tag in (1, 2):
+        consumer._on_message(channel, SimpleNamespace(consumer_tag="ctag", delivery_tag=tag), properties, body)
+
+    assert len(handled) == 1
+    assert calls == [("ack", 1), ("ack", 2)]
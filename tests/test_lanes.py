@@ -0,0 +1,52 @@
+"""Полосы событий (api.lanes): выбор полосы из контекста и заголовка X-Event-Lane."""
+import json
+
+import pytest
+from django.test import Client
+
+from api import amqp, views
+from api.lanes import BULK, INTERACTIVE, current_lane, lane, parse_lane
+
+
+def test_parse_lane_falls_back_to_interactive():
+    assert parse_lane(" Bulk ") == BULK
+    assert parse_lane("interactive") == INTERACTIVE
+    assert parse_lane("urgent") == INTERACTIVE
+    assert parse_lane(None) == INTERACTIVE
+
+
+def test_lane_context_is_scoped_to_the_block():
+    assert current_lane() == INTERACTIVE
+    with lane(BULK):
+        assert current_lane() == BULK
+        with lane(INTERACTIVE):
+            assert current_lane() == INTERACTIVE
+        assert current_lane() == BULK
+    assert current_lane() == INTERACTIVE
+
+    with pytest.raises(ValueError):
+        with lane("urgent"):
+            pass
+
+
+def test_lane_names():
+    assert amqp.exchange_for(INTERACTIVE) == amqp.EXCHANGE
+    assert amqp.exchange_for(BULK) == f"{amqp.EXCHANGE}.bulk"
+    assert amqp.lane_name(amqp.QUEUE, BULK) == f"{amqp.QUEUE}.bulk"
+
+
+def test_request_header_selects_the_lane(monkeypatch):
+    lanes = []
+    monkeypatch.setattr(
+        views._rabbitmq_publisher, "publish_event",
+        lambda event_type, car, changes=None: lanes.append(current_lane()),
+    )
+    client = Client()
+    dealer = {"name": "Полосатый", "city": "Орша", "address": "ул. Разделительная, 2", "area": "Восток", "rating": 4.0}
+    dealer_id = client.post("/dealers", data=json.dumps(dealer), content_type="application/json").json()["id"]
+    car = {"firm": "Moskvich", "model": "412", "year": 1980, "power": 75, "color": "red", "price": 1500, "dealer_id": dealer_id}
+
+    client.post("/cars", data=json.dumps(car), content_type="application/json", HTTP_X_EVENT_LANE="bulk")
+    client.post("/cars", data=json.dumps(car), content_type="application/json")
+
+    assert lanes == [BULK, INTERACTIVE]
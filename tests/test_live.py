@@ -0,0 +1,60 @@
+"""SSE-трансляция событий (api.live): подписка, переполнение и переподключение relay."""
+from types import SimpleNamespace
+
+from api import live
+from api.live import RESET, EventRelay, Subscription, sse_stream
+
+
+def idle_relay() -> EventRelay:
+    """Relay без фонового потока: subscribe считает, что поток уже работает."""
+    relay = EventRelay(subscriber_queue_size=2)
+    relay._thread = SimpleNamespace(is_alive=lambda: True)
+    return relay
+
+
+def test_stream_subscribes_only_when_iterated_and_unsubscribes_on_close():
+    relay = idle_relay()
+    stream = sse_stream(relay, heartbeat=0.01)
+    # ответ создан, но не отдаётся — подписки нет
+    assert not relay._subscribers
+
+    assert next(stream) == "retry: 3000\n\n"
+    assert len(relay._subscribers) == 1
+    relay._broadcast({"messageId": "m-1", "eventType": "CREATE", "car": {"id": 1}})
+    assert next(stream).startswith("id: m-1\nevent: car\n")
+    assert next(stream) == ": ping\n\n"
+
+    stream.close()
+    assert not relay._subscribers
+
+
+def test_overflowed_subscription_gets_reset_instead_of_events():
+    subscription = Subscription(maxsize=2)
+    for n in range(5):
+        subscription.push({"n": n})
+
+    assert subscription.get(timeout=0) == {"n": 1}
+    assert subscription.get(timeout=0) is RESET
+    assert subscription.queue.empty()
+    # после сброса подписчик снова получает события
+    subscription.push({"n": 6})
+    assert subscription.get(timeout=0) == {"n": 6}
+
+
+def test_relay_reconnects_after_unexpected_error(monkeypatch):
+    relay = EventRelay()
+    subscription = Subscription(maxsize=10)
+    relay._subscribers.add(subscription)
+    attempts = []
+
+    def consume():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("not an AMQP error")
+
+    monkeypatch.setattr(relay, "_consume", consume)
+    monkeypatch.setattr(live.time, "sleep", lambda delay: None)
+    relay._run()
+
+    assert len(attempts) == 2
+    assert subscription.get(timeout=0) is RESET
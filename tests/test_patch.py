@@ -0,0 +1,71 @@
+"""PATCH /cars/<id> и delta-события: в событие попадают только изменившиеся поля."""
+import json
+
+import pytest
+from django.test import Client
+
+from api import views
+from api.repository import car_to_dict
+
+DEALER = {"name": "Дельта", "city": "Гомель", "address": "ул. Разностная, 4", "area": "Юг", "rating": 3.9}
+
+
+def send(client, method: str, path: str, data):
+    return getattr(client, method)(path, data=json.dumps(data), content_type="application/json")
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+    monkeypatch.setattr(
+        views._rabbitmq_publisher, "publish_event",
+        lambda event_type, car, changes=None: events.append((event_type, car_to_dict(car), changes)),
+    )
+    return events
+
+
+@pytest.fixture
+def car_id():
+    client = Client()
+    dealer_id = send(client, "post", "/dealers", DEALER).json()["id"]
+    car = {"firm": "Skoda", "model": "Octavia", "year": 2019, "power": 150, "color": "grey", "price": 21000, "dealer_id": dealer_id}
+    return send(client, "post", "/cars", car).json()["id"]
+
+
+def test_patch_publishes_only_changed_fields(car_id, published):
+    response = send(Client(), "patch", f"/cars/{car_id}", {"color": "blue", "price": "21000", "year": 2019})
+
+    assert response.status_code == 200
+    # цена и год приведены к типам полей и не изменились
+    ((event_type, car, changes),) = published
+    assert event_type == "UPDATE"
+    assert changes == {"color": {"old": "grey", "new": "blue"}}
+    assert car["color"] == "blue"
+    assert Client().get(f"/cars/{car_id}").json()["color"] == "blue"
+
+
+def test_patch_without_changes_publishes_nothing(car_id, published):
+    assert send(Client(), "patch", f"/cars/{car_id}", {"model": "Octavia"}).status_code == 200
+    assert published == []
+
+
+def test_put_carries_diff_of_the_full_record(car_id, published):
+    car = Client().get(f"/cars/{car_id}").json()
+    send(Client(), "put", f"/cars/{car_id}", dict(car, power=190))
+
+    ((_, _, changes),) = published
+    assert changes == {"power": {"old": 150, "new": 190}}
+
+
+@pytest.mark.parametrize("body", [{}, {"colour": "red"}, {"id": 5}])
+def test_patch_rejects_empty_and_unknown_fields(car_id, body, published):
+    response = send(Client(), "patch", f"/cars/{car_id}", body)
+    assert response.status_code == 400
+    assert published == []
+
+
+def test_patch_validates_values(car_id, published):
+    assert send(Client(), "patch", f"/cars/{car_id}", {"year": "not a year"}).status_code == 400
+    assert send(Client(), "patch", f"/cars/{car_id}", {"dealer_id": 10**9}).status_code == 400
+    assert send(Client(), "patch", "/cars/999999999", {"color": "red"}).status_code == 404
+    assert published == []
@@ -0,0 +1,59 @@
+"""Выборочное профилирование запросов (api.profiling) и /admin/profiles."""
+from django.conf import settings
+from django.test import Client
+
+from api.profiling import RESPONSE_HEADER, Profile, ProfileStore, span, store
+
+AUTH = {"HTTP_X_PROFILE": settings.PROFILING_TOKEN}
+
+
+def test_request_with_token_is_profiled_with_db_spans():
+    client = Client()
+    response = client.get("/dealers", **AUTH)
+    profile_id = response[RESPONSE_HEADER]
+
+    detail = client.get(f"/admin/profiles/{profile_id}", **AUTH).json()
+    assert detail["method"] == "GET" and detail["path"] == "/dealers"
+    assert detail["status"] == 200
+    assert any(kind.startswith("db ") for kind in detail["spans"])
+    assert any(row["detail"].startswith("SELECT") for row in detail["slowest"])
+    assert profile_id in [p["id"] for p in client.get("/admin/profiles", **AUTH).json()]
+
+
+def test_wrong_or_missing_token_is_not_profiled():
+    client = Client()
+    assert RESPONSE_HEADER not in client.get("/dealers", HTTP_X_PROFILE="guess")
+    assert RESPONSE_HEADER not in client.get("/dealers")
+    assert client.get("/admin/profiles", HTTP_X_PROFILE="guess").status_code == 403
+    assert client.get("/admin/profiles").status_code == 403
+
+
+def test_collapsed_stacks_include_the_active_span():
+    profile = Profile("GET", "/cars")
+    profile.add_sample("main;view;[db default] SELECT 1")
+    profile.add_sample("main;view;[db default] SELECT 1")
+    profile.add_sample("main;view")
+    store.add(profile)
+
+    response = Client().get(f"/admin/profiles/{profile.id}", {"format": "collapsed"}, **AUTH)
+    assert response.content.decode() == "main;view;[db default] SELECT 1 2\nmain;view 1\n"
+
+
+def test_span_outside_a_profile_records_nothing():
+    with span("amqp", "publish"):
+        pass
+    profile = Profile("POST", "/cars")
+    profile.record_span("amqp", "publish", 2.5)
+    assert profile.summary()["spans"] == {"amqp": {"count": 1, "total_ms": 2.5}}
+
+
+def test_store_keeps_latest_profiles():
+    profiles = ProfileStore(maxsize=2)
+    first, second, third = (Profile("GET", f"/{n}") for n in range(3))
+    for profile in (first, second, third):
+        profiles.add(profile)
+
+    assert profiles.list() == [third, second]
+    assert profiles.get(first.id) is None
+    profiles.resize(1)
+    assert profiles.list() == [third]
@@ -0,0 +1,237 @@
+"""Бюджеты SQL-запросов всех маршрутов Django (api.views) и Flask (app.py).
+
+Каждый маршрут вызывается под фикстурой query_audit (режим raise): превышение
+бюджета или N+1 роняет тест с QueryBudgetExceeded. Flask работает через
+StubPgPool — SQLite в памяти с интерфейсом dal.pool.PgPool.
+"""
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+from django.conf import settings
+from django.test import Client
+from django.urls import resolve
+
+from api.models import Car
+from api.pytest_plugin import assert_max_queries, django_views, flask_views, missing_budgets
+from api.sharding import car_managers
+from api.snapshot import get_catalog
+from dal import CAR_COLUMNS, CarRepositoryWithEvents, audit
+from dal.audit import QueryBudgetExceeded
+
+DEALER = {"name": "Автоцентр", "city": "Минск", "address": "ул. Тестовая, 1", "area": "Центр", "rating": 4.5}
+
+
+def car_data(dealer_id: int, **fields) -> dict:
+    data = {"firm": "Toyota", "model": "Camry", "year": 2020, "power": 181, "color": "white", "price": 30000, "dealer_id": dealer_id}
+    data.update(fields)
+    return data
+
+
+# --- Django -------------------------------------------------------------------
+
+
+@pytest.fixture
+def api(query_audit):
+    """call(method, path, data=None, **headers); запоминает вызванные представления."""
+    client = Client()
+    called = set()
+
+    def call(method: str, path: str, data=None, **extra):
+        called.add(resolve(path.split("?")[0]).func)
+        if data is not None:
+            extra.update(data=json.dumps(data), content_type="application/json")
+        return getattr(client, method)(path, **extra)
+
+    call.called = called
+    return call
+
+
+def test_django_views_stay_within_budget(api):
+    token = os.environ["PROFILING_TOKEN"]
+    dealer_id = api("post", "/dealers", DEALER).json()["id"]
+    car_ids = [api("post", "/cars", car_data(dealer_id, model=f"Camry {i}")).json()["id"] for i in range(5)]
+
+    assert api("get", "/dealers").status_code == 200
+    assert api("get", f"/dealers/{dealer_id}").status_code == 200
+    assert api("put", f"/dealers/{dealer_id}", dict(DEALER, rating=4.0)).status_code == 200
+    assert api("get", f"/dealers/{dealer_id}/stats").status_code == 200
+    assert api("get", "/stats/summary").status_code == 200
+
+    assert api("get", "/cars").status_code == 200
+    assert api("get", "/cars?limit=2").status_code == 200
+    assert api("get", f"/cars/{car_ids[0]}").status_code == 200
+    assert api("put", f"/cars/{car_ids[0]}", car_data(dealer_id, price=31000)).status_code == 200
+    assert api("patch", f"/cars/{car_ids[1]}", {"color": "black"}).status_code == 200
+    assert api("delete", f"/cars/{car_ids[2]}").status_code == 204
+    # повтор с тем же Idempotency-Key отдаётся из кэша
+    for _ in range(2):
+        replay = api("post", "/cars", car_data(dealer_id), HTTP_IDEMPOTENCY_KEY="budget-test")
+        assert replay.status_code == 201
+
+    assert api("get", "/search?q=cam").status_code == 200
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        assert get_catalog().wait_built(10)
+        assert api("get", "/cars/query?year__gte=2000&agg=avg:price").status_code == 200
+    events = api("get", "/cars/events")
+    assert events.status_code == 200
+    events.close()
+
+    assert api("get", "/metrics").status_code == 200
+    profiled = api("get", "/cars-ui", HTTP_X_PROFILE=token)
+    assert profiled.status_code == 200
+    assert api("get", "/admin/profiles", HTTP_X_PROFILE=token).status_code == 200
+    assert api("get", f"/admin/profiles/{profiled['X-Profile-Id']}", HTTP_X_PROFILE=token).status_code == 200
+
+    assert api("delete", f"/dealers/{dealer_id}").status_code == 204
+
+    # новое представление без вызова здесь — упавший тест, а не непроверенный бюджет
+    assert api.called == {view for _, view in django_views()}
+
+
+def test_n_plus_one_in_cars_list_exceeds_budget(api, monkeypatch):
+    dealer_id = api("post", "/dealers", DEALER).json()["id"]
+    for i in range(5):
+        api("post", "/cars", car_data(dealer_id, model=f"Corolla {i}"))
+
+    def rows_with_dealers(self, **page):
+        # дилер каждой строки читается отдельным запросом
+        return [
+            tuple(car.dealer.pk if name == "dealer_id" else getattr(car, name) for name in CAR_COLUMNS)
+            for manager in car_managers()
+            for car in manager.order_by("id")
+        ]
+
+    monkeypatch.setattr(CarRepositoryWithEvents, "list_car_rows", rows_with_dealers)
+    with pytest.raises(QueryBudgetExceeded, match="repeated"):
+        api("get", "/cars")
+
+
+def test_assert_max_queries_reports_repeated_shapes(query_audit):
+    with pytest.raises(QueryBudgetExceeded, match="repeated"):
+        with assert_max_queries(10):
+            for car_id in range(1, 6):
+                Car.objects.filter(pk=car_id).first()
+
+    with assert_max_queries(1) as record:
+        list(Car.objects.select_related("dealer")[:10])
+    assert record.count == 1
+
+
+# --- Flask --------------------------------------------------------------------
+
+_FLASK_SCHEMA = """
+CREATE TABLE dealers (id INTEGER PRIMARY KEY, name TEXT, city TEXT, address TEXT, area TEXT, rating REAL);
+CREATE TABLE cars (
+    id INTEGER PRIMARY KEY, firm TEXT, model TEXT, year INTEGER, power INTEGER,
+    color TEXT, price REAL, dealer_id INTEGER REFERENCES dealers (id)
+);
+"""
+
+
+class _StubCursor:
+    """Курсор dal.pool: PREPARE/EXECUTE поверх SQLite, запросы идут в аудит."""
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.rowcount = -1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, vars=None):
+        with audit.timed(query):
+            if query.startswith("PREPARE "):
+                name, _, sql = query[len("PREPARE "):].partition(" AS ")
+                # $1, $2 в PostgreSQL — ?1, ?2 в SQLite
+                self.connection.statements[name] = re.sub(r"\$(\d+)", r"?\1", sql)
+                return
+            name = query.split()[1]
+            cursor = self.connection.db.execute(self.connection.statements[name], tuple(vars or ()))
+            self._rows = cursor.fetchall()
+            self.rowcount = cursor.rowcount if cursor.rowcount >= 0 else len(self._rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class _StubConnection:
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self.db = db
+        self.prepared: set = set()
+        self.statements: dict = {}
+
+    def cursor(self):
+        return _StubCursor(self)
+
+
+class StubPgPool:
+    """dal.pool.PgPool с одним соединением к SQLite в памяти."""
+
+    def __init__(self) -> None:
+        db = sqlite3.connect(":memory:", check_same_thread=False)
+        db.executescript(_FLASK_SCHEMA)
+        self._connection = _StubConnection(db)
+
+    @contextmanager
+    def connection(self):
+        try:
+            yield self._connection
+            self._connection.db.commit()
+        except BaseException:
+            self._connection.db.rollback()
+            raise
+
+
+@pytest.fixture
+def flask_api(query_audit, monkeypatch):
+    import app as flask_module
+
+    pool = StubPgPool()
+    monkeypatch.setattr(flask_module.dealers, "_pool", pool)
+    monkeypatch.setattr(flask_module.cars._repository, "_pool", pool)
+    monkeypatch.setattr(flask_module.app, "testing", True)
+    client = flask_module.app.test_client()
+    adapter = flask_module.app.url_map.bind("localhost")
+    called = set()
+
+    def call(method: str, path: str, data=None):
+        endpoint, _ = adapter.match(path, method=method.upper())
+        called.add(flask_module.app.view_functions[endpoint])
+        return getattr(client, method)(path, json=data)
+
+    call.called = called
+    return call
+
+
+def test_flask_routes_stay_within_budget(flask_api):
+    dealer_id = flask_api("post", "/dealers", DEALER).get_json()["id"]
+    car_ids = [flask_api("post", "/cars", car_data(dealer_id, model=f"Camry {i}")).get_json()["id"] for i in range(3)]
+
+    assert flask_api("get", "/dealers").status_code == 200
+    assert flask_api("get", f"/dealers/{dealer_id}").status_code == 200
+    assert flask_api("put", f"/dealers/{dealer_id}", dict(DEALER, rating=4.0)).status_code == 200
+    assert flask_api("get", "/cars").status_code == 200
+    assert flask_api("get", f"/cars/{car_ids[0]}").status_code == 200
+    assert flask_api("put", f"/cars/{car_ids[0]}", car_data(dealer_id, price=31000)).status_code == 200
+    assert flask_api("patch", f"/cars/{car_ids[1]}", {"color": "black"}).status_code == 200
+    assert flask_api("delete", f"/cars/{car_ids[1]}").status_code == 204
+    assert flask_api("delete", f"/cars/{car_ids[2]}").status_code == 204
+    assert flask_api("delete", f"/cars/{car_ids[0]}").status_code == 204
+    assert flask_api("delete", f"/dealers/{dealer_id}").status_code == 204
+
+    assert flask_api.called == {view for _, view in flask_views()}
+
+
+def test_every_route_declares_a_budget(flask_api):
+    assert missing_budgets() == []
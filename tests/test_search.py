@@ -0,0 +1,78 @@
+"""Поисковый индекс car_search (api.search): префиксный поиск и обновление из событий."""
+import json
+
+from django.test import Client
+
+from api.search import get_backend, rebuild_search_index, tokenize
+from api.sharding import car_connections
+
+
+def send(client, method: str, path: str, data=None):
+    if data is None:
+        return getattr(client, method)(path)
+    return getattr(client, method)(path, data=json.dumps(data), content_type="application/json")
+
+
+def found(client, query: str) -> list:
+    response = client.get("/search", {"q": query})
+    assert response.status_code == 200
+    return [row["id"] for row in response.json()]
+
+
+def create_dealer(client, name: str, city: str = "Гродно") -> int:
+    dealer = {"name": name, "city": city, "address": "ул. Поисковая, 2", "area": "Север", "rating": 4.0}
+    return send(client, "post", "/dealers", dealer).json()["id"]
+
+
+def create_car(client, dealer_id: int, **fields) -> int:
+    data = {"firm": "Zaporozhets", "model": "Quintet", "year": 1990, "power": 40, "color": "beige", "price": 900, "dealer_id": dealer_id}
+    data.update(fields)
+    return send(client, "post", "/cars", data).json()["id"]
+
+
+def test_tokenize_lowercases_and_limits_terms():
+    assert tokenize("Toyota, CAMRY!") == ["toyota", "camry"]
+    assert len(tokenize(" ".join(f"w{i}" for i in range(20)))) == 8
+    assert tokenize("  ") == []
+
+
+def test_prefix_search_by_firm_model_and_dealer():
+    client = Client()
+    dealer_id = create_dealer(client, "Квазарвело")
+    car_id = create_car(client, dealer_id)
+
+    assert found(client, "zapo") == [car_id]
+    assert found(client, "zaporozhets quin") == [car_id]
+    assert found(client, "квазар") == [car_id]
+    assert found(client, "zaporozhets mustang") == []
+    assert client.get("/search", {"q": ""}).json() == []
+
+
+def test_index_follows_car_and_dealer_changes():
+    client = Client()
+    dealer_id = create_dealer(client, "Ортогональ")
+    car_id = create_car(client, dealer_id, firm="Tatra", model="Sedmicka")
+
+    send(client, "patch", f"/cars/{car_id}", {"model": "Osmicka"})
+    assert found(client, "sedmi") == []
+    assert found(client, "osmi") == [car_id]
+
+    dealer = {"name": "Перпендикуляр", "city": "Гродно", "address": "ул. Поисковая, 2", "area": "Север", "rating": 4.0}
+    send(client, "put", f"/dealers/{dealer_id}", dealer)
+    assert found(client, "ортогон") == []
+    assert found(client, "перпендик") == [car_id]
+
+    send(client, "delete", f"/cars/{car_id}")
+    assert found(client, "osmi") == []
+
+
+def test_rebuild_restores_rows_missing_from_index():
+    client = Client()
+    car_id = create_car(client, create_dealer(client, "Реконструктор"), firm="Wartburg")
+    for conn in car_connections():
+        with conn.cursor() as cursor:
+            get_backend(conn).delete(cursor, car_id)
+    assert found(client, "wartb") == []
+
+    rebuild_search_index()
+    assert found(client, "wartb") == [car_id]
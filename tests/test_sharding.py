@@ -0,0 +1,139 @@
+"""Шардирование автомобилей (api.sharding): слияние ответов, блоки ID, размещение и перенос дилеров.
+
+Тесты переноса требуют шардов: CAR_SHARDS=2 python -m pytest tests/test_sharding.py
+"""
+import json
+
+import pytest
+from django.conf import settings
+from django.db.models import QuerySet
+from django.test import Client
+
+from api import sharding
+from api.models import Car, DealerShard
+from api.sharding import DealerMoving, IdAllocator, ID_BLOCK_SIZE, ShardMap, merge_sorted, move_dealer
+
+needs_shards = pytest.mark.skipif(not sharding.enabled(), reason="CAR_SHARDS is not set")
+
+
+def test_merge_sorted_deduplicates_and_limits():
+    left = [(1, "a"), (4, "d"), (6, "f")]
+    right = [(2, "b"), (4, "d"), (5, "e")]
+
+    assert [row[0] for row in merge_sorted([left, right], key=lambda row: row[0])] == [1, 2, 4, 5, 6]
+    assert [row[0] for row in merge_sorted([left, right], key=lambda row: row[0], limit=3)] == [1, 2, 4]
+
+
+def test_id_blocks_are_unique_and_remember_their_shard():
+    allocator = IdAllocator()
+    first = [allocator.next_id("shard-a") for _ in range(3)]
+    other = allocator.next_id("shard-b")
+
+    assert first == [first[0], first[0] + 1, first[0] + 2]
+    assert other // ID_BLOCK_SIZE != first[0] // ID_BLOCK_SIZE
+    # новый процесс узнаёт владельца блока из car_id_blocks
+    assert IdAllocator().home_shard(other) == "shard-b"
+    assert IdAllocator().home_shard(1) is None
+
+
+def create_dealer(client, name: str) -> int:
+    dealer = {"name": name, "city": "Пинск", "address": "ул. Шардовая, 8", "area": "Юг", "rating": 4.2}
+    return client.post("/dealers", data=json.dumps(dealer), content_type="application/json").json()["id"]
+
+
+def create_cars(client, dealer_id: int, count: int) -> list:
+    ids = []
+    for i in range(count):
+        car = {"firm": "GAZ", "model": f"Volga {i}", "year": 1975, "power": 95, "color": "black", "price": 4000, "dealer_id": dealer_id}
+        ids.append(client.post("/cars", data=json.dumps(car), content_type="application/json").json()["id"])
+    return ids
+
+
+def cars_on(alias: str, dealer_id: int) -> list:
+    return list(Car.objects.using(alias).filter(dealer_id=dealer_id).order_by("id").values_list("id", flat=True))
+
+
+@needs_shards
+def test_shard_map_assigns_once_and_caches():
+    dealer_id = create_dealer(Client(), "Картограф")
+    shards = ShardMap(ttl=60)
+    shard, moving = shards.placement(dealer_id)
+
+    assert shard in settings.CAR_SHARDS and not moving
+    DealerShard.objects.filter(dealer_id=dealer_id).update(moving=True)
+    assert shards.shard_for_write(dealer_id) == shard
+    shards.invalidate(dealer_id)
+    with pytest.raises(DealerMoving):
+        shards.shard_for_write(dealer_id)
+
+
+@pytest.fixture
+def dealer_with_cars():
+    client = Client()
+    dealer_id = create_dealer(client, "Переездов")
+    car_ids = create_cars(client, dealer_id, 5)
+    source, _ = sharding.shard_map.placement(dealer_id)
+    target = next(alias for alias in settings.CAR_SHARDS if alias != source)
+    return dealer_id, car_ids, source, target
+
+
+def fail_on_call(monkeypatch, method: str, call: int):
+    """QuerySet.<method> падает на call-м вызове, остальные проходят."""
+    original = getattr(QuerySet, method)
+    calls = []
+
+    def wrapper(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == call:
+            raise RuntimeError(f"{method} failed")
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(QuerySet, method, wrapper)
+
+
+@needs_shards
+def test_move_interrupted_while_copying_resumes(dealer_with_cars, monkeypatch):
+    dealer_id, car_ids, source, target = dealer_with_cars
+    fail_on_call(monkeypatch, "bulk_create", call=2)
+    with pytest.raises(RuntimeError):
+        move_dealer(dealer_id, target, batch_size=2, pause=0)
+    monkeypatch.undo()
+
+    # копия не удалена, исходный шард цел, запись по дилеру закрыта
+    assert cars_on(target, dealer_id) == car_ids[:2]
+    assert cars_on(source, dealer_id) == car_ids
+    with pytest.raises(DealerMoving):
+        sharding.shard_map.shard_for_write(dealer_id)
+
+    # перезапуск вместо DealerMoving докопирует только недостающие строки
+    assert move_dealer(dealer_id, target, batch_size=2, pause=0) == 3
+    assert cars_on(target, dealer_id) == car_ids
+    assert cars_on(source, dealer_id) == []
+    assert sharding.shard_map.placement(dealer_id) == (target, False)
+
+
+@needs_shards
+def test_move_interrupted_after_switching_shard_resumes(dealer_with_cars, monkeypatch):
+    dealer_id, car_ids, source, target = dealer_with_cars
+    fail_on_call(monkeypatch, "delete", call=1)
+    with pytest.raises(RuntimeError):
+        move_dealer(dealer_id, target, pause=0)
+    monkeypatch.undo()
+
+    assert sharding.shard_map.placement(dealer_id) == (target, True)
+    # список не показывает автомобиль дважды, пока копии лежат в обоих шардах
+    listed = [car["id"] for car in Client().get("/cars").json() if car["dealer_id"] == dealer_id]
+    assert listed == car_ids
+
+    assert move_dealer(dealer_id, target, pause=0) == 0
+    assert cars_on(target, dealer_id) == car_ids
+    assert cars_on(source, dealer_id) == []
+    assert sharding.shard_map.placement(dealer_id) == (target, False)
+    # после переноса запись снова идёт, и автомобиль можно перевести обратно
+    other = create_dealer(Client(), "Обратный")
+    sharding.shard_map.placement(other)
+    DealerShard.objects.filter(dealer_id=other).update(shard=source)
+    sharding.shard_map.invalidate(other)
+    response = Client().patch(f"/cars/{car_ids[0]}", data=json.dumps({"dealer_id": other}), content_type="application/json")
+    assert response.status_code == 200
+    assert cars_on(source, other) == [car_ids[0]]
@@ -0,0 +1,60 @@
+"""Колоночный снимок каталога (api.snapshot) и разбор параметров /cars/query."""
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from api import snapshot
+from api.snapshot import CatalogSnapshot, parse_query
+
+
+@pytest.fixture
+def catalog():
+    pytest.importorskip("numpy")
+    catalog = CatalogSnapshot(initial_capacity=2)
+    catalog._dealers = {1: ("Минск", 4.5), 2: ("Гродно", 3.0)}
+    cars = [
+        (1, "Toyota", "Camry", 2020, 181, 30000, 1),
+        (2, "Toyota", "Corolla", 2018, 132, 18000, 2),
+        (3, "Honda", "Civic", 2021, 158, 24000, 1),
+    ]
+    for car_id, firm, model, year, power, price, dealer_id in cars:
+        catalog._upsert({
+            "id": car_id, "firm": firm, "model": model, "year": year, "power": power,
+            "color": "white", "price": price, "dealer_id": dealer_id,
+        })
+    catalog.built_at = 1.0
+    catalog._built.set()
+    return catalog
+
+
+def test_filters_and_aggregates(catalog):
+    result = catalog.query(*parse_query({"year__gte": ["2019"], "agg": ["avg:price,max:power"]}))
+
+    assert result["count"] == 2
+    assert result["aggregates"] == {"avg:price": 27000.0, "max:power": 181.0}
+    assert result["rows"] == 3
+    assert catalog.query([("firm", "eq", "Lada")], [("sum", "price")])["aggregates"] == {"sum:price": None}
+
+
+def test_group_by_and_events(catalog):
+    catalog.apply_event({"eventType": "DELETE", "car": {"id": 3}})
+    catalog.apply_event({"eventType": "UPDATE", "car": {"id": 2}, "changes": {"price": {"old": 18000, "new": 20000}}})
+
+    result = catalog.query(*parse_query({"group_by": ["city"], "agg": ["sum:price"]}))
+    assert result["groups"] == [
+        {"city": "Минск", "count": 1, "sum:price": 30000.0},
+        {"city": "Гродно", "count": 1, "sum:price": 20000.0},
+    ]
+
+
+@pytest.mark.parametrize("params", [{"colour": ["red"]}, {"firm__gte": ["A"]}, {"agg": ["median:price"]}, {"year": ["new"]}])
+def test_parse_query_rejects_unsupported_params(params):
+    with pytest.raises(ValueError):
+        parse_query(params)
+
+
+def test_snapshot_is_refused_without_numpy(monkeypatch):
+    monkeypatch.setattr(snapshot, "np", None)
+    with pytest.raises(ImproperlyConfigured, match="numpy"):
+        snapshot.check_numpy()
+    with pytest.raises(ImproperlyConfigured):
+        snapshot.get_catalog()
@@ -0,0 +1,111 @@
+"""Локальный буфер событий (api.spool) и circuit breaker publisher'а (api.circuit)."""
+import json
+import sqlite3
+
+import pytest
+
+from api.circuit import CircuitBreaker
+from api.events import RabbitMQEventPublisher
+from api.models import Car
+from api.spool import EventSpool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = EventSpool(tmp_path / "spool.db")
+    yield spool
+    spool.close()
+
+
+def append(spool, *bodies):
+    for body in bodies:
+        spool.append("cars", "", body, {"message_id": body.decode()})
+
+
+def test_drain_sends_in_order_and_removes_sent_events(spool):
+    append(spool, b"1", b"2", b"3")
+    sent = []
+
+    assert spool.drain(lambda e: sent.append(e.body), batch_size=2) == 2
+    assert sent == [b"1", b"2"]
+    assert spool.count() == 1
+    assert spool.drain(lambda e: sent.append(e.body)) == 1
+    assert sent == [b"1", b"2", b"3"]
+    assert not spool.has_pending()
+
+
+def test_failed_send_keeps_unsent_tail(spool):
+    append(spool, b"1", b"2", b"3")
+
+    def send(event):
+        if event.body == b"2":
+            raise ConnectionError("broker gone")
+
+    with pytest.raises(ConnectionError):
+        spool.drain(send)
+    remaining = []
+    spool.drain(lambda e: remaining.append(e.body))
+    assert remaining == [b"2", b"3"]
+
+
+def test_spool_written_before_properties_column_is_upgraded(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE spooled_events (id INTEGER PRIMARY KEY AUTOINCREMENT, exchange TEXT NOT NULL,"
+        " routing_key TEXT NOT NULL, body BLOB NOT NULL, headers TEXT NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO spooled_events (exchange, routing_key, body, headers) VALUES ('cars', '', x'31', ?)",
+        (json.dumps({"x-attempt": 0}),),
+    )
+    conn.commit()
+    conn.close()
+
+    spool = EventSpool(path)
+    events = []
+    spool.drain(events.append)
+    spool.close()
+    assert events[0].properties == {"headers": {"x-attempt": 0}}
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    breaker._opened_at -= 60
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    # пока пробная попытка не завершилась, остальные ждут
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    breaker._opened_at -= 60
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.seconds_until_retry() == 0.0
+
+
+def test_publisher_spools_events_without_broker(spool, monkeypatch):
+    publisher = RabbitMQEventPublisher(spool=spool)
+    # подключение к брокеру — забота drainer'а; здесь он не нужен
+    monkeypatch.setattr(publisher, "_start_drainer", lambda: None)
+    car = Car(id=1, firm="Toyota", model="Camry", year=2020, power=181, color="white", price=30000, dealer_id=1)
+
+    publisher.publish_event("CREATE", car)
+    publisher.publish_event("UPDATE", car, {"color": "black"})
+
+    assert publisher.backlog() == 2
+    events = []
+    spool.drain(events.append)
+    bodies = [json.loads(e.body) for e in events]
+    assert [b["eventType"] for b in bodies] == ["CREATE", "UPDATE"]
+    assert bodies[1]["changes"] == {"color": "black"}
+    # message_id сохраняется в буфере вместе с событием
+    assert events[0].properties["message_id"] == bodies[0]["messageId"]
@@ -0,0 +1,104 @@
+"""Trace context событий (api.correlation), задержка доставки и пороги отставания очередей."""
+import json
+import time
+from types import SimpleNamespace
+
+import pika
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api import amqp
+from api.consumer import EVENT_LATENCY, CarEventConsumer
+from api.correlation import CorrelationIdMiddleware, parse_trace_id
+from api.events import RabbitMQEventPublisher
+from api.models import Car
+from api.monitoring import QUEUE_ALERT, QueueLagMonitor, QueueThresholds
+from api.spool import EventSpool
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def test_parse_trace_id_accepts_only_valid_traceparent():
+    assert parse_trace_id(f"00-{TRACE_ID}-00f067aa0ba902b7-01") == TRACE_ID
+    assert parse_trace_id(f"00-{TRACE_ID.upper()}-00f067aa0ba902b7-01") == TRACE_ID
+    assert parse_trace_id(f"00-{'0' * 32}-00f067aa0ba902b7-01") is None
+    assert parse_trace_id("garbage") is None
+    assert parse_trace_id(None) is None
+
+
+def test_event_carries_trace_of_the_request(tmp_path, monkeypatch):
+    spool = EventSpool(tmp_path / "spool.db")
+    publisher = RabbitMQEventPublisher(spool=spool)
+    monkeypatch.setattr(publisher, "_start_drainer", lambda: None)
+    car = Car(id=3, firm="Volvo", model="XC60", year=2022, power=250, color="black", price=50000, dealer_id=1)
+
+    def view(request):
+        publisher.publish_event("CREATE", car)
+        return HttpResponse()
+
+    request = RequestFactory().post(
+        "/cars", HTTP_TRACEPARENT=f"00-{TRACE_ID}-00f067aa0ba902b7-01", HTTP_X_REQUEST_ID="req-1"
+    )
+    before = time.time_ns()
+    response = CorrelationIdMiddleware(view)(request)
+    events = []
+    spool.drain(events.append)
+    spool.close()
+
+    assert response["X-Request-ID"] == "req-1"
+    (event,) = events
+    headers = event.properties["headers"]
+    assert parse_trace_id(headers[amqp.TRACEPARENT_HEADER]) == TRACE_ID
+    # у события свой span id
+    assert headers[amqp.TRACEPARENT_HEADER] != f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+    assert before <= headers[amqp.PUBLISHED_AT_HEADER] <= time.time_ns()
+    assert event.properties["correlation_id"] == "req-1"
+
+
+def latency_sample(suffix: str, queue: str) -> float:
+    for line in EVENT_LATENCY.render():
+        if line.startswith(f"cars_event_latency_seconds_{suffix}{{") and f'queue="{queue}"' in line:
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_consumer_observes_latency_from_publish_header():
+    consumer = CarEventConsumer(lambda payload: None)
+    consumer._queue_by_tag = {"ctag": "latency-test"}
+    channel = SimpleNamespace(basic_ack=lambda delivery_tag: None)
+    body = json.dumps({"eventType": "CREATE", "car": {"id": 1}}).encode()
+
+    def deliver(headers, message_id):
+        properties = pika.BasicProperties(headers=headers, message_id=message_id)
+        consumer._on_message(channel, SimpleNamespace(consumer_tag="ctag", delivery_tag=1), properties, body)
+
+    deliver({amqp.PUBLISHED_AT_HEADER: time.time_ns() - 2 * 10**9}, "lat-1")
+    # события без заголовка (от старых publisher'ов) задержку не портят
+    deliver({}, "lat-2")
+
+    assert latency_sample("count", "latency-test") == 1
+    assert 2 <= latency_sample("sum", "latency-test") < 3
+
+
+@pytest.fixture
+def monitor():
+    return QueueLagMonitor({"work": QueueThresholds(max_depth=10, min_consumers=1), "parked": QueueThresholds(max_depth=0)})
+
+
+def test_lag_monitor_alerts_on_depth_consumers_and_missing_queue(monitor):
+    monitor._update("work", monitor.thresholds["work"], 5, 1)
+    monitor._update("parked", monitor.thresholds["parked"], 0, 0)
+    assert not monitor.alerting()
+
+    monitor._update("work", monitor.thresholds["work"], 11, 0)
+    assert monitor.snapshot()["work"].alerts == ("depth", "consumers")
+    assert QUEUE_ALERT.get(queue="work", reason="depth") == 1
+
+    monitor._update("parked", monitor.thresholds["parked"], None, None)
+    assert monitor.snapshot()["parked"].alerts == ("missing",)
+
+    monitor._update("work", monitor.thresholds["work"], 0, 2)
+    assert monitor.snapshot()["work"].alerts == ()
+    assert QUEUE_ALERT.get(queue="work", reason="depth") == 0
+    assert monitor.alerting()
@@ -5,6 +5,7 @@ const carsContainer = document.getElementById("cars-container");
 const searchInput = document.getElementById("search-id");
 const searchBtn = document.getElementById("search-btn");
 const reloadBtn = document.getElementById("reload-btn");
+const searchTextInput = document.getElementById("search-text");
 
 let carsCache = [];
 
@@ -18,77 +19,274 @@ function buildImageUrl(car) {
   return "/static/images.png";
 }
 
-function renderCars(cars, highlightId = null) {
-  carsContainer.innerHTML = "";
-  if (!cars.length) {
+// Виртуализированный список: в DOM только карточки видимых строк сетки и
+// OVERSCAN_ROWS строк сверху и снизу; место остальных занимает padding
+// контейнера. Ушедшие из окна карточки не удаляются, а заполняются
+// данными следующих.
+const OVERSCAN_ROWS = 2;
+const ESTIMATED_ROW_HEIGHT = 340;
+const MAX_SPARE_CARDS = 100;
+let shownCars = [];
+let highlightedId = null;
+let rowHeight = ESTIMATED_ROW_HEIGHT;
+const renderedCards = new Map(); // id автомобиля -> карточка в DOM
+const spareCards = [];
+let renderScheduled = false;
+
+function buildCard() {
+  const card = document.createElement("div");
+  card.className = "car-card";
+
+  const img = document.createElement("img");
+  img.className = "car-image";
+  card.appendChild(img);
+
+  const body = document.createElement("div");
+  body.className = "car-body";
+
+  const title = document.createElement("div");
+  title.className = "car-title";
+  body.appendChild(title);
+
+  const attrs = document.createElement("div");
+  attrs.className = "car-attrs";
+  body.appendChild(attrs);
+
+  const actions = document.createElement("div");
+  actions.className = "car-actions";
+  const badge = document.createElement("span");
+  badge.className = "badge";
+  badge.textContent = "REST";
+  actions.appendChild(badge);
+
+  const right = document.createElement("div");
+  right.className = "car-actions-right";
+
+  const editBtn = document.createElement("button");
+  editBtn.className = "btn-secondary btn-edit";
+  editBtn.textContent = "Редактировать";
+
+  const deleteBtn = document.createElement("button");
+  deleteBtn.className = "btn-danger btn-delete";
+  deleteBtn.textContent = "Удалить";
+
+  right.appendChild(editBtn);
+  right.appendChild(deleteBtn);
+  actions.appendChild(right);
+
+  body.appendChild(actions);
+  card.appendChild(body);
+
+  return card;
+}
+
+function fillCard(card, car) {
+  if (card.dataset.id !== String(car.id)) {
+    // карточка переходит к другому автомобилю — форма прежнего ей не нужна
+    const form = card.querySelector(".edit-fields");
+    if (form) {
+      form.remove();
+    }
+    card.dataset.id = car.id;
+  }
+  card.classList.toggle("highlight", Boolean(highlightedId) && Number(highlightedId) === car.id);
+  const img = card.querySelector(".car-image");
+  img.alt = car.firm + " " + car.model;
+  img.src = buildImageUrl(car);
+  card.querySelector(".car-title").innerHTML = `
+    <span>${car.firm} ${car.model}</span>
+    <small>#${car.id}</small>
+  `;
+  card.querySelector(".car-attrs").innerHTML = `
+    <div><span class="car-attr-label">Год:</span> ${car.year}</div>
+    <div><span class="car-attr-label">Мощность:</span> ${car.power} л.с.</div>
+    <div><span class="car-attr-label">Цвет:</span> ${car.color}</div>
+    <div><span class="car-attr-label">Цена:</span> ${car.price ?? "—"}</div>
+    <div><span class="car-attr-label">Дилер ID:</span> ${car.dealer_id}</div>
+  `;
+  card.querySelector(".btn-edit").onclick = () => openEditForm(card, car);
+  card.querySelector(".btn-delete").onclick = () => deleteCar(car.id);
+}
+
+function releaseCard(card) {
+  card.remove();
+  if (spareCards.length < MAX_SPARE_CARDS) {
+    spareCards.push(card);
+  }
+}
+
+function gridColumns() {
+  return Math.max(1, getComputedStyle(carsContainer).gridTemplateColumns.split(" ").length);
+}
+
+function measureRowHeight() {
+  // по карточке без открытой формы редактирования, вместе с зазором сетки
+  for (const card of renderedCards.values()) {
+    if (!card.querySelector(".edit-fields")) {
+      return card.offsetHeight + (parseFloat(getComputedStyle(carsContainer).rowGap) || 0);
+    }
+  }
+  return rowHeight;
+}
+
+function renderWindow() {
+  renderScheduled = false;
+  if (!shownCars.length) {
+    renderedCards.forEach(releaseCard);
+    renderedCards.clear();
+    carsContainer.style.paddingTop = "";
+    carsContainer.style.paddingBottom = "";
     carsContainer.innerHTML = "<p>Нет автомобилей</p>";
     return;
   }
-  cars.forEach((car) => {
-    const card = document.createElement("div");
-    card.className = "car-card";
-    card.dataset.id = car.id;
-    if (highlightId && Number(highlightId) === car.id) {
-      card.classList.add("highlight");
-    }
-
-    const img = document.createElement("img");
-    img.className = "car-image";
-    img.alt = car.firm + " " + car.model;
-    img.src = buildImageUrl(car);
-    card.appendChild(img);
-
-    const body = document.createElement("div");
-    body.className = "car-body";
-
-    const title = document.createElement("div");
-    title.className = "car-title";
-    title.innerHTML = `
-      <span>${car.firm} ${car.model}</span>
-      <small>#${car.id}</small>
-    `;
-    body.appendChild(title);
-
-    const attrs = document.createElement("div");
-    attrs.className = "car-attrs";
-    attrs.innerHTML = `
-      <div><span class="car-attr-label">Год:</span> ${car.year}</div>
-      <div><span class="car-attr-label">Мощность:</span> ${car.power} л.с.</div>
-      <div><span class="car-attr-label">Цвет:</span> ${car.color}</div>
-      <div><span class="car-attr-label">Цена:</span> ${car.price ?? "—"}</div>
-      <div><span class="car-attr-label">Дилер ID:</span> ${car.dealer_id}</div>
-    `;
-    body.appendChild(attrs);
-
-    const actions = document.createElement("div");
-    actions.className = "car-actions";
-    const badge = document.createElement("span");
-    badge.className = "badge";
-    badge.textContent = "REST";
-    actions.appendChild(badge);
-
-    const right = document.createElement("div");
-    right.className = "car-actions-right";
-
-    const editBtn = document.createElement("button");
-    editBtn.className = "btn-secondary";
-    editBtn.textContent = "Редактировать";
-    editBtn.onclick = () => openEditForm(card, car);
-
-    const deleteBtn = document.createElement("button");
-    deleteBtn.className = "btn-danger";
-    deleteBtn.textContent = "Удалить";
-    deleteBtn.onclick = () => deleteCar(car.id);
-
-    right.appendChild(editBtn);
-    right.appendChild(deleteBtn);
-    actions.appendChild(right);
-
-    body.appendChild(actions);
-    card.appendChild(body);
-
-    carsContainer.appendChild(card);
-  });
+  if (!renderedCards.size) {
+    carsContainer.replaceChildren();
+  }
+
+  const columns = gridColumns();
+  const rows = Math.ceil(shownCars.length / columns);
+  const top = carsContainer.getBoundingClientRect().top;
+  const firstRow = Math.min(rows - 1, Math.max(0, Math.floor(-top / rowHeight) - OVERSCAN_ROWS));
+  const lastRow = Math.min(
+    rows,
+    Math.max(firstRow + 1, Math.ceil((window.innerHeight - top) / rowHeight) + OVERSCAN_ROWS)
+  );
+  const visible = shownCars.slice(firstRow * columns, lastRow * columns);
+
+  const ids = new Set(visible.map((car) => car.id));
+  for (const [id, card] of renderedCards) {
+    if (!ids.has(id)) {
+      renderedCards.delete(id);
+      releaseCard(card);
+    }
+  }
+  // Карточки, оставшиеся в окне, не трогаем: перенос в DOM сбил бы фокус в форме
+  let cursor = carsContainer.firstChild;
+  for (const car of visible) {
+    let card = renderedCards.get(car.id);
+    if (!card) {
+      card = spareCards.pop() || buildCard();
+      fillCard(card, car);
+      renderedCards.set(car.id, card);
+    }
+    if (card === cursor) {
+      cursor = cursor.nextSibling;
+    } else {
+      carsContainer.insertBefore(card, cursor);
+    }
+  }
+  carsContainer.style.paddingTop = firstRow * rowHeight + "px";
+  carsContainer.style.paddingBottom = (rows - lastRow) * rowHeight + "px";
+
+  const measured = measureRowHeight();
+  if (Math.abs(measured - rowHeight) > 1) {
+    rowHeight = measured;
+    scheduleRender();
+  }
+}
+
+function scheduleRender() {
+  if (!renderScheduled) {
+    renderScheduled = true;
+    requestAnimationFrame(renderWindow);
+  }
+}
+
+window.addEventListener("scroll", scheduleRender, { passive: true });
+window.addEventListener("resize", scheduleRender);
+
+function renderCars(cars, highlightId = null) {
+  shownCars = cars;
+  highlightedId = highlightId;
+  renderedCards.forEach(releaseCard);
+  renderedCards.clear();
+  renderWindow();
+}
+
+// Прокручивает окно к карточке автомобиля; сама карточка появится при отрисовке окна
+function scrollToCar(id) {
+  const index = shownCars.findIndex((c) => c.id === Number(id));
+  if (index === -1) {
+    return;
+  }
+  const row = Math.floor(index / gridColumns());
+  const rowTop = carsContainer.getBoundingClientRect().top + window.scrollY + row * rowHeight;
+  window.scrollTo({ top: rowTop - (window.innerHeight - rowHeight) / 2, behavior: "smooth" });
+}
+
+function refreshCard(car) {
+  const card = renderedCards.get(car.id);
+  if (card) {
+    fillCard(card, car);
+  }
+}
+
+// Применяет событие об автомобиле к кэшу и перерисовывает только его карточку
+function applyCarEvent(event) {
+  const id = event.car.id;
+  const index = carsCache.findIndex((c) => c.id === id);
+  if (event.eventType === "DELETE") {
+    if (index !== -1) {
+      carsCache.splice(index, 1);
+    }
+    if (shownCars !== carsCache) {
+      const shownIndex = shownCars.findIndex((c) => c.id === id);
+      if (shownIndex !== -1) {
+        shownCars.splice(shownIndex, 1);
+      }
+    }
+    // следующие карточки сдвигаются на место удалённой
+    renderWindow();
+    return;
+  }
+  if (event.eventType === "UPDATE" && event.changes) {
+    if (index === -1) {
+      return;
+    }
+    const car = carsCache[index];
+    for (const [key, change] of Object.entries(event.changes)) {
+      car[key] = change.new;
+    }
+    refreshCard(car);
+    return;
+  }
+  // CREATE или UPDATE с полным снимком
+  const car = event.car;
+  if (index === -1) {
+    carsCache.push(car);
+    if (shownCars === carsCache) {
+      renderWindow();
+    }
+    return;
+  }
+  carsCache[index] = car;
+  if (shownCars !== carsCache) {
+    const shownIndex = shownCars.findIndex((c) => c.id === id);
+    if (shownIndex !== -1) {
+      shownCars[shownIndex] = car;
+    }
+  }
+  refreshCard(car);
+}
+
+function connectLiveUpdates() {
+  if (!window.EventSource) {
+    return;
+  }
+  const source = new EventSource(API_BASE + "/cars/events");
+  let lost = false;
+  source.addEventListener("car", (e) => applyCarEvent(JSON.parse(e.data)));
+  // Сервер не успевал отдавать события — перечитываем список целиком
+  source.addEventListener("reset", () => loadCars());
+  source.onerror = () => {
+    lost = true;
+  };
+  source.onopen = () => {
+    if (lost) {
+      lost = false;
+      loadCars();
+    }
+  };
 }
 
 function openEditForm(card, car) {
@@ -147,19 +345,33 @@ function openEditForm(card, car) {
         price: Number(data.price),
         dealer_id: Number(data.dealer_id),
       };
+      // Отправляем только изменившиеся поля
+      const changed = Object.fromEntries(
+        Object.entries(payload).filter(([key, value]) => value !== car[key])
+      );
+      if (!Object.keys(changed).length) {
+        setStatus("Изменений нет");
+        form.remove();
+        return;
+      }
       setStatus("Сохраняем изменения для #" + car.id + "...");
       const resp = await fetch(API_BASE + "/cars/" + car.id, {
-        method: "PUT",
+        method: "PATCH",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
+        body: JSON.stringify(changed),
       });
       if (!resp.ok) {
         const text = await resp.text();
-        throw new Error("Ошибка PUT: " + resp.status + " " + text);
+        throw new Error("Ошибка PATCH: " + resp.status + " " + text);
       }
       setStatus("Изменения сохранены", "success");
       form.remove();
-      await loadCars(car.id);
+      highlightedId = car.id;
+      applyCarEvent({
+        eventType: "UPDATE",
+        car: { id: car.id },
+        changes: Object.fromEntries(Object.entries(changed).map(([key, value]) => [key, { new: value }])),
+      });
     } catch (err) {
       console.error(err);
       setStatus("Не удалось сохранить изменения: " + err.message, "error");
@@ -179,7 +391,7 @@ async function deleteCar(id) {
       throw new Error("Ошибка DELETE: " + resp.status + " " + text);
     }
     setStatus("Автомобиль удалён", "success");
-    await loadCars();
+    applyCarEvent({ eventType: "DELETE", car: { id } });
   } catch (err) {
     console.error(err);
     setStatus("Не удалось удалить автомобиль: " + err.message, "error");
@@ -213,10 +425,7 @@ async function searchById() {
   const fromCache = carsCache.find((c) => c.id === id);
   if (fromCache) {
     renderCars(carsCache, id);
-    const card = carsContainer.querySelector('[data-id="' + id + '"]');
-    if (card) {
-      card.scrollIntoView({ behavior: "smooth", block: "center" });
-    }
+    scrollToCar(id);
     setStatus("Автомобиль #" + id + " найден в текущем списке", "success");
     return;
   }
@@ -240,6 +449,38 @@ async function searchById() {
   }
 }
 
+let searchTimer = null;
+let searchSeq = 0;
+
+async function searchText() {
+  const q = searchTextInput.value.trim();
+  if (!q) {
+    renderCars(carsCache);
+    setStatus("Загружено автомобилей: " + carsCache.length, "success");
+    return;
+  }
+  // Ответы на устаревшие запросы (пользователь уже набрал дальше) отбрасываем
+  const seq = ++searchSeq;
+  try {
+    const resp = await fetch(API_BASE + "/search?q=" + encodeURIComponent(q));
+    if (!resp.ok) {
+      const text = await resp.text();
+      throw new Error("Ошибка GET /search: " + resp.status + " " + text);
+    }
+    const hits = await resp.json();
+    if (seq !== searchSeq) {
+      return;
+    }
+    const byId = new Map(carsCache.map((c) => [c.id, c]));
+    const cars = hits.map((h) => byId.get(h.id)).filter(Boolean);
+    renderCars(cars);
+    setStatus("Найдено: " + hits.length, hits.length ? "success" : "");
+  } catch (err) {
+    console.error(err);
+    setStatus("Ошибка поиска: " + err.message, "error");
+  }
+}
+
 searchBtn.addEventListener("click", searchById);
 reloadBtn.addEventListener("click", () => loadCars());
 searchInput.addEventListener("keydown", (e) => {
@@ -248,4 +489,10 @@ searchInput.addEventListener("keydown", (e) => {
   }
 });
 
+searchTextInput.addEventListener("input", () => {
+  clearTimeout(searchTimer);
+  searchTimer = setTimeout(searchText, 150);
+});
+
 loadCars();
+connectLiveUpdates();